@@ -1,8 +1,26 @@
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, render_template, request, jsonify, Response, stream_with_context
 import os
+import re
 import json
 import sys
+import time
+import logging
+import threading
 from editors.state_editor import StateEditor
+from utils.tile_server import TileServer, STATIC_LAYERS, DYNAMIC_LAYERS
+from utils.file_watcher import FileWatcher
+from utils.event_stream import EventStream, format_event
+from utils.directory_listing import DirectoryListing
+from utils.symbol_index import SymbolIndex
+from utils.localisation import LocalisationIndex, DEFAULT_LANGUAGE
+from utils.text_search import TextSearch
+from utils.country_registry import CountryRegistry
+from utils.binary_payload import encode_payload, MIMETYPE as BINARY_MIMETYPE
+from utils.http_cache import ResponseCache, accepted_encoding
+from utils.border_engine import (
+    province_border_mask, state_border_mask, render_overlay,
+    PROVINCE_BORDER_COLOR, STATE_BORDER_COLOR
+)
 from io import BytesIO
 import base64
 
@@ -12,9 +30,19 @@ from editors.country_editor import CountryCreator
 
 main = Blueprint('main', __name__)
 
+# Status of background work (indexing, file watching, reloads)
+logger = logging.getLogger(__name__)
+
 class ProjectManager:
+    # Entries per page when listing a folder of the project tree
+    TREE_PAGE_SIZE = 500
+    
     def __init__(self):
         self.current_project = None
+        self.listing = None
+        self.symbols = None
+        self.localisation = None
+        self.countries = None
     
     def open_project(self, folder_path):
         """Open a mod project folder identified by .mod file"""
@@ -27,59 +55,59 @@ class ProjectManager:
             return False, "No .mod file found in folder"
         
         self.current_project = folder_path
+        # Keep cached listings when the same project is opened again
+        if self.listing is None or self.listing.root != os.path.abspath(folder_path):
+            self.listing = DirectoryListing(folder_path)
+        if self.symbols is None or self.symbols.project_root != os.path.abspath(folder_path):
+            if self.symbols:
+                self.symbols.close()
+            self.symbols = SymbolIndex(folder_path, os.path.join(folder_path, ".hpa_cache"))
+        self.localisation = LocalisationIndex(folder_path)
+        self.countries = CountryRegistry(folder_path)
+        
+        # Build the indexes without holding up the request
+        threading.Thread(target=self._build_indexes, args=(self.symbols, self.localisation), daemon=True).start()
         return True, f"Project loaded: {os.path.basename(folder_path)}"
     
+    def _build_indexes(self, symbols, localisation):
+        try:
+            localisation.ensure_loaded()
+            languages = ', '.join(f"{len(keys)} {language}" for language, keys in localisation.language_counts().items())
+            logger.info("Localisation: %s keys in %.2fs", languages or 'no', localisation.load_time)
+        except Exception as e:
+            logger.warning("Localisation loading failed: %s", e)
+        
+        try:
+            report = symbols.refresh()
+            logger.info("Symbol index: %d files indexed, %d unchanged, %d removed in %.2fs",
+                        report['indexed'], report['unchanged'], report['removed'], report['elapsed'])
+        except Exception as e:
+            logger.warning("Symbol indexing failed: %s", e)
+    
     def get_project_structure(self):
-        """Get the file structure - SIMPLE AND WORKING VERSION"""
+        """Get the root of the file tree; subfolders are listed on demand"""
         if not self.current_project:
             return {}
         
-        def build_tree(path):
-            """Recursively build file tree"""
-            name = os.path.basename(path)
-            if path == self.current_project:
-                name = "Root"
-            
-            item = {
-                'name': name,
-                'path': os.path.relpath(path, self.current_project),
-                'type': 'folder',
-                'children': []
-            }
-            
-            try:
-                # Get all items in this directory
-                for entry in os.listdir(path):
-                    # Skip hidden files and cache directories
-                    if entry.startswith('.') or entry in ['__pycache__', 'cache']:
-                        continue
-                    
-                    full_path = os.path.join(path, entry)
-                    rel_path = os.path.relpath(full_path, self.current_project)
-                    
-                    if os.path.isdir(full_path):
-                        # It's a folder - recurse into it
-                        item['children'].append(build_tree(full_path))
-                    else:
-                        # It's a file - only include relevant types
-                        if any(entry.endswith(ext) for ext in ['.txt', '.yml', '.yaml', '.gfx', '.gui', '.dds', '.tga', '.mod']):
-                            item['children'].append({
-                                'name': entry,
-                                'path': rel_path,
-                                'type': 'file'
-                            })
-            except PermissionError:
-                pass
-            
-            # Sort: folders first, then files, both alphabetically
-            item['children'].sort(key=lambda x: (x['type'] != 'folder', x['name'].lower()))
-            
-            return item
-        
-        return build_tree(self.current_project)
+        page = self.list_directory('')
+        return {
+            'name': "Root",
+            'path': '.',
+            'type': 'folder',
+            'children': page['entries'],
+            'total': page['total'],
+            'has_more': page['has_more']
+        }
+    
+    def list_directory(self, rel_path, offset=0, limit=None):
+        """List one page of a project folder"""
+        return self.listing.list(rel_path, offset, limit or self.TREE_PAGE_SIZE)
 
 project_manager = ProjectManager()
 
+# Running text searches by ID, so another request can cancel them
+active_searches = {}
+
 @main.route('/')
 def index():
     return render_template('index.html')
@@ -95,6 +123,7 @@ def open_project():
     success, message = project_manager.open_project(folder_path)
     
     if success:
+        _start_file_watcher(project_manager.current_project)
         structure = project_manager.get_project_structure()
         return jsonify({
             'success': True,
@@ -104,6 +133,168 @@ def open_project():
     
     return jsonify({'success': False, 'error': message})
 
+@main.route('/api/list_directory', methods=['POST'])
+def list_directory():
+    """List one page of a project folder for the file tree"""
+    if not project_manager.current_project:
+        return jsonify({'success': False, 'error': 'No project loaded'})
+    
+    data = request.get_json()
+    
+    try:
+        page = project_manager.list_directory(data.get('path', ''),
+                                              offset=int(data.get('offset', 0)),
+                                              limit=int(data.get('limit', 0)) or None)
+    except (OSError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)})
+    
+    return jsonify({'success': True, **page})
+
+def _symbol_query(lookup):
+    """Run a symbol index lookup for a request, timing it"""
+    if not project_manager.current_project or not project_manager.symbols:
+        return jsonify({'success': False, 'error': 'No project loaded'})
+    
+    data = request.get_json()
+    name = str(data.get('name', '')).strip()
+    if not name:
+        return jsonify({'success': False, 'error': 'No symbol name provided'})
+    
+    symbols = project_manager.symbols
+    start = time.perf_counter()
+    results = lookup(symbols, name, data.get('kind') or None, int(data.get('limit', 1000)))
+    return jsonify({
+        'success': True,
+        'results': results,
+        'indexing': symbols.building,
+        'elapsed_ms': round((time.perf_counter() - start) * 1000, 2)
+    })
+
+@main.route('/api/symbols/definition', methods=['POST'])
+def find_symbol_definition():
+    """Go to definition: where a tag, state, focus, event, ... is defined"""
+    return _symbol_query(lambda symbols, name, kind, limit: symbols.definitions(name, kind))
+
+@main.route('/api/symbols/references', methods=['POST'])
+def find_symbol_references():
+    """Find references: every place a symbol is used"""
+    return _symbol_query(lambda symbols, name, kind, limit: symbols.references(name, kind, limit))
+
+@main.route('/api/symbols/search', methods=['POST'])
+def search_symbols():
+    """Definitions whose name starts with the typed text"""
+    return _symbol_query(lambda symbols, name, kind, limit: symbols.search(name, kind, min(limit, 200)))
+
+@main.route('/api/symbols/status', methods=['POST'])
+def get_symbol_index_status():
+    """Indexing state and symbol counts"""
+    symbols = project_manager.symbols
+    if not project_manager.current_project or not symbols:
+        return jsonify({'success': False, 'error': 'No project loaded'})
+    
+    return jsonify({
+        'success': True,
+        'indexing': symbols.building,
+        'last_refresh': symbols.last_report,
+        **symbols.stats()
+    })
+
+@main.route('/api/localisation/lookup', methods=['POST'])
+def lookup_localisation():
+    """Localised text for a list of keys"""
+    localisation = project_manager.localisation
+    if not project_manager.current_project or not localisation:
+        return jsonify({'success': False, 'error': 'No project loaded'})
+    
+    data = request.get_json()
+    language = data.get('language', DEFAULT_LANGUAGE)
+    localisation.ensure_loaded()
+    
+    return jsonify({
+        'success': True,
+        'language': language,
+        'texts': localisation.lookup(data.get('keys', []), language)
+    })
+
+@main.route('/api/localisation/duplicates', methods=['POST'])
+def get_localisation_duplicates():
+    """Keys defined in more than one localisation file"""
+    localisation = project_manager.localisation
+    if not project_manager.current_project or not localisation:
+        return jsonify({'success': False, 'error': 'No project loaded'})
+    
+    data = request.get_json(silent=True) or {}
+    localisation.ensure_loaded()
+    
+    return jsonify({
+        'success': True,
+        'languages': sorted(localisation.language_counts()),
+        'duplicates': localisation.duplicates(data.get('language', DEFAULT_LANGUAGE))
+    })
+
+@main.route('/api/search')
+def search_project():
+    """Search all text files of the project, streaming matches over SSE
+    
+    Query parameters: query, regex, case_sensitive, include and exclude
+    (comma-separated globs like "common/*,events/*").
+    """
+    def split_globs(value):
+        return [glob.strip() for glob in (value or '').split(',') if glob.strip()]
+    
+    def flag(name):
+        return request.args.get(name, '').lower() in ('1', 'true', 'yes')
+    
+    def error_stream(message):
+        yield format_event({'type': 'search_error', 'error': message})
+    
+    query = request.args.get('query', '')
+    if not project_manager.current_project:
+        return Response(error_stream('No project loaded'), mimetype='text/event-stream')
+    if not query:
+        return Response(error_stream('No search text provided'), mimetype='text/event-stream')
+    
+    try:
+        search = TextSearch(project_manager.current_project, query,
+                            regex=flag('regex'), case_sensitive=flag('case_sensitive'),
+                            include=split_globs(request.args.get('include')),
+                            exclude=split_globs(request.args.get('exclude')))
+    except re.error as e:
+        return Response(error_stream(f"Invalid regular expression: {e}"), mimetype='text/event-stream')
+    
+    def generate():
+        active_searches[search.id] = search
+        start = time.perf_counter()
+        try:
+            yield format_event({'type': 'search_started', 'search_id': search.id})
+            for path, matches in search.run():
+                yield format_event({
+                    'type': 'search_results',
+                    'path': path,
+                    'matches': matches,
+                    'elapsed': round(time.perf_counter() - start, 3)
+                })
+            yield format_event({'type': 'search_done', 'elapsed': round(time.perf_counter() - start, 3),
+                                **search.summary()})
+        finally:
+            # Also runs when the client disconnects mid-stream
+            search.cancel()
+            active_searches.pop(search.id, None)
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@main.route('/api/search/cancel', methods=['POST'])
+def cancel_search():
+    """Stop a running search"""
+    data = request.get_json()
+    search = active_searches.get(data.get('search_id'))
+    if search is None:
+        return jsonify({'success': False, 'error': 'Search not found'})
+    
+    search.cancel()
+    return jsonify({'success': True})
+
 @main.route('/api/get_file_content', methods=['POST'])
 def get_file_content():
     data = request.get_json()
@@ -174,7 +365,7 @@ def create_country():
         return jsonify({'success': False, 'message': 'Tag and name are required'})
     
     # Initialize country creator
-    country_creator = CountryCreator(project_manager.current_project)
+    country_creator = CountryCreator(project_manager.current_project, project_manager.countries)
     
     # Validate and convert color
     color_rgb = country_creator.validate_color(color_hex)
@@ -192,6 +383,153 @@ def create_country():
     
     return jsonify({'success': success, 'message': message})
 state_editor = None
+tile_server = None
+file_watcher = None
+
+# Pushes file change notifications to open editors over SSE
+event_stream = EventStream()
+
+# Compressed bodies of the large editor responses, keyed by content tag
+response_cache = ResponseCache()
+
+def _get_tile_server():
+    """Get the tile server for the current state editor"""
+    global tile_server
+    if tile_server is None or tile_server.editor is not state_editor:
+        tile_server = TileServer(state_editor)
+    return tile_server
+
+def _states_changed(province_ids=None):
+    """Refresh state-dependent map layers after an edit.
+
+    With province IDs only the tiles around those provinces are dropped;
+    the returned patch tells the client which tiles to refetch.
+    """
+    tiles = _get_tile_server()
+    if province_ids is None:
+        return tiles.invalidate()
+    return tiles.update_provinces(province_ids)
+
+def _start_file_watcher(project_root):
+    """Watch the project for edits made outside the tool"""
+    global file_watcher
+    if file_watcher and file_watcher.root == os.path.abspath(project_root):
+        return
+    if file_watcher:
+        file_watcher.stop()
+    file_watcher = FileWatcher(project_root, _on_files_changed).start()
+    logger.info("Watching %s for changes (%s)", project_root, file_watcher.backend)
+
+def _state_display_names(names):
+    """Localised text for state name keys, {} without a project index"""
+    localisation = project_manager.localisation
+    if localisation is None:
+        return {}
+    localisation.ensure_loaded()
+    return localisation.lookup(set(names))
+
+def _localise_states(summaries):
+    """Add the localised name of each state summary as display_name"""
+    if project_manager.localisation is None:
+        return summaries
+    names = _state_display_names(summary['name'] for summary in summaries)
+    for summary in summaries:
+        summary['display_name'] = names.get(summary['name'])
+    return summaries
+
+def _wants_binary(data):
+    """Whether the client asked for the binary columnar format"""
+    return (data or {}).get('format') == 'binary' or request.args.get('format') == 'binary'
+
+def _cached_response(tag, build, mimetype):
+    """Serve a large body by content tag, compressed and revalidatable.
+
+    `tag` must change whenever the content does. The ETag is the tag plus
+    the negotiated content coding; a request that already has it gets an
+    empty 304. Otherwise the body comes from response_cache, so build()
+    runs and the body is compressed once per tag, not once per request.
+    """
+    encoding = accepted_encoding(request.headers.get('Accept-Encoding'))
+    etag = f"{tag}-{encoding}" if encoding else tag
+    
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = Response(response_cache.get(tag, encoding, build), mimetype=mimetype)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    # The browser keeps the body but asks again before every use
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def _editor_is_current():
+    """Whether the loaded editor is still in sync with the project files
+
+    Once states are loaded the file watcher applies outside edits as they
+    happen, so reopening the editor doesn't need to read anything again.
+    """
+    return (state_editor.loaded and file_watcher is not None
+            and file_watcher.root == os.path.abspath(state_editor.project_root))
+
+def _on_files_changed(changes):
+    """Reparse externally edited files and tell connected clients"""
+    changed = changes['added'] + changes['modified'] + changes['deleted']
+    symbols = project_manager.symbols
+    if symbols and symbols.project_root == file_watcher.root:
+        symbols.update_paths(changed)
+    
+    localisation = project_manager.localisation
+    loc_changed = False
+    if localisation and localisation.loaded and localisation.project_root == file_watcher.root:
+        for path in changed:
+            if localisation.is_localisation_file(path):
+                localisation.reload_file(path)
+                loc_changed = True
+    
+    editor = state_editor
+    if editor is None or os.path.abspath(editor.project_root) != file_watcher.root:
+        return
+    
+    result = editor.apply_file_changes(changes)
+    event = {
+        'type': 'files_changed',
+        'states': _localise_states([editor.get_state_summary(state_id) for state_id in
+                                    (editor.states if loc_changed else result['states_updated'])
+                                    if state_id in editor.states]),
+        'removed_states': result['states_removed'],
+        'conflicts': result['conflicts'],
+        'reload': result['definition'],
+        'dirty': None,
+        'colors': None
+    }
+    
+    country_files = [path for path in result['other']
+                     if path.startswith(('common/countries/', 'common/country_tags/'))]
+    if country_files:
+        colors = project_manager.countries.colors()
+        _get_tile_server().set_country_colors(colors)
+        event['colors'] = colors
+        event['dirty'] = _states_changed()
+    elif result['definition']:
+        event['dirty'] = _states_changed()
+    elif result['province_ids']:
+        event['dirty'] = _states_changed(result['province_ids'])
+    
+    if event['states'] or event['removed_states'] or event['conflicts'] or event['dirty']:
+        logger.info("Reloaded changed files: %d states updated, %d removed, %d conflicts",
+                    len(event['states']), len(event['removed_states']), len(event['conflicts']))
+        event_stream.publish(event)
+
+@main.route('/api/state_editor/events')
+def state_editor_events():
+    """Server-Sent Events stream of project file changes"""
+    subscriber = event_stream.subscribe()
+    return Response(stream_with_context(event_stream.stream(subscriber)),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @main.route('/api/state_editor/check_files', methods=['POST'])
 def check_state_files():
@@ -200,7 +538,9 @@ def check_state_files():
         return jsonify({'success': False, 'error': 'No project loaded'})
     
     global state_editor
-    state_editor = StateEditor(project_manager.current_project)
+    # Keep the loaded editor (and its undo history) when reopening the same project
+    if not state_editor or state_editor.project_root != project_manager.current_project:
+        state_editor = StateEditor(project_manager.current_project)
     
     missing = state_editor.check_required_files()
     
@@ -244,38 +584,123 @@ def copy_game_files():
     
     return jsonify({'success': success, 'message': message})
 
-@main.route('/api/state_editor/initialize', methods=['POST'])
+@main.route('/api/state_editor/initialize', methods=['GET', 'POST'])
 def initialize_state_editor():
     """Initialize the state editor - parse files and load data"""
     global state_editor
     
+    data = request.get_json(silent=True) or {}
+    
     if not project_manager.current_project:
         return jsonify({'success': False, 'error': 'No project loaded'})
     
     if not state_editor:
         state_editor = StateEditor(project_manager.current_project)
     
+    if _editor_is_current() and not data.get('reload'):
+        tiles = _get_tile_server()
+        tiles.set_country_colors(project_manager.countries.colors())
+        return _state_payload_response(data)
+    
     # Parse definition.csv
     success, message = state_editor.parse_definition_csv()
     if not success:
         return jsonify({'success': False, 'error': message})
     
-    # Load all states
-    success, message = state_editor.load_all_states()
-    if not success:
-        return jsonify({'success': False, 'error': message})
+    # Load all states (parsed on a process pool for large projects). With
+    # write-behind edits still pending, memory is newer than the files.
+    if state_editor.write_behind and state_editor.has_unsaved_changes():
+        logger.info("Keeping in-memory states, write-behind flush pending")
+    else:
+        success, message = state_editor.load_all_states(workers=data.get('workers'))
+        if not success:
+            return jsonify({'success': False, 'error': message})
+        logger.info("%s", message)
+    
+    # Build (or load the cached) province raster used for picking and borders
+    if state_editor.get_province_labels() is None:
+        return jsonify({'success': False, 'error': 'Failed to load provinces.bmp'})
+    
+    # Fill the static tile pyramid in the background; missing tiles are
+    # rendered on demand until it is done
+    tiles = _get_tile_server()
+    tiles.set_country_colors(project_manager.countries.colors())
+    tiles.invalidate()
+    threading.Thread(target=tiles.pregenerate, daemon=True).start()
     
-    # Get summary data
-    states_summary = state_editor.get_all_states_summary()
+    _start_file_watcher(project_manager.current_project)
+    
+    return _state_payload_response(data)
+
+def _state_payload_response(data):
+    """All state summaries, cached per editor revision"""
+    localisation = project_manager.localisation
+    if localisation is not None:
+        localisation.ensure_loaded()
+    binary = _wants_binary(data)
+    
+    def build():
+        meta = {
+            'success': True,
+            'session': state_editor.session,
+            'revision': state_editor.revision,
+            'province_count': len(state_editor.provinces),
+            'state_count': len(state_editor.states),
+            'load_time': state_editor.load_progress['elapsed'],
+            'write_behind': state_editor.write_behind is not None
+        }
+        
+        # PERFORMANCE: the binary format sends the states as typed columns
+        if binary:
+            names = _state_display_names(state.get('name') for state in state_editor.states.values())
+            columns, strings = state_editor.get_state_columns(display_names=names)
+            return encode_payload(columns, strings, meta)
+        
+        # Get summary data
+        meta['states'] = _localise_states(state_editor.get_all_states_summary())
+        return json.dumps(meta).encode('utf-8')
+    
+    # Edits can't land between naming the content and building it
+    with state_editor.lock:
+        tag = '-'.join(str(part) for part in (
+            'states', state_editor.session, state_editor.revision,
+            localisation.revision if localisation is not None else 0,
+            int(state_editor.write_behind is not None), 'binary' if binary else 'json'))
+        return _cached_response(tag, build, BINARY_MIMETYPE if binary else 'application/json')
+
+@main.route('/api/state_editor/write_behind', methods=['POST'])
+def set_write_behind():
+    """Turn write-behind saving on or off"""
+    data = request.get_json()
+    
+    global state_editor
+    
+    if not state_editor:
+        return jsonify({'success': False, 'error': 'State editor not initialized'})
+    
+    report = None
+    if data.get('enabled'):
+        state_editor.enable_write_behind(interval=float(data.get('interval', 2.0)))
+    else:
+        report = state_editor.disable_write_behind()
     
     return jsonify({
         'success': True,
-        'province_count': len(state_editor.provinces),
-        'state_count': len(state_editor.states),
-        'states': states_summary
+        'enabled': state_editor.write_behind is not None,
+        'flush': report
     })
 
-@main.route('/api/state_editor/get_map_image', methods=['POST'])
+@main.route('/api/state_editor/load_progress', methods=['POST'])
+def get_load_progress():
+    """Get how far the current state load has got"""
+    global state_editor
+    
+    if not state_editor:
+        return jsonify({'success': False, 'error': 'State editor not initialized'})
+    
+    return jsonify({'success': True, **state_editor.load_progress})
+
+@main.route('/api/state_editor/get_map_image', methods=['GET', 'POST'])
 def get_map_image():
     """Get the provinces.bmp as base64 for frontend rendering"""
     global state_editor
@@ -284,37 +709,62 @@ def get_map_image():
         return jsonify({'success': False, 'error': 'State editor not initialized'})
     
     try:
-        success, img = state_editor.load_provinces_image()
-        if not success:
-            return jsonify({'success': False, 'error': 'Failed to load image'})
-        
-        # Convert to base64
-        buffered = BytesIO()
-        img.save(buffered, format="PNG")
-        img_str = base64.b64encode(buffered.getvalue()).decode()
+        def build():
+            # Only decoded when the cache has no body for this tag
+            success, img = state_editor.load_provinces_image()
+            if not success:
+                raise ValueError('Failed to load image')
+            
+            # Convert to base64
+            buffered = BytesIO()
+            img.save(buffered, format="PNG")
+            img_str = base64.b64encode(buffered.getvalue()).decode()
+            
+            return json.dumps({
+                'success': True,
+                'image': f'data:image/png;base64,{img_str}',
+                'width': img.width,
+                'height': img.height
+            }).encode('utf-8')
         
-        return jsonify({
-            'success': True,
-            'image': f'data:image/png;base64,{img_str}',
-            'width': img.width,
-            'height': img.height
-        })
+        return _cached_response(f"map-{state_editor.raster.source_key()}", build, 'application/json')
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
-@main.route('/api/state_editor/get_province_data', methods=['POST'])
+@main.route('/api/state_editor/get_province_data', methods=['GET', 'POST'])
 def get_province_data():
     """Get all province data for frontend"""
+    data = request.get_json(silent=True) or {}
+    
     global state_editor
     
     if not state_editor:
         return jsonify({'success': False, 'error': 'State editor not initialized'})
     
-    return jsonify({
-        'success': True,
-        'provinces': state_editor.provinces,
-        'color_map': state_editor.get_province_color_map()
-    })
+    binary = _wants_binary(data)
+    
+    def build():
+        if binary:
+            columns, strings = state_editor.get_province_columns()
+            return encode_payload(columns, strings, {'success': True, 'province_count': len(columns['id'])})
+        
+        return json.dumps({
+            'success': True,
+            'provinces': state_editor.provinces,
+            'geometry': state_editor.get_province_geometry(),
+            'color_map': state_editor.get_province_color_map()
+        }).encode('utf-8')
+    
+    # Provinces only change with provinces.bmp and definition.csv, but the
+    # binary columns also carry each province's state, which edits change
+    with state_editor.lock:
+        if binary:
+            tag = '-'.join(str(part) for part in (
+                'provinces', state_editor.raster.source_key(),
+                state_editor.session, state_editor.revision, 'binary'))
+        else:
+            tag = f"provinces-{state_editor.raster.source_key()}-json"
+        return _cached_response(tag, build, BINARY_MIMETYPE if binary else 'application/json')
 
 @main.route('/api/state_editor/get_province_at_pixel', methods=['POST'])
 def get_province_at_pixel():
@@ -329,16 +779,7 @@ def get_province_at_pixel():
         return jsonify({'success': False, 'error': 'State editor not initialized'})
     
     try:
-        success, img = state_editor.load_provinces_image()
-        if not success:
-            return jsonify({'success': False, 'error': 'Failed to load image'})
-        
-        # Get pixel color
-        pixel = img.getpixel((x, y))
-        
-        # Find matching province
-        color_map = state_editor.get_province_color_map()
-        province_id = color_map.get(pixel)
+        province_id = state_editor.get_province_at_pixel(x, y)
         
         if province_id:
             # Get state info
@@ -373,12 +814,15 @@ def create_state():
     
     try:
         new_state_id = state_editor.create_new_state(province_id, owner_tag)
-        success, message = state_editor.save_state(new_state_id)
+        flush = state_editor.commit()
+        dirty = _states_changed([province_id] if province_id else [])
         
         return jsonify({
             'success': True,
             'state_id': new_state_id,
-            'message': f'Created state {new_state_id}'
+            'message': f'Created state {new_state_id}',
+            'flush': flush,
+            'dirty': dirty
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
@@ -389,32 +833,10 @@ def get_country_colors():
     if not project_manager.current_project:
         return jsonify({'success': False, 'error': 'No project loaded'})
     
-    colors = {}
-    countries_dir = os.path.join(project_manager.current_project, 'common', 'countries')
-    
     try:
-        # First, read the country tags file
-        tags_file = os.path.join(project_manager.current_project, 'common', 'country_tags', '00_countries.txt')
-        if os.path.exists(tags_file):
-            with open(tags_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # Parse country tag assignments
-            import re
-            tag_pattern = re.compile(r'(\w{3})\s*=\s*"countries/([^"]+)"')
-            matches = tag_pattern.findall(content)
-            
-            for tag, country_file in matches:
-                country_path = os.path.join(countries_dir, country_file)
-                if os.path.exists(country_path):
-                    with open(country_path, 'r', encoding='utf-8') as cf:
-                        country_content = cf.read()
-                    
-                    # Extract color
-                    color_match = re.search(r'color\s*=\s*{\s*(\d+)\s*(\d+)\s*(\d+)\s*}', country_content)
-                    if color_match:
-                        r, g, b = map(int, color_match.groups())
-                        colors[tag] = [r, g, b]
+        colors = project_manager.countries.colors()
+        if state_editor:
+            _get_tile_server().set_country_colors(colors)
         
         return jsonify({'success': True, 'colors': colors})
     
@@ -435,10 +857,12 @@ def add_province_to_state():
     
     try:
         success, message = state_editor.add_province_to_state(state_id, province_id)
+        flush = dirty = None
         if success:
-            state_editor.save_state(state_id)
+            flush = state_editor.commit()
+            dirty = _states_changed([province_id])
         
-        return jsonify({'success': success, 'message': message})
+        return jsonify({'success': success, 'message': message, 'flush': flush, 'dirty': dirty})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
@@ -456,10 +880,12 @@ def set_state_owner():
     
     try:
         success, message = state_editor.set_state_owner(state_id, owner_tag)
+        flush = dirty = None
         if success:
-            state_editor.save_state(state_id)
+            flush = state_editor.commit()
+            dirty = _states_changed(state_editor.states[state_id]['provinces'])
         
-        return jsonify({'success': success, 'message': message})
+        return jsonify({'success': success, 'message': message, 'flush': flush, 'dirty': dirty})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
@@ -469,18 +895,10 @@ def get_available_tags():
     if not project_manager.current_project:
         return jsonify({'success': False, 'error': 'No project loaded'})
     
-    tags_file = os.path.join(project_manager.current_project, 'common', 'country_tags', '00_countries.txt')
-    
-    tags = []
-    if os.path.exists(tags_file):
-        try:
-            with open(tags_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-            # Extract tags
-            import re
-            tags = re.findall(r'^(\w{3})\s*=', content, re.MULTILINE)
-        except:
-            pass
+    try:
+        tags = project_manager.countries.tags()
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
     
     return jsonify({'success': True, 'tags': tags})
 
@@ -493,17 +911,16 @@ def get_province_outlines():
         return jsonify({'success': False, 'error': 'State editor not initialized'})
     
     try:
-        # Generate outlines if not already done
-        if not state_editor.province_outlines:
-            success, message = state_editor.generate_province_outlines()
-            if not success:
-                return jsonify({'success': False, 'error': message})
+        # Generated again once provinces.bmp changes
+        success, outlines = state_editor.get_province_outlines()
+        if not success:
+            return jsonify({'success': False, 'error': outlines})
         
         return jsonify({
             'success': True,
-            'outlines': state_editor.province_outlines,
-            'map_width': 5632,  # Standard HOI4 map dimensions
-            'map_height': 2048
+            'outlines': outlines,
+            'map_width': state_editor.raster.width,
+            'map_height': state_editor.raster.height
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
@@ -516,8 +933,11 @@ def generate_province_outlines():
     if not state_editor:
         return jsonify({'success': False, 'error': 'State editor not initialized'})
     
+    data = request.get_json(silent=True) or {}
+    tolerance = float(data.get('tolerance', 1.0))
+    
     try:
-        success, message = state_editor.generate_province_outlines()
+        success, message = state_editor.generate_province_outlines(tolerance=tolerance)
         return jsonify({'success': success, 'message': message})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
@@ -547,12 +967,14 @@ def update_state():
     
     try:
         success, message = state_editor.update_state_properties(state_id, properties)
+        flush = dirty = None
         
         if success:
             # Save the state immediately
-            state_editor.save_state(state_id)
+            flush = state_editor.commit()
+            dirty = _states_changed(state_editor.states[state_id]['provinces'])
         
-        return jsonify({'success': success, 'message': message})
+        return jsonify({'success': success, 'message': message, 'flush': flush, 'dirty': dirty})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
@@ -568,27 +990,117 @@ def delete_state():
         return jsonify({'success': False, 'error': 'State editor not initialized'})
     
     try:
-        if state_id not in state_editor.states:
-            return jsonify({'success': False, 'error': 'State not found'})
+        provinces = list(state_editor.states.get(state_id, {}).get('provinces', []))
+        success, message = state_editor.delete_state(state_id)
+        if not success:
+            return jsonify({'success': False, 'error': message})
+        
+        flush = state_editor.commit()
+        dirty = _states_changed(provinces)
         
-        # Remove the state file
-        state_data = state_editor.states[state_id]
-        filepath = os.path.join(state_editor.states_dir, state_data['file'])
+        return jsonify({'success': True, 'message': message, 'flush': flush, 'dirty': dirty})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@main.route('/api/state_editor/batch', methods=['POST'])
+def apply_state_batch():
+    """Apply a list of state edits atomically with one save and one map update"""
+    data = request.get_json()
+    
+    global state_editor
+    
+    if not state_editor:
+        return jsonify({'success': False, 'error': 'State editor not initialized'})
+    
+    try:
+        success, result = state_editor.apply_batch(data.get('operations'))
+        if not success:
+            return jsonify({'success': False, 'error': '; '.join(result['errors']), 'errors': result['errors']})
         
-        if os.path.exists(filepath):
-            os.remove(filepath)
+        flush = state_editor.commit()
+        dirty = _states_changed(result['province_ids'])
         
-        # Remove from memory
-        for prov_id in state_data.get('provinces', []):
-            if prov_id in state_editor.province_to_state:
-                del state_editor.province_to_state[prov_id]
+        return jsonify({
+            'success': True,
+            'created': result['created'],
+            'states': _localise_states([state_editor.get_state_summary(state_id) for state_id in result['states']]),
+            'removed_states': result['removed_states'],
+            'flush': flush,
+            'dirty': dirty
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+def _history_step(step):
+    """Run undo or redo and describe what changed, like a batch response"""
+    global state_editor
+    
+    if not state_editor:
+        return jsonify({'success': False, 'error': 'State editor not initialized'})
+    
+    try:
+        success, result = step()
+        if not success:
+            return jsonify({'success': False, 'error': result, 'history': state_editor.history.status()})
         
-        del state_editor.states[state_id]
+        flush = state_editor.commit()
+        dirty = _states_changed(result['province_ids'])
         
-        return jsonify({'success': True, 'message': f'State {state_id} deleted'})
+        return jsonify({
+            'success': True,
+            'label': result['label'],
+            'states': _localise_states([state_editor.get_state_summary(state_id) for state_id in result['states']]),
+            'removed_states': result['removed_states'],
+            'history': state_editor.history.status(),
+            'flush': flush,
+            'dirty': dirty
+        })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+@main.route('/api/state_editor/undo', methods=['POST'])
+def undo_state_edit():
+    """Revert the latest state edit"""
+    return _history_step(lambda: state_editor.undo())
+
+@main.route('/api/state_editor/redo', methods=['POST'])
+def redo_state_edit():
+    """Re-apply the latest undone state edit"""
+    return _history_step(lambda: state_editor.redo())
+
+@main.route('/api/state_editor/changes')
+def get_state_changes():
+    """Get the states created, updated and deleted since ?since=N"""
+    global state_editor
+    
+    if not state_editor:
+        return jsonify({'success': False, 'error': 'State editor not initialized'})
+    
+    since = request.args.get('since', type=int)
+    if since is None:
+        return jsonify({'success': False, 'error': 'No revision provided'})
+    
+    with state_editor.lock:
+        changes = state_editor.changes_since(since, session=request.args.get('session'))
+        if not changes['full']:
+            for kind in ('created', 'updated'):
+                changes[kind] = _localise_states([state_editor.get_state_summary(state_id)
+                                                  for state_id in changes[kind]])
+            # JSON object keys are strings, so moves go as [province, state] pairs
+            changes['moves'] = [[province_id, state_id] for province_id, state_id in changes['moves'].items()]
+    
+    return jsonify({'success': True, **changes})
+
+@main.route('/api/state_editor/history', methods=['POST'])
+def get_edit_history():
+    """Whether undo and redo are available, with the edits they would apply"""
+    global state_editor
+    
+    if not state_editor:
+        return jsonify({'success': False, 'error': 'State editor not initialized'})
+    
+    return jsonify({'success': True, 'history': state_editor.history.status()})
+
 @main.route('/api/create_ideologies_file', methods=['POST'])
 def create_ideologies_file():
     """Create empty ideologies file and localization"""
@@ -636,33 +1148,14 @@ def remove_province_from_state():
         return jsonify({'success': False, 'error': 'State editor not initialized'})
     
     try:
-        # Check if state exists
-        if state_id not in state_editor.states:
-            return jsonify({'success': False, 'error': 'State not found'})
-        
-        # Check if province is in the state
-        if province_id not in state_editor.states[state_id]['provinces']:
-            return jsonify({'success': False, 'error': 'Province not in this state'})
-        
-        # Remove the province
-        state_editor.states[state_id]['provinces'].remove(province_id)
-        
-        # Update province-to-state mapping
-        if province_id in state_editor.province_to_state:
-            del state_editor.province_to_state[province_id]
-        
-        # Regenerate state file content
-        state_editor.states[state_id]['raw_content'] = state_editor.generate_state_content(
-            state_editor.states[state_id]
-        )
-        
-        # Save the state
-        success, message = state_editor.save_state(state_id)
+        success, message = state_editor.remove_province_from_state(state_id, province_id)
         
         if success:
             return jsonify({
                 'success': True,
-                'message': f'Province {province_id} removed from state {state_id}'
+                'message': message,
+                'flush': state_editor.commit(),
+                'dirty': _states_changed([province_id])
             })
         else:
             return jsonify({'success': False, 'error': message})
@@ -679,46 +1172,16 @@ def get_province_borders():
         return jsonify({'success': False, 'error': 'State editor not initialized'})
     
     try:
-        success, img = state_editor.load_provinces_image()
-        if not success:
+        labels = state_editor.get_province_labels()
+        if labels is None:
             return jsonify({'success': False, 'error': 'Failed to load provinces image'})
         
-        # Create a border detection image
-        from PIL import Image, ImageDraw
-        import numpy as np
-        
-        img_array = np.array(img)
-        height, width = img_array.shape[:2]
-        
-        border_img = Image.new('RGBA', (width, height), (0, 0, 0, 0))
-        draw = ImageDraw.Draw(border_img)
-        
-        # Detect province borders
-        for y in range(1, height - 1):
-            for x in range(1, width - 1):
-                pixel = tuple(img_array[y, x, :3])
-                
-                # Check 4-directional neighbors
-                neighbors = [
-                    tuple(img_array[y-1, x, :3]),
-                    tuple(img_array[y+1, x, :3]),
-                    tuple(img_array[y, x-1, :3]),
-                    tuple(img_array[y, x+1, :3])
-                ]
-                
-                # If any neighbor is different, this is a border pixel
-                if any(n != pixel for n in neighbors):
-                    # Light gray for province borders
-                    draw.point((x, y), fill=(180, 180, 180, 255))
-        
-        # Convert to base64
-        buffered = BytesIO()
-        border_img.save(buffered, format="PNG")
-        img_str = base64.b64encode(buffered.getvalue()).decode()
+        mask = province_border_mask(labels)
+        border_img = render_overlay(mask, PROVINCE_BORDER_COLOR)
         
         return jsonify({
             'success': True,
-            'image': f'data:image/png;base64,{img_str}'
+            'image': _encode_png_data_url(border_img)
         })
         
     except Exception as e:
@@ -733,69 +1196,159 @@ def get_state_borders():
         return jsonify({'success': False, 'error': 'State editor not initialized'})
     
     try:
-        success, img = state_editor.load_provinces_image()
-        if not success:
+        labels = state_editor.get_province_labels()
+        if labels is None:
             return jsonify({'success': False, 'error': 'Failed to load provinces image'})
         
-        from PIL import Image, ImageDraw
-        import numpy as np
-        
-        img_array = np.array(img)
-        height, width = img_array.shape[:2]
-        
-        border_img = Image.new('RGBA', (width, height), (0, 0, 0, 0))
-        draw = ImageDraw.Draw(border_img)
-        
-        # Create color to province mapping
-        color_to_province = {}
-        for prov_id, prov_data in state_editor.provinces.items():
-            color = (prov_data['r'], prov_data['g'], prov_data['b'])
-            color_to_province[color] = prov_id
-        
-        # Detect state borders
-        for y in range(1, height - 1):
-            for x in range(1, width - 1):
-                pixel = tuple(img_array[y, x, :3])
-                prov_id = color_to_province.get(pixel)
-                
-                if not prov_id:
-                    continue
-                
-                current_state = state_editor.province_to_state.get(prov_id)
-                
-                # Check 4-directional neighbors
-                neighbors = [
-                    (tuple(img_array[y-1, x, :3]), x, y-1),
-                    (tuple(img_array[y+1, x, :3]), x, y+1),
-                    (tuple(img_array[y, x-1, :3]), x-1, y),
-                    (tuple(img_array[y, x+1, :3]), x+1, y)
-                ]
-                
-                for neighbor_color, nx, ny in neighbors:
-                    neighbor_prov = color_to_province.get(neighbor_color)
-                    if not neighbor_prov:
-                        continue
-                    
-                    neighbor_state = state_editor.province_to_state.get(neighbor_prov)
-                    
-                    # If different states, draw black border
-                    if current_state != neighbor_state:
-                        draw.point((x, y), fill=(0, 0, 0, 255))
-                        break
-        
-        # Convert to base64
-        buffered = BytesIO()
-        border_img.save(buffered, format="PNG")
-        img_str = base64.b64encode(buffered.getvalue()).decode()
+        mask = state_border_mask(labels, state_editor.get_state_lookup())
+        border_img = render_overlay(mask, STATE_BORDER_COLOR)
         
         return jsonify({
             'success': True,
-            'image': f'data:image/png;base64,{img_str}'
+            'image': _encode_png_data_url(border_img)
         })
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+@main.route('/api/state_editor/get_province_neighbors', methods=['POST'])
+def get_province_neighbors():
+    """Get the provinces touching a province"""
+    data = request.get_json()
+    province_id = data.get('province_id')
+    
+    global state_editor
+    
+    if not state_editor:
+        return jsonify({'success': False, 'error': 'State editor not initialized'})
+    
+    try:
+        return jsonify({
+            'success': True,
+            'province_id': province_id,
+            'neighbors': state_editor.get_province_neighbors(province_id)
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@main.route('/api/state_editor/get_adjacency', methods=['POST'])
+def get_adjacency():
+    """Get the whole province adjacency graph"""
+    global state_editor
+    
+    if not state_editor:
+        return jsonify({'success': False, 'error': 'State editor not initialized'})
+    
+    try:
+        return jsonify({
+            'success': True,
+            'fields': ['a', 'b', 'shared_border', 'different_state'],
+            'edges': state_editor.get_adjacency_edges()
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@main.route('/api/state_editor/check_state_contiguity', methods=['POST'])
+def check_state_contiguity():
+    """Check whether a state's provinces are connected"""
+    data = request.get_json()
+    state_id = data.get('state_id')
+    
+    global state_editor
+    
+    if not state_editor:
+        return jsonify({'success': False, 'error': 'State editor not initialized'})
+    
+    success, parts = state_editor.check_state_contiguity(state_id)
+    if not success:
+        return jsonify({'success': False, 'error': parts})
+    
+    return jsonify({
+        'success': True,
+        'contiguous': len(parts) <= 1,
+        'parts': parts
+    })
+
+@main.route('/api/state_editor/select', methods=['POST'])
+def select_provinces():
+    """Select provinces by rectangle, lasso polygon or flood fill from a seed"""
+    data = request.get_json()
+    
+    global state_editor
+    
+    if not state_editor:
+        return jsonify({'success': False, 'error': 'State editor not initialized'})
+    
+    try:
+        start = time.perf_counter()
+        success, result = state_editor.select_provinces(data)
+        if not success:
+            return jsonify({'success': False, 'error': result})
+        
+        return jsonify({
+            'success': True,
+            'province_ids': result,
+            'count': len(result),
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 2)
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@main.route('/api/state_editor/tiles/meta', methods=['POST'])
+def get_tile_metadata():
+    """Get map size, zoom levels and layer versions for the tile viewer"""
+    global state_editor
+    
+    if not state_editor:
+        return jsonify({'success': False, 'error': 'State editor not initialized'})
+    
+    metadata = _get_tile_server().get_metadata()
+    if metadata is None:
+        return jsonify({'success': False, 'error': 'Failed to load provinces image'})
+    
+    return jsonify({'success': True, **metadata})
+
+@main.route('/api/state_editor/tiles/<layer>/<int:z>/<int:x>/<int:y>.png')
+def get_map_tile(layer, z, x, y):
+    """Serve one PNG tile of a map layer"""
+    global state_editor
+    
+    if not state_editor:
+        return Response(status=404)
+    
+    state_id = request.args.get('state', type=int)
+    tiles = _get_tile_server()
+    
+    # Cached layers are named by their version, so an unchanged tile
+    # revalidates without being rendered or read from disk
+    etag = None
+    if layer in STATIC_LAYERS + DYNAMIC_LAYERS:
+        etag = f"{layer}-{tiles.layer_version(layer)}-{z}-{x}-{y}"
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
+    
+    png = tiles.get_tile(layer, z, x, y, state_id=state_id)
+    if png is None:
+        return Response(status=404)
+    
+    response = Response(png, mimetype='image/png')
+    if etag:
+        response.set_etag(etag)
+    # Tile URLs carry the layer version, so they can be cached aggressively
+    if request.args.get('v'):
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+def _encode_png_data_url(img):
+    """Encode a PIL image as a base64 PNG data URL"""
+    buffered = BytesIO()
+    # Overlays are mostly transparent, so a fast compression level is plenty
+    img.save(buffered, format="PNG", compress_level=1)
+    img_str = base64.b64encode(buffered.getvalue()).decode()
+    return f'data:image/png;base64,{img_str}'
+
 @main.route('/api/save_file', methods=['POST'])
 def save_file():
     data = request.get_json()
@@ -3,12 +3,15 @@ class HOI4ModEditor {
         this.currentProject = null;
         this.openTabs = new Map();
         this.unsavedChanges = new Set();
+        this.searchSource = null;
+        this.searchId = null;
         
         console.log('HOI4ModEditor initializing...');
         
         this.initCountryEditor();
         this.initFocusTreeEditor();
 	this.initIdeologyEditor();
+        this.initSearch();
         this.initEventListeners();
         
         console.log('HOI4ModEditor initialized');
@@ -196,6 +199,143 @@ initIdeologyEditor() {
         $('#confirm-focus-tree-create').on('click', () => this.createFocusTree());
     }
 
+    initSearch() {
+        const searchHTML = `
+            <div id="project-search" class="mb-3">
+                <div class="input-group input-group-sm mb-1">
+                    <input type="text" class="form-control bg-dark text-light border-secondary"
+                           id="search-query" placeholder="Search in project...">
+                    <button class="btn btn-outline-secondary" id="search-btn" title="Search">
+                        <i class="bi bi-search"></i>
+                    </button>
+                    <button class="btn btn-outline-danger d-none" id="search-cancel-btn" title="Stop">
+                        <i class="bi bi-stop-fill"></i>
+                    </button>
+                </div>
+                <input type="text" class="form-control form-control-sm bg-dark text-light border-secondary mb-1"
+                       id="search-include" placeholder="Files to include, e.g. common/*,events/*">
+                <div class="d-flex gap-3 small text-light">
+                    <div class="form-check">
+                        <input class="form-check-input" type="checkbox" id="search-regex">
+                        <label class="form-check-label" for="search-regex">Regex</label>
+                    </div>
+                    <div class="form-check">
+                        <input class="form-check-input" type="checkbox" id="search-case">
+                        <label class="form-check-label" for="search-case">Match case</label>
+                    </div>
+                </div>
+                <div id="search-status" class="small text-muted"></div>
+                <div id="search-results" class="small text-light" style="max-height: 40vh; overflow-y: auto;"></div>
+            </div>
+        `;
+        $('#file-tree').before(searchHTML);
+        
+        $('#search-btn').on('click', () => this.startSearch());
+        $('#search-query').on('keydown', (e) => {
+            if (e.key === 'Enter') this.startSearch();
+        });
+        $('#search-cancel-btn').on('click', () => this.cancelSearch());
+    }
+
+    startSearch() {
+        const query = $('#search-query').val();
+        if (!query) return;
+        if (!this.currentProject) {
+            alert('Please open a project first!');
+            return;
+        }
+        
+        this.cancelSearch();
+        
+        const results = $('#search-results');
+        results.empty();
+        $('#search-status').text('Searching...');
+        $('#search-cancel-btn').removeClass('d-none');
+        
+        const params = new URLSearchParams({
+            query: query,
+            regex: $('#search-regex').is(':checked'),
+            case_sensitive: $('#search-case').is(':checked'),
+            include: $('#search-include').val()
+        });
+        
+        // PERFORMANCE: matches are streamed file by file while the server
+        // is still searching
+        let matchCount = 0;
+        const source = new EventSource(`/api/search?${params}`);
+        this.searchSource = source;
+        
+        source.addEventListener('search_started', (e) => {
+            this.searchId = JSON.parse(e.data).search_id;
+        });
+        
+        source.addEventListener('search_results', (e) => {
+            const result = JSON.parse(e.data);
+            matchCount += result.matches.length;
+            
+            const fileElement = $('<div>').addClass('mt-2');
+            $('<div>')
+                .addClass('file-item text-info')
+                .text(`${result.path} (${result.matches.length})`)
+                .on('click', () => this.openFile(result.path, result.path.split('/').pop()))
+                .appendTo(fileElement);
+            
+            result.matches.slice(0, 50).forEach(([line, column, text]) => {
+                $('<div>')
+                    .addClass('file-item ps-3 text-truncate')
+                    .attr('title', text)
+                    .text(`${line}: ${text.trim()}`)
+                    .on('click', () => this.openFile(result.path, result.path.split('/').pop()))
+                    .appendTo(fileElement);
+            });
+            
+            results.append(fileElement);
+            $('#search-status').text(`${matchCount} matches so far...`);
+        });
+        
+        source.addEventListener('search_done', (e) => {
+            const summary = JSON.parse(e.data);
+            let status = `${summary.matches} matches in ${summary.files_searched} files (${summary.elapsed.toFixed(2)}s)`;
+            if (summary.truncated) status += ', stopped at the result limit';
+            if (summary.cancelled) status += ', cancelled';
+            this.finishSearch(status);
+        });
+        
+        source.addEventListener('search_error', (e) => {
+            this.finishSearch(JSON.parse(e.data).error);
+        });
+        
+        source.onerror = () => {
+            if (this.searchSource === source) {
+                this.finishSearch(`${matchCount} matches (connection lost)`);
+            }
+        };
+    }
+
+    async cancelSearch() {
+        if (!this.searchSource) return;
+        
+        const searchId = this.searchId;
+        this.finishSearch('Search cancelled');
+        if (searchId) {
+            await fetch('/api/search/cancel', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ search_id: searchId })
+            });
+        }
+    }
+
+    finishSearch(status) {
+        if (this.searchSource) {
+            this.searchSource.close();
+            this.searchSource = null;
+        }
+        this.searchId = null;
+        $('#search-cancel-btn').addClass('d-none');
+        $('#search-status').text(status);
+    }
+
     initEventListeners() {
         $('#open-project-btn').on('click', () => this.openProjectDialog());
     }
@@ -365,60 +505,99 @@ initIdeologyEditor() {
             return;
         }
 
-        const renderItem = (item, depth = 0) => {
-            const itemElement = $('<div>').addClass('mb-1');
+        // PERFORMANCE: only the root is listed up front, folders fetch
+        // their contents (a page at a time) when first expanded
+        this.appendTreeItems(treeContainer, structure.children, 0);
+        if (structure.has_more) {
+            this.appendLoadMore(treeContainer, structure.path, structure.children.length, 0);
+        }
+    }
+
+    appendTreeItems(container, items, depth) {
+        items.forEach(item => {
+            container.append(this.renderTreeItem(item, depth));
+        });
+    }
+
+    renderTreeItem(item, depth) {
+        const itemElement = $('<div>').addClass('mb-1');
+        
+        if (item.type === 'folder') {
+            const contentsElement = $('<div>')
+                .addClass('folder-contents')
+                .css('display', 'none');
             
-            if (item.type === 'folder') {
-                const folderElement = $('<div>')
-                    .addClass('folder-item d-flex align-items-center')
-                    .css('padding-left', `${depth * 15}px`)
-                    .html(`<i class="bi bi-folder me-2"></i>${item.name}`)
-                    .on('click', function(e) {
-                        e.stopPropagation();
-                        const $this = $(this);
-                        const $icon = $this.find('i');
-                        const $contents = $this.next('.folder-contents');
-                        
-                        $contents.toggle();
-                        $icon.toggleClass('bi-folder-fill bi-folder');
-                    });
-                
-                itemElement.append(folderElement);
-                
-                const contentsElement = $('<div>')
-                    .addClass('folder-contents')
-                    .css('display', depth === 0 ? 'block' : 'none');
-                
-                if (item.children && item.children.length > 0) {
-                    item.children.forEach(child => {
-                        contentsElement.append(renderItem(child, depth + 1));
-                    });
-                } else {
-                    contentsElement.append('<div class="text-muted ps-3">Empty folder</div>');
-                }
-                
-                itemElement.append(contentsElement);
-                
-                if (depth === 0) {
-                    folderElement.find('i').addClass('bi-folder-fill');
-                }
-                
-            } else {
-                const fileElement = $('<div>')
-                    .addClass('file-item d-flex align-items-center')
-                    .css('padding-left', `${depth * 15}px`)
-                    .html(`<i class="bi ${this.getFileIcon(item.name)} me-2"></i>${item.name}`)
-                    .on('click', () => this.openFile(item.path, item.name));
-                
-                itemElement.append(fileElement);
-            }
+            let loaded = false;
+            const folderElement = $('<div>')
+                .addClass('folder-item d-flex align-items-center')
+                .css('padding-left', `${depth * 15}px`)
+                .html(`<i class="bi bi-folder me-2"></i>${item.name}`)
+                .on('click', async (e) => {
+                    e.stopPropagation();
+                    const $icon = folderElement.find('i');
+                    
+                    if (!loaded) {
+                        loaded = true;
+                        await this.loadFolderPage(contentsElement, item.path, 0, depth + 1);
+                    }
+                    
+                    contentsElement.toggle();
+                    $icon.toggleClass('bi-folder-fill bi-folder');
+                });
             
-            return itemElement;
-        };
+            itemElement.append(folderElement);
+            itemElement.append(contentsElement);
+        } else {
+            const fileElement = $('<div>')
+                .addClass('file-item d-flex align-items-center')
+                .css('padding-left', `${depth * 15}px`)
+                .html(`<i class="bi ${this.getFileIcon(item.name)} me-2"></i>${item.name}`)
+                .on('click', () => this.openFile(item.path, item.name));
+            
+            itemElement.append(fileElement);
+        }
+        
+        return itemElement;
+    }
 
-        structure.children.forEach(child => {
-            treeContainer.append(renderItem(child, 0));
+    async loadFolderPage(container, path, offset, depth) {
+        const response = await fetch('/api/list_directory', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ path: path, offset: offset })
         });
+        
+        const result = await response.json();
+        
+        if (!result.success) {
+            container.append(`<div class="text-danger ps-3">${result.error}</div>`);
+            return;
+        }
+        
+        if (result.total === 0) {
+            container.append('<div class="text-muted ps-3">Empty folder</div>');
+            return;
+        }
+        
+        this.appendTreeItems(container, result.entries, depth);
+        if (result.has_more) {
+            this.appendLoadMore(container, path, result.offset + result.entries.length, depth, result.total);
+        }
+    }
+
+    appendLoadMore(container, path, offset, depth, total = null) {
+        const remaining = total !== null ? ` (${total - offset} more)` : '';
+        const loadMore = $('<div>')
+            .addClass('file-item text-info')
+            .css('padding-left', `${depth * 15}px`)
+            .html(`<i class="bi bi-three-dots me-2"></i>Show more${remaining}`)
+            .on('click', async (e) => {
+                e.stopPropagation();
+                loadMore.remove();
+                await this.loadFolderPage(container, path, offset, depth);
+            });
+        
+        container.append(loadMore);
     }
 
     getFileIcon(filename) {
@@ -791,4 +970,4 @@ $(document).ready(() => {
         console.error('Failed to initialize HOI4ModEditor:', error);
         alert('Failed to initialize editor: ' + error.message);
     }
-});
\ No newline at end of file
+});
\ No newline at end of file
@@ -0,0 +1,52 @@
+// Decoder for the binary columnar payloads (utils/binary_payload.py).
+//
+// Layout: "HPAB", uint32 header length, JSON header, then 8-byte aligned
+// little-endian columns. Columns are returned as typed array views over
+// the response buffer, so nothing is copied or parsed per value.
+
+const BINARY_PAYLOAD_TYPES = {
+    uint8: Uint8Array, uint16: Uint16Array, uint32: Uint32Array,
+    int8: Int8Array, int16: Int16Array, int32: Int32Array,
+    float32: Float32Array, float64: Float64Array
+};
+
+function decodeBinaryPayload(buffer) {
+    const view = new DataView(buffer);
+    const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+    if (magic !== 'HPAB') {
+        throw new Error('Not a binary payload');
+    }
+
+    const headerLength = view.getUint32(4, true);
+    const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 8, headerLength)));
+    const dataStart = 8 + headerLength;
+
+    const columns = {};
+    for (const [name, column] of Object.entries(header.columns)) {
+        const ArrayType = BINARY_PAYLOAD_TYPES[column.dtype];
+        const values = new ArrayType(buffer, dataStart + column.offset, column.length * column.width);
+        values.width = column.width;
+        columns[name] = values;
+    }
+
+    return { meta: header.meta, strings: header.strings, columns: columns };
+}
+
+async function fetchBinaryPayload(url, params = {}) {
+    // PERFORMANCE: a GET the browser may cache; 'no-cache' makes it
+    // revalidate with the stored ETag, so an unchanged payload comes back
+    // as an empty 304 and is served from the HTTP cache. Errors still come
+    // back as JSON.
+    const query = new URLSearchParams({ ...params, format: 'binary' });
+    const response = await fetch(`${url}?${query}`, { cache: 'no-cache' });
+
+    if (response.headers.get('Content-Type') !== 'application/octet-stream') {
+        return { meta: await response.json(), strings: {}, columns: {} };
+    }
+    return decodeBinaryPayload(await response.arrayBuffer());
+}
+
+function raggedRow(offsets, values, row) {
+    // Row i of a flattened list column, as a view
+    return values.subarray(offsets[row], offsets[row + 1]);
+}
@@ -1,18 +1,133 @@
+class ProvinceTable {
+    // Province data from the binary get_province_data payload, read
+    // straight from its columns by province ID
+    constructor(payload = null) {
+        this.payload = payload;
+        this.rowOf = new Int32Array(0);
+        if (!payload) return;
+        
+        const ids = payload.columns.id;
+        this.rowOf = new Int32Array(ids.length ? ids[ids.length - 1] + 1 : 0).fill(-1);
+        ids.forEach((provinceId, row) => { this.rowOf[provinceId] = row; });
+    }
+
+    row(provinceId) {
+        return provinceId >= 0 && provinceId < this.rowOf.length ? this.rowOf[provinceId] : -1;
+    }
+
+    has(provinceId) {
+        return this.row(provinceId) >= 0;
+    }
+
+    get(provinceId) {
+        const row = this.row(provinceId);
+        if (row < 0) return null;
+        const { strings, columns } = this.payload;
+        return {
+            r: columns.color[row * 3],
+            g: columns.color[row * 3 + 1],
+            b: columns.color[row * 3 + 2],
+            type: strings.type[columns.type[row]],
+            coastal: columns.coastal[row] === 1,
+            terrain: strings.terrain[columns.terrain[row]],
+            continent: strings.continent[columns.continent[row]]
+        };
+    }
+
+    geometry(provinceId) {
+        // Null for provinces that aren't on the map
+        const row = this.row(provinceId);
+        const columns = this.payload ? this.payload.columns : {};
+        if (row < 0 || !columns.area || columns.area[row] === 0) return null;
+        return {
+            bbox: Array.from(columns.bbox.subarray(row * 4, row * 4 + 4)),
+            area: columns.area[row],
+            label_point: [columns.label_point[row * 2], columns.label_point[row * 2 + 1]]
+        };
+    }
+}
+
+class PayloadState {
+    // A state summary backed by the binary initialize payload. It has the
+    // same fields as the JSON summary; the lists and maps behind the
+    // properties panel are decoded on first read.
+    constructor(payload, row) {
+        const columns = payload.columns;
+        this.payload = payload;
+        this.row = row;
+        this.id = columns.id[row];
+        this.provinces = raggedRow(columns.province_offsets, columns.provinces, row);
+        this.province_count = this.provinces.length;
+    }
+
+    string(column) {
+        return this.payload.strings[column][this.payload.columns[column][this.row]];
+    }
+
+    strings(column, offsets) {
+        const codes = raggedRow(this.payload.columns[offsets], this.payload.columns[column], this.row);
+        return Array.from(codes, code => this.payload.strings[column][code]);
+    }
+
+    get name() { return this.string('name'); }
+    get display_name() { return this.string('display_name'); }
+    get owner() { return this.string('owner'); }
+    get state_category() { return this.string('state_category'); }
+    get manpower() { return this.payload.columns.manpower[this.row]; }
+    get cores() { return this.strings('cores', 'core_offsets'); }
+    get claims() { return this.strings('claims', 'claim_offsets'); }
+
+    get resources() {
+        const columns = this.payload.columns;
+        const amounts = raggedRow(columns.resource_offsets, columns.resource_amounts, this.row);
+        const resources = {};
+        this.strings('resource_keys', 'resource_offsets').forEach((key, i) => {
+            resources[key] = amounts[i];
+        });
+        return resources;
+    }
+
+    get buildings() {
+        const names = this.payload.strings.buildings;
+        const buildings = {};
+        names.forEach((name, i) => {
+            buildings[name] = this.payload.columns.buildings[this.row * names.length + i];
+        });
+        return buildings;
+    }
+
+    get victory_points() {
+        const columns = this.payload.columns;
+        const values = raggedRow(columns.vp_offsets, columns.vp_values, this.row);
+        return Array.from(raggedRow(columns.vp_offsets, columns.vp_provinces, this.row),
+                          (province, i) => ({ province: province, value: values[i] }));
+    }
+}
+
 class StateEditorGUI {
     constructor() {
         this.canvas = null;
         this.ctx = null;
-        this.mapImage = null;
-        this.provinces = {};
-        this.colorMap = {};
+        this.provinces = new ProvinceTable();
         this.states = {};
         this.provinceToState = {};
         this.countryColors = {};
         this.selectedState = null;
         
+        // PERFORMANCE: Server revision the client's states match; after an
+        // edit only the states changed since then are fetched
+        this.session = null;
+        this.revision = 0;
+        
         // FIXED: Three distinct click modes
         this.clickMode = 'view'; // 'view', 'add_province', 'remove_province'
         
+        // PERFORMANCE: Area selections are resolved server-side in one
+        // request; selectionPath is the rectangle or lasso being dragged
+        this.selection = [];
+        this.selectionPath = null;
+        this.suppressClick = false;
+        
         this.currentOwnerTag = null;
         this.zoom = 1.0;
         this.panX = 0;
@@ -21,25 +136,18 @@ class StateEditorGUI {
         this.lastMouseX = 0;
         this.lastMouseY = 0;
         this.modal = null;
-        this.offscreenCanvas = null;
-        this.offscreenCtx = null;
-        this.stylizedImage = null;
-        this.provinceBordersImage = null;
-        this.stateBordersImage = null;
         this.showStateBorders = true;
         this.showProvinceBorders = true;
         
-        // PERFORMANCE: Cache rendered layers
-        this.cachedLayers = {
-            stylized: null,
-            provinceBorders: null,
-            stateBorders: null
-        };
-        this.layersDirty = {
-            stylized: true,
-            provinceBorders: false,
-            stateBorders: true
-        };
+        // PERFORMANCE: The map is drawn from server-side tiles, only the
+        // tiles visible at the current zoom are fetched
+        this.tileMeta = null;
+        this.tileCache = new Map();
+        this.tileRevisions = new Map();
+        this.renderQueued = false;
+        this.hoverTimer = null;
+        this.writeBehind = false;
+        this.eventSource = null;
     }
 
     async init() {
@@ -143,38 +251,48 @@ class StateEditorGUI {
     async initializeEditor() {
         console.log('Initializing state editor backend...');
         
-        const initResponse = await fetch('/api/state_editor/initialize', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' }
-        });
+        // Report state loading progress while the backend parses history/states
+        const progressTimer = setInterval(async () => {
+            try {
+                const response = await fetch('/api/state_editor/load_progress', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' }
+                });
+                const progress = await response.json();
+                if (progress.success && progress.running) {
+                    console.log(`Loading states: ${progress.done}/${progress.total} (${progress.elapsed.toFixed(1)}s)`);
+                }
+            } catch (error) {
+                // Progress is informational only
+            }
+        }, 500);
         
-        const initResult = await initResponse.json();
+        let initResult;
+        let payload;
+        try {
+            // PERFORMANCE: states arrive as binary columns, not JSON objects
+            payload = await fetchBinaryPayload('/api/state_editor/initialize');
+            initResult = payload.meta;
+        } finally {
+            clearInterval(progressTimer);
+        }
         
         if (!initResult.success) {
             alert('Failed to initialize: ' + initResult.error);
             return false;
         }
         
-        console.log(`Loaded ${initResult.province_count} provinces and ${initResult.state_count} states`);
+        console.log(`Loaded ${initResult.province_count} provinces and ${initResult.state_count} states in ${initResult.load_time.toFixed(2)}s`);
         
-        this.states = {};
-        this.provinceToState = {};
-        initResult.states.forEach(state => {
-            this.states[state.id] = state;
-            state.provinces.forEach(provinceId => {
-                this.provinceToState[provinceId] = state.id;
-            });
-        });
+        this.writeBehind = !!initResult.write_behind;
+        this.setStates(this.statesFromPayload(payload));
+        this.session = initResult.session;
+        this.revision = initResult.revision;
         
         await this.loadCountryColors();
-        await this.loadMapImage();
+        await this.loadTileMetadata();
         await this.loadProvinceData();
         
-        // Create all visual layers
-        await this.createStylizedMap();
-        await this.createProvinceBorders();
-        await this.createStateBorders();
-        
         this.createUI();
         return true;
     }
@@ -192,8 +310,8 @@ class StateEditorGUI {
         }
     }
 
-    async loadMapImage() {
-        const response = await fetch('/api/state_editor/get_map_image', {
+    async loadTileMetadata() {
+        const response = await fetch('/api/state_editor/tiles/meta', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' }
         });
@@ -201,259 +319,48 @@ class StateEditorGUI {
         const result = await response.json();
         
         if (!result.success) {
-            throw new Error('Failed to load map image: ' + result.error);
-        }
-        
-        return new Promise((resolve, reject) => {
-            this.mapImage = new Image();
-            this.mapImage.onload = () => {
-                this.offscreenCanvas = document.createElement('canvas');
-                this.offscreenCanvas.width = this.mapImage.width;
-                this.offscreenCanvas.height = this.mapImage.height;
-                this.offscreenCtx = this.offscreenCanvas.getContext('2d');
-                this.offscreenCtx.drawImage(this.mapImage, 0, 0);
-                resolve();
-            };
-            this.mapImage.onerror = () => reject(new Error('Failed to load image'));
-            this.mapImage.src = result.image;
-        });
-    }
-
-    async loadProvinceData() {
-        const response = await fetch('/api/state_editor/get_province_data', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' }
-        });
-        
-        const result = await response.json();
-        
-        if (result.success) {
-            this.provinces = result.provinces;
-            this.colorMap = result.color_map;
+            throw new Error('Failed to load map tiles: ' + result.error);
         }
-    }
-
-    async createStylizedMap() {
-        console.log('Creating stylized map with highlights...');
         
-        return new Promise((resolve) => {
-            const canvas = document.createElement('canvas');
-            canvas.width = this.mapImage.width;
-            canvas.height = this.mapImage.height;
-            const ctx = canvas.getContext('2d');
-            
-            ctx.drawImage(this.mapImage, 0, 0);
-            
-            const imageData = ctx.getImageData(0, 0, canvas.width, canvas.height);
-            const data = imageData.data;
-            
-            // Track which provinces belong to selected state
-            const selectedProvinces = new Set();
-            if (this.selectedState) {
-                this.selectedState.provinces.forEach(p => selectedProvinces.add(p));
-            }
-            
-            for (let i = 0; i < data.length; i += 4) {
-                const r = data[i];
-                const g = data[i + 1];
-                const b = data[i + 2];
-                const colorKey = `${r},${g},${b}`;
-                const provinceId = this.colorMap[colorKey];
-                
-                if (provinceId && this.provinces[provinceId]) {
-                    const province = this.provinces[provinceId];
-                    const stateId = this.provinceToState[provinceId];
-                    
-                    if (province.type === 'land') {
-                        let baseColor;
-                        
-                        if (stateId && this.states[stateId] && this.states[stateId].owner) {
-                            const owner = this.states[stateId].owner;
-                            if (this.countryColors[owner]) {
-                                const color = this.countryColors[owner];
-                                baseColor = [
-                                    Math.min(255, color[0] + 40),
-                                    Math.min(255, color[1] + 40),
-                                    Math.min(255, color[2] + 40)
-                                ];
-                            } else {
-                                baseColor = [200, 200, 200];
-                            }
-                        } else {
-                            // Unassigned - light gray
-                            baseColor = [200, 200, 200];
-                        }
-                        
-                        // Apply highlights
-                        if (selectedProvinces.has(provinceId)) {
-                            // Selected province - much darker
-                            data[i] = Math.max(0, baseColor[0] - 60);
-                            data[i + 1] = Math.max(0, baseColor[1] - 60);
-                            data[i + 2] = Math.max(0, baseColor[2] - 60);
-                        } else if (this.selectedState && stateId === this.selectedState.id) {
-                            // Same state but different province - darker
-                            data[i] = Math.max(0, baseColor[0] - 40);
-                            data[i + 1] = Math.max(0, baseColor[1] - 40);
-                            data[i + 2] = Math.max(0, baseColor[2] - 40);
-                        } else {
-                            // Normal
-                            data[i] = baseColor[0];
-                            data[i + 1] = baseColor[1];
-                            data[i + 2] = baseColor[2];
-                        }
-                    } else if (province.type === 'sea') {
-                        // Much darker ocean
-                        data[i] = 30;
-                        data[i + 1] = 50;
-                        data[i + 2] = 80;
-                    } else if (province.type === 'lake') {
-                        // Lakes slightly lighter than ocean
-                        data[i] = 50;
-                        data[i + 1] = 70;
-                        data[i + 2] = 100;
-                    }
-                } else {
-                    // Unknown - very dark
-                    data[i] = 20;
-                    data[i + 1] = 20;
-                    data[i + 2] = 20;
+        // Forget tiles of layers whose content changed
+        const previous = this.tileMeta;
+        if (previous) {
+            for (const key of Array.from(this.tileCache.keys())) {
+                const layer = key.split('/')[0];
+                if (layer === 'highlight' || previous.versions[layer] !== result.versions[layer]) {
+                    this.tileCache.delete(key);
                 }
             }
-            
-            ctx.putImageData(imageData, 0, 0);
-            
-            this.stylizedImage = new Image();
-            this.stylizedImage.onload = () => {
-                console.log('Stylized map created');
-                this.cachedLayers.stylized = this.stylizedImage;
-                this.layersDirty.stylized = false;
-                resolve();
-            };
-            this.stylizedImage.src = canvas.toDataURL();
-        });
+        }
+        
+        this.tileMeta = result;
     }
 
-    async createProvinceBorders() {
-        console.log('Creating province borders (thin)...');
-        
-        return new Promise((resolve) => {
-            const canvas = document.createElement('canvas');
-            canvas.width = this.mapImage.width;
-            canvas.height = this.mapImage.height;
-            const ctx = canvas.getContext('2d');
-            
-            const imageData = this.offscreenCtx.getImageData(0, 0, canvas.width, canvas.height);
-            const data = imageData.data;
-            const borderData = ctx.createImageData(canvas.width, canvas.height);
-            
-            // Thinner borders - only draw on certain pixels
-            for (let y = 1; y < canvas.height - 1; y++) {
-                for (let x = 1; x < canvas.width - 1; x++) {
-                    const idx = (y * canvas.width + x) * 4;
-                    const r = data[idx], g = data[idx + 1], b = data[idx + 2];
-                    const colorKey = `${r},${g},${b}`;
-                    const provinceId = this.colorMap[colorKey];
-                    
-                    if (provinceId) {
-                        // Only check right and down neighbors for thinner lines
-                        const neighbors = [
-                            {dx: 1, dy: 0},
-                            {dx: 0, dy: 1}
-                        ];
-                        
-                        for (const {dx, dy} of neighbors) {
-                            const nx = x + dx, ny = y + dy;
-                            const nIdx = (ny * canvas.width + nx) * 4;
-                            const nr = data[nIdx], ng = data[nIdx + 1], nb = data[nIdx + 2];
-                            const nColorKey = `${nr},${ng},${nb}`;
-                            const nProvinceId = this.colorMap[nColorKey];
-                            
-                            if (nProvinceId && nProvinceId !== provinceId) {
-                                borderData.data[idx] = 110;
-                                borderData.data[idx + 1] = 110;
-                                borderData.data[idx + 2] = 110;
-                                borderData.data[idx + 3] = 200; // Slightly transparent
-                                break;
-                            }
-                        }
-                    }
-                }
-            }
-            
-            ctx.putImageData(borderData, 0, 0);
-            
-            this.provinceBordersImage = new Image();
-            this.provinceBordersImage.onload = () => {
-                console.log('Province borders created');
-                this.cachedLayers.provinceBorders = this.provinceBordersImage;
-                this.layersDirty.provinceBorders = false;
-                resolve();
-            };
-            this.provinceBordersImage.src = canvas.toDataURL();
-        });
+    async loadProvinceData() {
+        const payload = await fetchBinaryPayload('/api/state_editor/get_province_data');
+        if (payload.meta.success) {
+            this.provinces = new ProvinceTable(payload);
+        }
     }
 
-    async createStateBorders() {
-        console.log('Creating state borders...');
-        
-        return new Promise((resolve) => {
-            const canvas = document.createElement('canvas');
-            canvas.width = this.mapImage.width;
-            canvas.height = this.mapImage.height;
-            const ctx = canvas.getContext('2d');
-            
-            const imageData = this.offscreenCtx.getImageData(0, 0, canvas.width, canvas.height);
-            const data = imageData.data;
-            const borderData = ctx.createImageData(canvas.width, canvas.height);
-            
-            for (let y = 1; y < canvas.height - 1; y++) {
-                for (let x = 1; x < canvas.width - 1; x++) {
-                    const idx = (y * canvas.width + x) * 4;
-                    const r = data[idx], g = data[idx + 1], b = data[idx + 2];
-                    const colorKey = `${r},${g},${b}`;
-                    const provinceId = this.colorMap[colorKey];
-                    
-                    if (provinceId) {
-                        const stateId = this.provinceToState[provinceId];
-                        
-                        const neighbors = [
-                            {dx: -1, dy: 0}, {dx: 1, dy: 0},
-                            {dx: 0, dy: -1}, {dx: 0, dy: 1}
-                        ];
-                        
-                        for (const {dx, dy} of neighbors) {
-                            const nx = x + dx, ny = y + dy;
-                            const nIdx = (ny * canvas.width + nx) * 4;
-                            const nr = data[nIdx], ng = data[nIdx + 1], nb = data[nIdx + 2];
-                            const nColorKey = `${nr},${ng},${nb}`;
-                            const nProvinceId = this.colorMap[nColorKey];
-                            
-                            if (nProvinceId) {
-                                const nStateId = this.provinceToState[nProvinceId];
-                                
-                                if (stateId !== nStateId) {
-                                    borderData.data[idx] = 0;
-                                    borderData.data[idx + 1] = 0;
-                                    borderData.data[idx + 2] = 0;
-                                    borderData.data[idx + 3] = 255;
-                                    break;
-                                }
-                            }
-                        }
-                    }
-                }
-            }
-            
-            ctx.putImageData(borderData, 0, 0);
-            
-            this.stateBordersImage = new Image();
-            this.stateBordersImage.onload = () => {
-                console.log('State borders created');
-                this.cachedLayers.stateBorders = this.stateBordersImage;
-                this.layersDirty.stateBorders = false;
-                resolve();
-            };
-            this.stateBordersImage.src = canvas.toDataURL();
+    statesFromPayload(payload) {
+        // PERFORMANCE: state objects are thin views over the payload
+        // columns, so nothing is decoded per state until it is read
+        const states = [];
+        for (let row = 0; row < payload.columns.id.length; row++) {
+            states.push(new PayloadState(payload, row));
+        }
+        return states;
+    }
+
+    setStates(states) {
+        this.states = {};
+        this.provinceToState = {};
+        states.forEach(state => {
+            this.states[state.id] = state;
+            state.provinces.forEach(provinceId => {
+                this.provinceToState[provinceId] = state.id;
+            });
         });
     }
 
@@ -501,6 +408,44 @@ class StateEditorGUI {
                                             <button class="btn btn-outline-warning btn-sm click-mode-btn" data-mode="remove_province">
                                                 <i class="bi bi-dash-square me-1"></i>Remove Province from State
                                             </button>
+                                            <button class="btn btn-outline-info btn-sm click-mode-btn" data-mode="select_rect">
+                                                <i class="bi bi-bounding-box me-1"></i>Select Rectangle
+                                            </button>
+                                            <button class="btn btn-outline-info btn-sm click-mode-btn" data-mode="select_lasso">
+                                                <i class="bi bi-bezier2 me-1"></i>Select Lasso
+                                            </button>
+                                            <button class="btn btn-outline-info btn-sm click-mode-btn" data-mode="select_flood">
+                                                <i class="bi bi-paint-bucket me-1"></i>Select Similar
+                                            </button>
+                                        </div>
+                                        
+                                        <div id="selection-tools" class="mb-3">
+                                            <div class="small text-muted mb-1">Select Similar matches the clicked province:</div>
+                                            <div class="d-flex flex-wrap gap-2 small mb-2">
+                                                <div class="form-check">
+                                                    <input class="form-check-input select-criterion" type="checkbox" value="terrain" id="select-terrain">
+                                                    <label class="form-check-label" for="select-terrain">Terrain</label>
+                                                </div>
+                                                <div class="form-check">
+                                                    <input class="form-check-input select-criterion" type="checkbox" value="continent" id="select-continent">
+                                                    <label class="form-check-label" for="select-continent">Continent</label>
+                                                </div>
+                                                <div class="form-check">
+                                                    <input class="form-check-input select-criterion" type="checkbox" value="owner" id="select-owner" checked>
+                                                    <label class="form-check-label" for="select-owner">Owner</label>
+                                                </div>
+                                            </div>
+                                            <div class="input-group input-group-sm mb-2">
+                                                <span class="input-group-text bg-dark text-light border-secondary">Max hops</span>
+                                                <input type="number" min="0" class="form-control bg-dark text-light border-secondary" id="select-max-hops" placeholder="Unlimited">
+                                            </div>
+                                            <div class="small mb-2" id="selection-count">No provinces selected</div>
+                                            <button class="btn btn-info btn-sm w-100 mb-1" id="add-selection-btn" disabled>
+                                                <i class="bi bi-plus-square me-1"></i>Add Selection to State
+                                            </button>
+                                            <button class="btn btn-outline-secondary btn-sm w-100" id="clear-selection-btn" disabled>
+                                                <i class="bi bi-x me-1"></i>Clear Selection
+                                            </button>
                                         </div>
                                         
                                         <button class="btn btn-secondary w-100 mb-2" id="deselect-state-btn">
@@ -537,8 +482,25 @@ class StateEditorGUI {
                                         </div>
                                     </div>
                                     
+                                    <div class="mt-3">
+                                        <h6><i class="bi bi-hdd me-1"></i>Saving</h6>
+                                        <div class="form-check form-switch">
+                                            <input class="form-check-input" type="checkbox" id="write-behind-toggle" ${this.writeBehind ? 'checked' : ''}>
+                                            <label class="form-check-label" for="write-behind-toggle">Save in Background</label>
+                                        </div>
+                                    </div>
+                                    
                                     <hr class="border-secondary my-3">
                                     
+                                    <div class="btn-group w-100 mb-2">
+                                        <button class="btn btn-outline-light btn-sm" id="undo-edit-btn" title="Undo (Ctrl+Z)" disabled>
+                                            <i class="bi bi-arrow-counterclockwise me-1"></i>Undo
+                                        </button>
+                                        <button class="btn btn-outline-light btn-sm" id="redo-edit-btn" title="Redo (Ctrl+Y)" disabled>
+                                            <i class="bi bi-arrow-clockwise me-1"></i>Redo
+                                        </button>
+                                    </div>
+                                    
                                     <button class="btn btn-success w-100" id="save-all-states">
                                         <i class="bi bi-save me-1"></i>Save All States
                                     </button>
@@ -582,6 +544,7 @@ class StateEditorGUI {
             this.setupCanvas();
             this.setupEventListeners();
             this.loadAvailableTags();
+            this.connectEvents();
             this.render();
         }, 500);
     }
@@ -612,7 +575,23 @@ class StateEditorGUI {
         
         // Buttons
         $('#save-all-states').on('click', () => this.saveAllStates());
+        $('#undo-edit-btn').on('click', () => this.stepHistory('undo'));
+        $('#redo-edit-btn').on('click', () => this.stepHistory('redo'));
+        $(document).on('keydown.stateEditor', (e) => {
+            if (!(e.ctrlKey || e.metaKey) || $(e.target).is('input, textarea, select')) return;
+            const key = e.key.toLowerCase();
+            if (key === 'z' && !e.shiftKey) {
+                e.preventDefault();
+                this.stepHistory('undo');
+            } else if (key === 'y' || (key === 'z' && e.shiftKey)) {
+                e.preventDefault();
+                this.stepHistory('redo');
+            }
+        });
+        $('#write-behind-toggle').on('change', (e) => this.setWriteBehind(e.target.checked));
         $('#close-state-editor').on('click', () => {
+            this.disconnectEvents();
+            $(document).off('keydown.stateEditor');
             this.modal.hide();
             $('#state-editor-modal').remove();
         });
@@ -624,12 +603,14 @@ class StateEditorGUI {
             this.setClickMode('view');
             this.updateSelectedStatePanel();
             this.renderPropertiesPanel();
-            this.layersDirty.stylized = true;
             this.render();
         });
         
         $('#delete-current-state').on('click', () => this.deleteCurrentState());
         
+        $('#add-selection-btn').on('click', () => this.addSelectionToState());
+        $('#clear-selection-btn').on('click', () => this.setSelection([]));
+        
         $('#paint-owner-btn').on('click', () => this.paintOwnerOnSelectedState());
         
         $('#show-province-borders').on('change', (e) => {
@@ -654,7 +635,10 @@ class StateEditorGUI {
         const modeNames = {
             'view': 'View',
             'add_province': 'Add Province to State ' + (this.selectedState ? this.selectedState.id : ''),
-            'remove_province': 'Remove Province from State ' + (this.selectedState ? this.selectedState.id : '')
+            'remove_province': 'Remove Province from State ' + (this.selectedState ? this.selectedState.id : ''),
+            'select_rect': 'Select Rectangle',
+            'select_lasso': 'Select Lasso',
+            'select_flood': 'Select Similar'
         };
         
         $('#click-mode-display').html(`Mode: <strong>${modeNames[mode]}</strong>`);
@@ -666,17 +650,25 @@ class StateEditorGUI {
             this.canvas.style.cursor = 'copy';
         } else if (mode === 'remove_province') {
             this.canvas.style.cursor = 'not-allowed';
+        } else {
+            this.canvas.style.cursor = 'crosshair';
         }
         
         // Show/hide mode notification
         $('#mode-notification').remove();
         if (mode !== 'view' && this.selectedState) {
-            const modeText = mode === 'add_province' 
-                ? `Click any province to ADD it to State ${this.selectedState.id}` 
-                : `Click any province in State ${this.selectedState.id} to REMOVE it`;
+            const modeTexts = {
+                'add_province': `Click any province to ADD it to State ${this.selectedState.id}`,
+                'remove_province': `Click any province in State ${this.selectedState.id} to REMOVE it`,
+                'select_rect': 'Drag a rectangle to select provinces (Shift adds to the selection)',
+                'select_lasso': 'Drag around provinces to select them (Shift adds to the selection)',
+                'select_flood': 'Click a province to select connected provinces like it (Shift adds to the selection)'
+            };
+            const alertClass = { 'add_province': 'success', 'remove_province': 'warning' }[mode] || 'info';
+            const modeText = modeTexts[mode];
             
             $('body').append(`
-                <div class="alert alert-${mode === 'add_province' ? 'success' : 'warning'} alert-dismissible fade show position-fixed top-0 start-50 translate-middle-x mt-3" 
+                <div class="alert alert-${alertClass} alert-dismissible fade show position-fixed top-0 start-50 translate-middle-x mt-3" 
                      style="z-index: 9999; max-width: 600px;" id="mode-notification">
                     <strong>${modeNames[mode]}</strong><br>
                     ${modeText}<br>
@@ -701,9 +693,16 @@ class StateEditorGUI {
             this.isDragging = true;
             this.canvas.style.cursor = 'grabbing';
             e.preventDefault();
+        } else if (e.button === 0 && (this.clickMode === 'select_rect' || this.clickMode === 'select_lasso')) {
+            const point = this.screenToWorld(this.lastMouseX, this.lastMouseY);
+            this.selectionPath = [point, point];
         }
     }
 
+    screenToWorld(screenX, screenY) {
+        return [(screenX - this.panX) / this.zoom, (screenY - this.panY) / this.zoom];
+    }
+
     handleMouseMove(e) {
         const rect = this.canvas.getBoundingClientRect();
         const mouseX = e.clientX - rect.left;
@@ -715,6 +714,18 @@ class StateEditorGUI {
             this.panX += dx;
             this.panY += dy;
             this.render();
+        } else if (this.selectionPath && (e.buttons & 1)) {
+            const point = this.screenToWorld(mouseX, mouseY);
+            if (this.clickMode === 'select_rect') {
+                this.selectionPath[1] = point;
+            } else {
+                // Thin the lasso to points a few screen pixels apart
+                const last = this.selectionPath[this.selectionPath.length - 1];
+                if (Math.hypot(point[0] - last[0], point[1] - last[1]) * this.zoom >= 3) {
+                    this.selectionPath.push(point);
+                }
+            }
+            this.scheduleRender();
         }
         
         this.lastMouseX = mouseX;
@@ -725,6 +736,25 @@ class StateEditorGUI {
 
     handleMouseUp(e) {
         this.isDragging = false;
+        
+        if (this.selectionPath) {
+            const path = this.selectionPath;
+            this.selectionPath = null;
+            
+            const [start, end] = [path[0], path[path.length - 1]];
+            const dragged = Math.hypot(end[0] - start[0], end[1] - start[1]) * this.zoom >= 3;
+            if (dragged) {
+                // The click that follows a drag must not select a state
+                this.suppressClick = true;
+                const query = this.clickMode === 'select_rect'
+                    ? { rect: [start[0], start[1], end[0], end[1]].map(Math.round) }
+                    : { polygon: path.map(([x, y]) => [Math.round(x), Math.round(y)]) };
+                this.selectProvinces(query, e.shiftKey);
+            }
+            this.render();
+            return;
+        }
+        
         this.setClickMode(this.clickMode);
     }
 
@@ -759,19 +789,23 @@ class StateEditorGUI {
 
     async handleClick(e) {
         if (this.isDragging) return;
+        if (this.suppressClick) {
+            this.suppressClick = false;
+            return;
+        }
         
         const rect = this.canvas.getBoundingClientRect();
         const mouseX = Math.floor((e.clientX - rect.left - this.panX) / this.zoom);
         const mouseY = Math.floor((e.clientY - rect.top - this.panY) / this.zoom);
         
-        const provinceId = this.getProvinceAtPixel(mouseX, mouseY);
+        const provinceId = await this.fetchProvinceAtPixel(mouseX, mouseY);
         
         if (!provinceId) {
             $('#province-info').html('<span class="text-warning">No province at cursor</span>');
             return;
         }
         
-        const province = this.provinces[provinceId];
+        const province = this.provinces.get(provinceId);
         if (province && (province.type === 'sea' || province.type === 'lake')) {
             $('#province-info').html(`<span class="text-danger">Cannot use ${province.type} provinces!</span>`);
             return;
@@ -789,6 +823,65 @@ class StateEditorGUI {
         } else if (this.clickMode === 'remove_province') {
             // Remove province mode
             await this.handleRemoveProvinceClick(provinceId, stateId);
+        } else if (this.clickMode === 'select_flood') {
+            // Connected provinces like the clicked one; never spill into sea
+            const criteria = ['type'];
+            $('.select-criterion:checked').each((_, input) => criteria.push(input.value));
+            const maxHops = $('#select-max-hops').val();
+            await this.selectProvinces({
+                seed: provinceId,
+                criteria: criteria,
+                max_hops: maxHops === '' ? null : parseInt(maxHops)
+            }, e.shiftKey);
+        }
+    }
+
+    async selectProvinces(query, extend = false) {
+        if (!query.seed) {
+            query.types = ['land'];
+        }
+        
+        const response = await fetch('/api/state_editor/select', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(query)
+        });
+        
+        const result = await response.json();
+        if (!result.success) {
+            $('#province-info').html(`<span class="text-danger">Selection failed: ${result.error}</span>`);
+            return;
+        }
+        
+        const ids = extend ? [...new Set([...this.selection, ...result.province_ids])] : result.province_ids;
+        this.setSelection(ids);
+    }
+
+    setSelection(provinceIds) {
+        this.selection = provinceIds;
+        const count = provinceIds.length;
+        $('#selection-count').text(count ? `${count.toLocaleString()} provinces selected` : 'No provinces selected');
+        $('#add-selection-btn').prop('disabled', count === 0);
+        $('#clear-selection-btn').prop('disabled', count === 0);
+        this.render();
+    }
+
+    async addSelectionToState() {
+        if (!this.selectedState || this.selection.length === 0) return;
+        
+        const stateId = this.selectedState.id;
+        const provinceIds = this.selection.filter(id => this.provinceToState[id] !== stateId);
+        if (provinceIds.length === 0) {
+            this.setSelection([]);
+            return;
+        }
+        
+        const result = await this.runBatch([
+            { op: 'move_provinces', state_id: stateId, province_ids: provinceIds }
+        ]);
+        if (result) {
+            $('#province-info').html(`<span class="text-success">✓ ${provinceIds.length} provinces added to State ${stateId}</span>`);
+            this.setSelection([]);
         }
     }
 
@@ -806,9 +899,7 @@ class StateEditorGUI {
         this.updateSelectedStatePanel();
         this.renderPropertiesPanel();
         
-        // Mark stylized layer dirty to show selection
-        this.layersDirty.stylized = true;
-        await this.createStylizedMap();
+        // The highlight layer follows the selected state
         this.render();
     }
 
@@ -839,9 +930,7 @@ class StateEditorGUI {
             $('#province-info').html(`<span class="text-success">✓ Province ${provinceId} added to State ${this.selectedState.id}</span>`);
             
             // Refresh data and visuals
-            this.layersDirty.stylized = true;
-            this.layersDirty.stateBorders = true;
-            await this.quickRefreshData();
+            await this.syncChanges(result.dirty);
             
             // Stay in add mode for convenience
         } else {
@@ -881,14 +970,17 @@ class StateEditorGUI {
             $('#province-info').html(`<span class="text-success">✓ Province ${provinceId} removed from State ${stateId}</span>`);
             
             // Refresh data and visuals
-            this.layersDirty.stylized = true;
-            this.layersDirty.stateBorders = true;
-            await this.quickRefreshData();
+            await this.syncChanges(result.dirty);
         } else {
             alert('Error: ' + result.message);
         }
     }
 
+    stateDisplayName(state) {
+        // Localised name when the project has one, the raw key otherwise
+        return state.display_name || state.name || 'Unnamed';
+    }
+
     updateSelectedStatePanel() {
         const panel = $('#selected-state-panel');
         
@@ -908,29 +1000,62 @@ class StateEditorGUI {
             <div class="alert alert-primary mb-0">
                 <strong><i class="bi bi-check-circle me-1"></i>State ${state.id} Selected</strong><br>
                 <small>
-                    Name: ${state.name || 'Unnamed'}<br>
+                    Name: ${this.stateDisplayName(state)}<br>
                     Owner: ${state.owner || 'None'}<br>
                     Provinces: ${state.provinces.length}
                 </small>
+                <button class="btn btn-sm btn-outline-primary w-100 mt-2" id="zoom-to-state-btn">
+                    <i class="bi bi-zoom-in me-1"></i>Zoom to State
+                </button>
             </div>
         `);
         
+        $('#zoom-to-state-btn').on('click', () => this.zoomToProvinces(state.provinces));
         $('#click-mode-buttons').show();
     }
 
+    zoomToProvinces(provinceIds) {
+        // Fit the view to the union of the provinces' bounding boxes
+        let x0 = Infinity, y0 = Infinity, x1 = -Infinity, y1 = -Infinity;
+        for (const provinceId of provinceIds) {
+            const geometry = this.provinces.geometry(provinceId);
+            if (!geometry) continue;
+            x0 = Math.min(x0, geometry.bbox[0]);
+            y0 = Math.min(y0, geometry.bbox[1]);
+            x1 = Math.max(x1, geometry.bbox[2]);
+            y1 = Math.max(y1, geometry.bbox[3]);
+        }
+        if (x0 > x1) return;
+        
+        const margin = 40;
+        const fitX = (this.canvas.width - margin * 2) / (x1 - x0);
+        const fitY = (this.canvas.height - margin * 2) / (y1 - y0);
+        this.zoom = Math.max(0.1, Math.min(5, fitX, fitY));
+        this.panX = this.canvas.width / 2 - (x0 + x1) / 2 * this.zoom;
+        this.panY = this.canvas.height / 2 - (y0 + y1) / 2 * this.zoom;
+        
+        $('#zoom-level').text(Math.round(this.zoom * 100) + '%');
+        this.render();
+    }
+
     updateProvinceInfo(provinceId, stateId) {
         let info = `Province: <strong>${provinceId}</strong>`;
         
-        if (provinceId in this.provinces) {
-            const province = this.provinces[provinceId];
+        if (this.provinces.has(provinceId)) {
+            const province = this.provinces.get(provinceId);
             info += ` (${province.type})`;
+            
+            const geometry = this.provinces.geometry(provinceId);
+            if (geometry) {
+                info += ` | ${geometry.area.toLocaleString()} px`;
+            }
         }
         
         if (stateId) {
             const state = this.states[stateId];
             info += ` | State: <strong>${stateId}</strong>`;
             if (state) {
-                info += ` (${state.name})`;
+                info += ` (${this.stateDisplayName(state)})`;
                 info += ` | Owner: <strong>${state.owner || 'None'}</strong>`;
             }
         } else {
@@ -944,77 +1069,359 @@ class StateEditorGUI {
         const worldX = Math.floor((mouseX - this.panX) / this.zoom);
         const worldY = Math.floor((mouseY - this.panY) / this.zoom);
         
-        const provinceId = this.getProvinceAtPixel(worldX, worldY);
-        let provinceText = '';
-        if (provinceId) {
-            provinceText = ` | Province: ${provinceId}`;
-        }
+        $('#mouse-info').text(`World: ${worldX}, ${worldY}`);
         
-        $('#mouse-info').text(`World: ${worldX}, ${worldY}${provinceText}`);
+        // Only look up the hovered province once the mouse settles
+        clearTimeout(this.hoverTimer);
+        this.hoverTimer = setTimeout(async () => {
+            const provinceId = await this.fetchProvinceAtPixel(worldX, worldY);
+            if (provinceId) {
+                $('#mouse-info').text(`World: ${worldX}, ${worldY} | Province: ${provinceId}`);
+            }
+        }, 150);
     }
 
-    getProvinceAtPixel(x, y) {
-        if (!this.offscreenCtx || x < 0 || y < 0 || 
-            x >= this.offscreenCanvas.width || y >= this.offscreenCanvas.height) {
+    async fetchProvinceAtPixel(x, y) {
+        if (!this.tileMeta || x < 0 || y < 0 ||
+            x >= this.tileMeta.width || y >= this.tileMeta.height) {
             return null;
         }
         
-        const pixelData = this.offscreenCtx.getImageData(x, y, 1, 1).data;
-        const colorKey = `${pixelData[0]},${pixelData[1]},${pixelData[2]}`;
+        const response = await fetch('/api/state_editor/get_province_at_pixel', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ x: x, y: y })
+        });
+        
+        const result = await response.json();
+        return result.success ? result.province_id : null;
+    }
+
+    getTileZoom() {
+        // Pick the coarsest level that still has at least one tile pixel per screen pixel
+        const z = this.tileMeta.max_zoom + Math.ceil(Math.log2(this.zoom));
+        return Math.max(0, Math.min(this.tileMeta.max_zoom, z));
+    }
+
+    getTile(layer, z, x, y) {
+        let key = `${layer}/${z}/${x}/${y}`;
+        let url = `/api/state_editor/tiles/${key}.png`;
+        if (layer === 'highlight') {
+            key += `/${this.selectedState.id}`;
+            url += `?state=${this.selectedState.id}&r=${this.tileRevisions.get(`${z}/${x}/${y}`) || 0}`;
+        } else if (layer === 'political' || layer === 'state_borders') {
+            url += `?v=${this.tileMeta.versions[layer]}&r=${this.tileRevisions.get(`${z}/${x}/${y}`) || 0}`;
+        } else {
+            url += `?v=${this.tileMeta.versions[layer]}`;
+        }
+        
+        let tile = this.tileCache.get(key);
+        if (!tile) {
+            tile = new Image();
+            tile.onload = () => this.scheduleRender();
+            tile.src = url;
+            this.tileCache.set(key, tile);
+        }
+        
+        return tile.complete && tile.naturalWidth ? tile : null;
+    }
+
+    drawTileLayer(layer, z) {
+        const meta = this.tileMeta;
+        const scale = 2 ** (meta.max_zoom - z);
+        const worldTileSize = meta.tile_size * scale;
+        
+        // Visible part of the map in world coordinates
+        const left = -this.panX / this.zoom;
+        const top = -this.panY / this.zoom;
+        const right = (this.canvas.width - this.panX) / this.zoom;
+        const bottom = (this.canvas.height - this.panY) / this.zoom;
+        
+        const x0 = Math.max(0, Math.floor(left / worldTileSize));
+        const y0 = Math.max(0, Math.floor(top / worldTileSize));
+        const x1 = Math.min(Math.ceil(meta.width / worldTileSize), Math.ceil(right / worldTileSize));
+        const y1 = Math.min(Math.ceil(meta.height / worldTileSize), Math.ceil(bottom / worldTileSize));
+        
+        for (let y = y0; y < y1; y++) {
+            for (let x = x0; x < x1; x++) {
+                const tile = this.getTile(layer, z, x, y);
+                if (tile) {
+                    this.ctx.drawImage(tile, x * worldTileSize, y * worldTileSize,
+                                       tile.naturalWidth * scale, tile.naturalHeight * scale);
+                }
+            }
+        }
+    }
+
+    async applyTilePatch(dirty) {
+        if (!dirty) return;
+        
+        if (dirty.full) {
+            await this.loadTileMetadata();
+            return;
+        }
+        
+        // Only the tiles around the edited provinces are refetched
+        for (const [z, tiles] of Object.entries(dirty.tiles)) {
+            tiles.forEach(([x, y]) => {
+                const tileKey = `${z}/${x}/${y}`;
+                this.tileRevisions.set(tileKey, dirty.revision);
+                ['political', 'state_borders'].forEach(layer => {
+                    this.tileCache.delete(`${layer}/${tileKey}`);
+                });
+            });
+        }
         
-        return this.colorMap[colorKey];
+        for (const key of Array.from(this.tileCache.keys())) {
+            if (key.startsWith('highlight/')) {
+                this.tileCache.delete(key);
+            }
+        }
+    }
+
+    scheduleRender() {
+        if (this.renderQueued) return;
+        this.renderQueued = true;
+        requestAnimationFrame(() => {
+            this.renderQueued = false;
+            this.render();
+        });
     }
 
     render() {
-        if (!this.ctx) return;
+        if (!this.ctx || !this.tileMeta) return;
         
         this.ctx.clearRect(0, 0, this.canvas.width, this.canvas.height);
         
         this.ctx.save();
         this.ctx.translate(this.panX, this.panY);
         this.ctx.scale(this.zoom, this.zoom);
+        this.ctx.imageSmoothingEnabled = false;
+        
+        const z = this.getTileZoom();
         
-        if (this.cachedLayers.stylized) {
-            this.ctx.drawImage(this.cachedLayers.stylized, 0, 0);
+        this.drawTileLayer('political', z);
+        
+        if (this.selectedState) {
+            this.drawTileLayer('highlight', z);
         }
         
-        if (this.showProvinceBorders && this.cachedLayers.provinceBorders) {
-            this.ctx.drawImage(this.cachedLayers.provinceBorders, 0, 0);
+        if (this.showProvinceBorders) {
+            this.drawTileLayer('province_borders', z);
         }
         
-        if (this.showStateBorders && this.cachedLayers.stateBorders) {
-            this.ctx.drawImage(this.cachedLayers.stateBorders, 0, 0);
+        if (this.showStateBorders) {
+            this.drawTileLayer('state_borders', z);
         }
         
+        this.drawSelection();
+        
         this.ctx.restore();
     }
 
-    async quickRefreshData() {
-        console.log('Quick refresh - updating data only...');
+    drawSelection() {
+        const size = 4 / this.zoom;
+        
+        if (this.selection.length > 0) {
+            this.ctx.fillStyle = 'rgba(0, 200, 255, 0.9)';
+            this.selection.forEach(provinceId => {
+                const geometry = this.provinces.geometry(provinceId);
+                if (geometry) {
+                    const [x, y] = geometry.label_point;
+                    this.ctx.fillRect(x - size / 2, y - size / 2, size, size);
+                }
+            });
+        }
         
-        const initResponse = await fetch('/api/state_editor/initialize', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' }
+        if (this.selectionPath) {
+            const path = this.selectionPath;
+            this.ctx.strokeStyle = 'rgba(0, 200, 255, 0.9)';
+            this.ctx.lineWidth = 1.5 / this.zoom;
+            this.ctx.beginPath();
+            if (this.clickMode === 'select_rect') {
+                const [[x0, y0], [x1, y1]] = path;
+                this.ctx.rect(x0, y0, x1 - x0, y1 - y0);
+            } else {
+                this.ctx.moveTo(path[0][0], path[0][1]);
+                path.slice(1).forEach(([x, y]) => this.ctx.lineTo(x, y));
+                this.ctx.closePath();
+            }
+            this.ctx.stroke();
+        }
+    }
+
+    connectEvents() {
+        this.disconnectEvents();
+        if (!window.EventSource) return;
+        
+        // The server pushes edits made to project files outside the editor
+        this.eventSource = new EventSource('/api/state_editor/events');
+        this.eventSource.addEventListener('files_changed', (e) => {
+            this.applyFileChanges(JSON.parse(e.data));
         });
+    }
+
+    disconnectEvents() {
+        if (this.eventSource) {
+            this.eventSource.close();
+            this.eventSource = null;
+        }
+    }
+
+    async applyFileChanges(event) {
+        if (event.reload) {
+            await this.syncChanges(event.dirty);
+            return;
+        }
         
-        const initResult = await initResponse.json();
+        if (event.colors) {
+            this.countryColors = event.colors;
+        }
+        if (event.conflicts.length > 0) {
+            console.warn(`States ${event.conflicts.join(', ')} changed on disk but have unsaved edits; keeping the edits`);
+        }
         
-        this.states = {};
-        this.provinceToState = {};
-        initResult.states.forEach(state => {
+        await this.applyStateDelta(event.states, event.removed_states, event.dirty);
+    }
+
+    async applyStateDelta(states, removedStates, dirty, moves = []) {
+        // Merge changed state summaries without reloading everything
+        removedStates.forEach(stateId => {
+            const state = this.states[stateId];
+            if (!state) return;
+            state.provinces.forEach(provinceId => {
+                if (this.provinceToState[provinceId] === stateId) {
+                    delete this.provinceToState[provinceId];
+                }
+            });
+            delete this.states[stateId];
+        });
+        
+        states.forEach(state => {
+            const previous = this.states[state.id];
+            if (previous) {
+                previous.provinces.forEach(provinceId => {
+                    if (this.provinceToState[provinceId] === state.id) {
+                        delete this.provinceToState[provinceId];
+                    }
+                });
+            }
+        });
+        states.forEach(state => {
             this.states[state.id] = state;
             state.provinces.forEach(provinceId => {
                 this.provinceToState[provinceId] = state.id;
             });
         });
+        moves.forEach(([provinceId, stateId]) => {
+            if (stateId === null) {
+                delete this.provinceToState[provinceId];
+            } else {
+                this.provinceToState[provinceId] = stateId;
+            }
+        });
+        
+        await this.applyTilePatch(dirty);
+        this.render();
+        
+        if (this.selectedState) {
+            this.selectedState = this.states[this.selectedState.id] || null;
+            this.updateSelectedStatePanel();
+            this.renderPropertiesPanel();
+        }
+        
+        this.refreshHistory();
+    }
+
+    async runBatch(operations) {
+        // PERFORMANCE: many edits in one request, one save and one tile patch
+        const response = await fetch('/api/state_editor/batch', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ operations: operations })
+        });
+        
+        const result = await response.json();
+        
+        if (!result.success) {
+            alert('Error: ' + result.error);
+            return null;
+        }
+        
+        await this.applyStateDelta(result.states, result.removed_states, result.dirty);
+        return result;
+    }
+
+    async stepHistory(direction) {
+        // Undo/redo only sends back the states the step touched
+        const response = await fetch(`/api/state_editor/${direction}`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' }
+        });
+        
+        const result = await response.json();
+        if (!result.success) {
+            if (result.history) {
+                this.updateHistoryButtons(result.history);
+            }
+            $('#province-info').html(`<span class="text-warning">${result.error}</span>`);
+            return;
+        }
+        
+        $('#province-info').html(`<span class="text-info">${direction === 'undo' ? 'Undid' : 'Redid'}: ${result.label}</span>`);
+        await this.applyStateDelta(result.states, result.removed_states, result.dirty);
+    }
+
+    async refreshHistory() {
+        const response = await fetch('/api/state_editor/history', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' }
+        });
+        const result = await response.json();
+        if (result.success) {
+            this.updateHistoryButtons(result.history);
+        }
+    }
+
+    updateHistoryButtons(history) {
+        $('#undo-edit-btn').prop('disabled', !history.can_undo)
+            .attr('title', history.can_undo ? `Undo ${history.undo_label} (Ctrl+Z)` : 'Nothing to undo');
+        $('#redo-edit-btn').prop('disabled', !history.can_redo)
+            .attr('title', history.can_redo ? `Redo ${history.redo_label} (Ctrl+Y)` : 'Nothing to redo');
+    }
+
+    async syncChanges(dirty = null) {
+        // PERFORMANCE: fetch only the states changed since our revision
+        const params = new URLSearchParams({ since: this.revision, session: this.session });
+        const response = await fetch(`/api/state_editor/changes?${params}`);
+        const result = await response.json();
         
-        // Only regenerate layers that are dirty
-        if (this.layersDirty.stylized) {
-            await this.createStylizedMap();
+        if (!result.success) {
+            alert('Failed to refresh: ' + result.error);
+            return;
+        }
+        if (result.full) {
+            await this.reloadStates(dirty);
+            return;
         }
-        if (this.layersDirty.stateBorders) {
-            await this.createStateBorders();
+        
+        this.revision = result.revision;
+        await this.applyStateDelta(result.created.concat(result.updated), result.deleted, dirty, result.moves);
+    }
+
+    async reloadStates(dirty = null) {
+        // Fallback when the change log doesn't reach back to our revision
+        const payload = await fetchBinaryPayload('/api/state_editor/initialize');
+        if (!payload.meta.success) {
+            alert('Failed to refresh: ' + payload.meta.error);
+            return;
         }
+        this.setStates(this.statesFromPayload(payload));
+        this.session = payload.meta.session;
+        this.revision = payload.meta.revision;
+        
+        // Refetch only the map tiles the edit touched
+        await this.applyTilePatch(dirty);
         
         this.render();
         
@@ -1022,6 +1429,8 @@ class StateEditorGUI {
             this.selectedState = this.states[this.selectedState.id];
             this.renderPropertiesPanel();
         }
+        
+        this.refreshHistory();
     }
 
     async loadAvailableTags() {
@@ -1070,8 +1479,7 @@ class StateEditorGUI {
         const result = await response.json();
         if (result.success) {
             $('#province-info').html(`<span class="text-success">✓ State ${this.selectedState.id} owner set to ${ownerTag}</span>`);
-            this.layersDirty.stylized = true;
-            await this.quickRefreshData();
+            await this.syncChanges(result.dirty);
         } else {
             alert('Error: ' + result.message);
         }
@@ -1095,9 +1503,7 @@ class StateEditorGUI {
         if (result.success) {
             this.selectedState = null;
             this.setClickMode('view');
-            this.layersDirty.stylized = true;
-            this.layersDirty.stateBorders = true;
-            await this.quickRefreshData();
+            await this.syncChanges(result.dirty);
             this.updateSelectedStatePanel();
             this.renderPropertiesPanel();
         } else {
@@ -1136,7 +1542,7 @@ class StateEditorGUI {
                                 <select class="form-select bg-dark text-light border-secondary" id="target-state-select">
                                     <option value="">Choose state...</option>
                                     ${Object.values(this.states).map(s => 
-                                        `<option value="${s.id}">State ${s.id} - ${s.name || 'Unnamed'} (${s.owner || 'No owner'})</option>`
+                                        `<option value="${s.id}">State ${s.id} - ${this.stateDisplayName(s)} (${s.owner || 'No owner'})</option>`
                                     ).join('')}
                                 </select>
                             </div>
@@ -1202,9 +1608,7 @@ class StateEditorGUI {
                 if (result.success) {
                     modal.hide();
                     $('#province-assignment-modal').remove();
-                    this.layersDirty.stylized = true;
-                    this.layersDirty.stateBorders = true;
-                    await this.quickRefreshData();
+                    await this.syncChanges(result.dirty);
                     this.selectedState = this.states[result.state_id];
                     this.updateSelectedStatePanel();
                     this.renderPropertiesPanel();
@@ -1226,8 +1630,7 @@ class StateEditorGUI {
                 if (result.success) {
                     modal.hide();
                     $('#province-assignment-modal').remove();
-                    this.layersDirty.stateBorders = true;
-                    await this.quickRefreshData();
+                    await this.syncChanges(result.dirty);
                     this.selectedState = this.states[targetStateId];
                     this.updateSelectedStatePanel();
                     this.renderPropertiesPanel();
@@ -1401,9 +1804,8 @@ class StateEditorGUI {
             const originalHtml = btn.html();
             btn.html('<i class="bi bi-check me-1"></i>Saved!').prop('disabled', true);
             
-            // Mark stylized layer as dirty since owner might have changed
-            this.layersDirty.stylized = true;
-            await this.quickRefreshData();
+            // Owner might have changed, refresh the political layer
+            await this.syncChanges(result.dirty);
             
             setTimeout(() => {
                 btn.html(originalHtml).prop('disabled', false);
@@ -1486,8 +1888,7 @@ class StateEditorGUI {
             if (result.success) {
                 modal.hide();
                 $('#create-state-modal').remove();
-                this.layersDirty.stylized = true;
-                await this.quickRefreshData();
+                await this.syncChanges(result.dirty);
                 alert(`State ${result.state_id} created! Use Edit State Borders mode to add provinces.`);
             } else {
                 alert('Error: ' + result.error);
@@ -1497,6 +1898,21 @@ class StateEditorGUI {
         modal.show();
     }
 
+    async setWriteBehind(enabled) {
+        const response = await fetch('/api/state_editor/write_behind', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ enabled: enabled })
+        });
+        
+        const result = await response.json();
+        if (!result.success) {
+            alert('✗ Error: ' + result.error);
+        }
+        this.writeBehind = !!result.enabled;
+        $('#write-behind-toggle').prop('checked', this.writeBehind);
+    }
+
     async saveAllStates() {
         const response = await fetch('/api/state_editor/save_all', {
             method: 'POST',
@@ -1551,4 +1967,4 @@ function initStateEditor() {
 $(document).ready(() => {
     console.log('Document ready, initializing state editor...');
     setTimeout(initStateEditor, 1000);
-});
\ No newline at end of file
+});
\ No newline at end of file
@@ -1,12 +1,14 @@
 import os
 import re
 from pathlib import Path
+from utils.country_registry import CountryRegistry
 
 class CountryCreator:
-    def __init__(self, project_root):
+    def __init__(self, project_root, registry=None):
         self.project_root = project_root
         self.countries_dir = os.path.join(project_root, "common", "countries")
         self.tags_file = os.path.join(project_root, "common", "country_tags", "00_countries.txt")
+        self.registry = registry or CountryRegistry(project_root)
         
         # Available graphical cultures (from HOI4)
         self.graphical_cultures = [
@@ -29,6 +31,11 @@ class CountryCreator:
         if not re.match(r'^[A-Z]{3}$', tag):
             return False, "Tag must be exactly 3 uppercase letters"
         
+        # Check every file in country_tags, not just 00_countries.txt
+        existing = self.registry.get(tag)
+        if existing:
+            return False, f"Tag {tag} already exists in {existing['tags_file']}"
+        
         # Create countries directory if it doesn't exist
         os.makedirs(self.countries_dir, exist_ok=True)
         
@@ -49,16 +56,6 @@ class CountryCreator:
         tag_entry = f'{tag} = "countries/{os.path.basename(country_file)}"\n'
         
         try:
-            # Read existing tags if file exists
-            existing_tags = ""
-            if os.path.exists(self.tags_file):
-                with open(self.tags_file, 'r', encoding='utf-8') as f:
-                    existing_tags = f.read()
-            
-            # Check if tag already exists
-            if f'{tag} = ' in existing_tags:
-                return False, f"Tag {tag} already exists in 00_countries.txt"
-            
             # Append new tag
             with open(self.tags_file, 'a', encoding='utf-8') as f:
                 f.write(tag_entry)
@@ -101,15 +98,4 @@ color = {{ {r} {g} {b} }}
     
     def get_existing_tags(self):
         """Get list of existing country tags"""
-        if not os.path.exists(self.tags_file):
-            return []
-        
-        try:
-            with open(self.tags_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # Extract tags using regex
-            tags = re.findall(r'^(\w{3})\s*=', content, re.MULTILINE)
-            return tags
-        except:
-            return []
+        return self.registry.tags()
@@ -1,12 +1,75 @@
 import os
 import re
 import csv
+import copy
+import json
 import shutil
+import tempfile
+import threading
+import time
+import uuid
+import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from PIL import Image
 from pathlib import Path
+from utils.border_engine import build_state_lookup
+from utils.province_raster import ProvinceRaster
+from utils.outline_vectorizer import load_or_build_outlines
+from utils.file_parser import ScriptNode, parse_script
+from utils.parse_cache import ParseCache
+from utils.script_writer import ScriptPatcher, format_value, same_value, unescape_string
+from utils.edit_history import EditHistory, MISSING, invert_change
+from utils.binary_payload import compact_ints, dictionary_encode, ragged, ragged_strings
+from utils.write_behind import WriteBehindFlusher, WriteBehindJournal
+
+
+def _default_file_mode():
+    """Mode open() gives a new file under the process umask"""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+_NEW_FILE_MODE = _default_file_mode()
+
+
+class StateWriteError(ValueError):
+    """A state's file can't be updated without losing or corrupting content"""
+
 
 class StateEditor:
-    def __init__(self, project_root):
+    # Below this many state files a process pool costs more than it saves
+    PARALLEL_LOAD_MIN_FILES = 64
+    
+    # Parse cache kinds; bump the suffix when the parsed format changes
+    STATE_CACHE_KIND = 'state-v1'
+    DEFINITION_CACHE_KIND = 'definition-v1'
+    
+    # Operations accepted by apply_batch()
+    BATCH_OPERATIONS = ('move_provinces', 'remove_provinces', 'set_owner', 'update_state',
+                        'create_state', 'delete_state')
+    
+    # Fields a state file may leave out; without one in memory, its
+    # statement is removed from the file
+    OPTIONAL_FIELDS = ('name', 'owner')
+    
+    # Buildings that go in a province's block (`11506 = { naval_base = 3 }`)
+    # inside history.buildings, never at state level
+    PROVINCE_BUILDINGS = ('naval_base', 'bunker', 'coastal_bunker')
+    
+    # Fields update_state_properties() can set
+    EDITABLE_FIELDS = ('name', 'manpower', 'state_category', 'owner', 'resources', 'cores', 'claims',
+                       'buildings', 'victory_points')
+    
+    # Province fields a flood selection can match against the seed
+    SELECT_CRITERIA = ('terrain', 'continent', 'type', 'owner', 'state')
+    
+    # Entries kept in the change log; older revisions need a full reload
+    CHANGE_LOG_LIMIT = 20000
+    
+    def __init__(self, project_root, load_workers=None):
         self.project_root = project_root
         self.map_dir = os.path.join(project_root, "map")
         self.states_dir = os.path.join(project_root, "history", "states")
@@ -18,6 +81,60 @@ class StateEditor:
         self.states = {}
         self.province_to_state = {}
         
+        # Derived data (province raster etc.) is cached per project
+        self.cache_dir = os.path.join(project_root, ".hpa_cache")
+        self.raster = ProvinceRaster(self.provinces_bmp, self.definition_csv, self.cache_dir)
+        self.parse_cache = ParseCache(self.cache_dir)
+        
+        # Vector outlines: province ID -> list of flat [x0, y0, x1, y1, ...] rings,
+        # traced from the raster with key _outlines_key[0] at tolerance [1]
+        self.province_outlines = {}
+        self._outlines_key = None
+        
+        # States changed since the last flush, and files of deleted states
+        self.dirty_states = set()
+        self.deleted_files = set()
+        
+        # Guards states against the write-behind flush thread
+        self.lock = threading.RLock()
+        
+        # States touched by the batch being applied (None outside a batch);
+        # they are serialized once when the batch succeeds
+        self._batch_touched = None
+        
+        # Undo/redo log of edits; _edit_log collects the changes of a batch
+        # so the whole batch undoes as one step
+        self.history = EditHistory()
+        self._edit_log = None
+        
+        # Optional write-behind mode: edits are journaled and flushed in the
+        # background instead of inside the request
+        self.journal = WriteBehindJournal(os.path.join(self.cache_dir, 'state_journal.jsonl'))
+        self.write_behind = None
+        
+        # Worker processes used to parse history/states (None = one per CPU)
+        self.load_workers = load_workers
+        self.load_progress = {'done': 0, 'total': 0, 'elapsed': 0.0, 'running': False}
+        
+        # Files this editor wrote or removed itself: path -> (mtime_ns, size),
+        # or None for a removal, so the file watcher can tell them apart
+        # from outside edits
+        self._own_writes = {}
+        
+        # Bumped on every change to the loaded states; with the session
+        # token (new for every editor) it names the current content, so
+        # responses built from it can be cached and revalidated
+        self.session = uuid.uuid4().hex[:8]
+        self.revision = 0
+        self.loaded = False
+        self._state_files = None
+        
+        # (revision, kind, id) for every state and province an edit
+        # touched, so clients can fetch just what changed since a revision.
+        # Revisions up to _log_floor aren't covered by the log.
+        self.change_log = deque(maxlen=self.CHANGE_LOG_LIMIT)
+        self._log_floor = 0
+        
     def check_required_files(self):
         """Check if required map files exist"""
         missing = []
@@ -70,41 +187,56 @@ class StateEditor:
         self.provinces = {}
         
         try:
-            with open(self.definition_csv, 'r', encoding='utf-8-sig') as f:
-                reader = csv.reader(f, delimiter=';')
-                next(reader)
-                
-                for row in reader:
-                    if len(row) < 8:
-                        continue
-                    
-                    try:
-                        province_id = int(row[0])
-                        r = int(row[1])
-                        g = int(row[2])
-                        b = int(row[3])
-                        prov_type = row[4].strip()
-                        coastal = row[5].strip().lower() == 'true'
-                        terrain = row[6].strip()
-                        continent = int(row[7])
-                        
-                        self.provinces[province_id] = {
-                            'r': r,
-                            'g': g,
-                            'b': b,
-                            'type': prov_type,
-                            'coastal': coastal,
-                            'terrain': terrain,
-                            'continent': continent,
-                            'color_key': (r, g, b)
-                        }
-                    except (ValueError, IndexError):
-                        continue
+            stat = os.stat(self.definition_csv)
+            rows = self.parse_cache.get(self.DEFINITION_CACHE_KIND, 'definition.csv', stat)
+            cached = rows is not None
+            if not cached:
+                rows = self._read_definition_rows()
+                self.parse_cache.put(self.DEFINITION_CACHE_KIND, 'definition.csv', stat, rows)
+            
+            for province_id, r, g, b, prov_type, coastal, terrain, continent in rows:
+                self.provinces[province_id] = {
+                    'r': r,
+                    'g': g,
+                    'b': b,
+                    'type': prov_type,
+                    'coastal': coastal,
+                    'terrain': terrain,
+                    'continent': continent,
+                    'color_key': (r, g, b)
+                }
             
-            return True, f"Parsed {len(self.provinces)} provinces"
+            source = " (cached)" if cached else ""
+            return True, f"Parsed {len(self.provinces)} provinces{source}"
         except Exception as e:
             return False, f"Error parsing definition.csv: {str(e)}"
     
+    def _read_definition_rows(self):
+        """Read the valid rows of definition.csv as typed lists"""
+        rows = []
+        with open(self.definition_csv, 'r', encoding='utf-8-sig') as f:
+            reader = csv.reader(f, delimiter=';')
+            next(reader)
+            
+            for row in reader:
+                if len(row) < 8:
+                    continue
+                
+                try:
+                    rows.append([
+                        int(row[0]),
+                        int(row[1]),
+                        int(row[2]),
+                        int(row[3]),
+                        row[4].strip(),
+                        row[5].strip().lower() == 'true',
+                        row[6].strip(),
+                        int(row[7])
+                    ])
+                except (ValueError, IndexError):
+                    continue
+        return rows
+    
     def load_provinces_image(self):
         """Load and process provinces.bmp"""
         try:
@@ -114,16 +246,231 @@ class StateEditor:
         except Exception as e:
             return False, None
     
+    def get_province_labels(self):
+        """Get the province ID raster for provinces.bmp (0 = unknown colour)"""
+        if not self.raster.is_current():
+            success, message = self.raster.load(self.provinces)
+            if not success:
+                print(message)
+                return None
+        return self.raster.labels
+    
+    def get_province_at_pixel(self, x, y):
+        """Get the province ID at map pixel (x, y)"""
+        if self.get_province_labels() is None:
+            return None
+        return self.raster.province_at(x, y)
+    
+    def get_province_bbox(self, province_id):
+        """Get the [x0, y0, x1, y1) bounding box of a province on the map"""
+        if self.get_province_labels() is None:
+            return None
+        return self.raster.get_region([province_id])
+    
+    def get_provinces_region(self, province_ids, margin=0):
+        """Get the bounding box covering several provinces, grown by margin pixels"""
+        if self.get_province_labels() is None:
+            return None
+        return self.raster.get_region(province_ids, margin=margin)
+    
+    def get_geometry(self):
+        """Get the per-province geometry table (bbox, area, centroid, label point)"""
+        if self.get_province_labels() is None:
+            return None
+        return self.raster.get_geometry()
+    
+    def get_province_geometry(self):
+        """Get bbox, area, centroid and label point for every province on the map"""
+        geometry = self.get_geometry()
+        if geometry is None:
+            return {}
+        return geometry.to_dict(self.provinces.keys())
+    
+    def get_adjacency(self):
+        """Get the province adjacency graph derived from provinces.bmp"""
+        if self.get_province_labels() is None:
+            return None
+        return self.raster.get_adjacency()
+    
+    def get_province_neighbors(self, province_id):
+        """Get the provinces touching a province, with shared border length and state info"""
+        adjacency = self.get_adjacency()
+        if adjacency is None:
+            return []
+        
+        own_state = self.province_to_state.get(province_id)
+        neighbors = []
+        for neighbor_id, border_pixels in adjacency.neighbors_with_borders(province_id):
+            neighbor_state = self.province_to_state.get(neighbor_id)
+            neighbors.append({
+                'province': neighbor_id,
+                'state': neighbor_state,
+                'shared_border': border_pixels,
+                'different_state': neighbor_state != own_state
+            })
+        return neighbors
+    
+    def get_adjacency_edges(self):
+        """Get every adjacent province pair as [a, b, shared_border, different_state]"""
+        adjacency = self.get_adjacency()
+        if adjacency is None:
+            return []
+        
+        lookup = self.province_to_state
+        return [[a, b, count, lookup.get(a) != lookup.get(b)]
+                for a, b, count in adjacency.edges.tolist()]
+    
+    def check_state_contiguity(self, state_id):
+        """Check whether a state's provinces form one connected area"""
+        if state_id not in self.states:
+            return False, "State not found"
+        
+        adjacency = self.get_adjacency()
+        if adjacency is None:
+            return False, "Province map not available"
+        
+        return True, adjacency.components(self.states[state_id].get('provinces', []))
+    
+    def select_provinces(self, query):
+        """Select provinces by rectangle, polygon or flood fill from a seed.
+        
+        `query` is one of
+          {'rect': [x0, y0, x1, y1]}
+          {'polygon': [[x, y], ...]}
+          {'seed': province_id, 'criteria': [...], 'max_hops': N}
+        where criteria are any of SELECT_CRITERIA, each meaning "same as the
+        seed". Shape queries may also pass 'types' (e.g. ['land']) to keep
+        only those province types. Returns (success, sorted province IDs or
+        an error message).
+        """
+        if not isinstance(query, dict):
+            return False, "Query must be an object"
+        if self.get_province_labels() is None:
+            return False, "Province map not available"
+        
+        try:
+            if 'rect' in query:
+                x0, y0, x1, y1 = (int(v) for v in query['rect'])
+                selected = self.raster.provinces_in_rect(x0, y0, x1, y1)
+            elif 'polygon' in query:
+                points = [(float(x), float(y)) for x, y in query['polygon']]
+                if len(points) < 3:
+                    return False, "A polygon needs at least 3 points"
+                selected = self.raster.provinces_in_polygon(points)
+            elif 'seed' in query:
+                return self._flood_select(query)
+            else:
+                return False, "Query needs a rect, polygon or seed"
+        except (TypeError, ValueError):
+            return False, "Invalid selection coordinates"
+        
+        types = query.get('types')
+        if types:
+            selected = [p for p in selected if self.provinces.get(p, {}).get('type') in types]
+        return True, [p for p in selected if p in self.provinces]
+    
+    def _flood_select(self, query):
+        seed = _to_int(query.get('seed'))
+        if seed not in self.provinces:
+            return False, f"Province {query.get('seed')} not found"
+        
+        criteria = query.get('criteria') or []
+        unknown = [c for c in criteria if c not in self.SELECT_CRITERIA]
+        if unknown:
+            return False, f"Unknown criteria {unknown}, expected any of {', '.join(self.SELECT_CRITERIA)}"
+        
+        max_hops = query.get('max_hops')
+        if max_hops is not None:
+            max_hops = _to_int(max_hops)
+            if max_hops is None or max_hops < 0:
+                return False, "max_hops must be a non-negative number"
+        
+        adjacency = self.get_adjacency()
+        if adjacency is None:
+            return False, "Province map not available"
+        
+        # Mark the provinces matching the seed once, so the flood itself is
+        # only array lookups
+        allowed = None
+        if criteria:
+            target = self._selection_keys(seed, criteria)
+            allowed = np.zeros(max(self.provinces) + 1, dtype=bool)
+            allowed[[p for p in self.provinces if self._selection_keys(p, criteria) == target]] = True
+        
+        selected = adjacency.flood([seed], max_hops, allowed=allowed)
+        return True, [p for p in selected.tolist() if p in self.provinces]
+    
+    def _selection_keys(self, province_id, criteria):
+        province = self.provinces[province_id]
+        state_id = self.province_to_state.get(province_id)
+        keys = []
+        for criterion in criteria:
+            if criterion == 'state':
+                keys.append(state_id)
+            elif criterion == 'owner':
+                keys.append(self.states[state_id].get('owner') if state_id in self.states else None)
+            else:
+                keys.append(province.get(criterion))
+        return tuple(keys)
+    
+    def generate_province_outlines(self, tolerance=1.0, workers=None):
+        """Vectorize every province into simplified outline polygons.
+        
+        Tracing is spread over a process pool and the result is cached on disk
+        per province raster and tolerance, so it normally only runs once.
+        """
+        if self.get_province_labels() is None:
+            return False, "Failed to load provinces.bmp"
+        
+        try:
+            start = time.perf_counter()
+            self.province_outlines, cached = load_or_build_outlines(
+                self.raster, self.provinces.keys(), tolerance=tolerance, workers=workers
+            )
+            self._outlines_key = (self.raster.key, tolerance)
+            elapsed = time.perf_counter() - start
+        except Exception as e:
+            return False, f"Error generating outlines: {str(e)}"
+        
+        source = "Loaded" if cached else "Generated"
+        return True, f"{source} outlines for {len(self.province_outlines)} provinces in {elapsed:.2f}s"
+    
+    def get_province_outlines(self):
+        """Get outlines for the current provinces.bmp
+        
+        They are generated again, at the last tolerance used, whenever the
+        province raster has changed. Returns (success, outlines or message).
+        """
+        if self.get_province_labels() is None:
+            return False, "Failed to load provinces.bmp"
+        tolerance = self._outlines_key[1] if self._outlines_key else 1.0
+        if self._outlines_key != (self.raster.key, tolerance):
+            success, message = self.generate_province_outlines(tolerance=tolerance)
+            if not success:
+                return False, message
+        return True, self.province_outlines
+    
+    def get_state_lookup(self):
+        """Get a province ID -> state ID lookup array for the label raster"""
+        size = max(self.provinces.keys(), default=0) + 1
+        return build_state_lookup(self.province_to_state, size)
+    
     def get_province_color_map(self):
-        """Create a map of RGB color -> province ID"""
+        """Create a map of "r,g,b" color strings -> province ID for the frontend"""
         color_map = {}
         for prov_id, data in self.provinces.items():
             color_key_str = f"{data['r']},{data['g']},{data['b']}"
             color_map[color_key_str] = prov_id
         return color_map
     
-    def parse_state_file(self, filepath):
-        """Parse a single state file with enhanced data extraction"""
+    @staticmethod
+    def parse_state_file(filepath):
+        """Parse a single state file with enhanced data extraction
+        
+        The file is parsed once into a script tree. Owner, cores, claims,
+        buildings and victory points come from the base history block, so
+        dated blocks like `1939.1.1 = { owner = X }` don't shadow them.
+        """
         try:
             with open(filepath, 'r', encoding='utf-8-sig', errors='ignore') as f:
                 content = f.read()
@@ -133,87 +480,11 @@ class StateEditor:
                 'raw_content': content
             }
             
-            # Extract state ID
-            id_match = re.search(r'id\s*=\s*(\d+)', content)
-            if id_match:
-                state_data['id'] = int(id_match.group(1))
-            
-            # Extract state name
-            name_match = re.search(r'name\s*=\s*"([^"]+)"', content)
-            if name_match:
-                state_data['name'] = name_match.group(1)
+            state = parse_script(content).find('state')
+            if state is None or not state.is_block:
+                return state_data
             
-            # Extract manpower
-            manpower_match = re.search(r'manpower\s*=\s*(\d+)', content)
-            if manpower_match:
-                state_data['manpower'] = int(manpower_match.group(1))
-            else:
-                state_data['manpower'] = 1000
-            
-            # Extract state category
-            category_match = re.search(r'state_category\s*=\s*(\w+)', content)
-            if category_match:
-                state_data['state_category'] = category_match.group(1)
-            else:
-                state_data['state_category'] = 'rural'
-            
-            # Extract owner
-            owner_match = re.search(r'owner\s*=\s*(\w+)', content)
-            if owner_match:
-                state_data['owner'] = owner_match.group(1)
-            
-            # Extract provinces
-            provinces_match = re.search(r'provinces\s*=\s*\{([^}]+)\}', content)
-            if provinces_match:
-                province_str = provinces_match.group(1)
-                provinces = [int(p) for p in province_str.split() if p.isdigit()]
-                state_data['provinces'] = provinces
-            else:
-                state_data['provinces'] = []
-            
-            # Extract resources
-            resources = {}
-            resources_match = re.search(r'resources\s*=\s*\{([^}]*)\}', content)
-            if resources_match:
-                res_content = resources_match.group(1)
-                for res_line in res_content.split('\n'):
-                    res_match = re.search(r'(\w+)\s*=\s*(\d+(?:\.\d+)?)', res_line)
-                    if res_match:
-                        resources[res_match.group(1)] = float(res_match.group(2))
-            state_data['resources'] = resources
-            
-            # Extract cores
-            cores = []
-            for core_match in re.finditer(r'add_core_of\s*=\s*(\w+)', content):
-                cores.append(core_match.group(1))
-            state_data['cores'] = cores
-            
-            # Extract claims
-            claims = []
-            for claim_match in re.finditer(r'add_claim_by\s*=\s*(\w+)', content):
-                claims.append(claim_match.group(1))
-            state_data['claims'] = claims
-            
-            # Extract buildings
-            buildings = {'infrastructure': 0, 'industrial_complex': 0, 'air_base': 0, 
-                        'naval_base': 0, 'synthetic_refinery': 0, 'fuel_silo': 0}
-            
-            # General buildings
-            for building_type in buildings.keys():
-                building_match = re.search(rf'{building_type}\s*=\s*(\d+)', content)
-                if building_match:
-                    buildings[building_type] = int(building_match.group(1))
-            
-            state_data['buildings'] = buildings
-            
-            # Extract victory points
-            victory_points = []
-            for vp_match in re.finditer(r'victory_points\s*=\s*\{\s*(\d+)\s+(\d+)\s*\}', content):
-                victory_points.append({
-                    'province': int(vp_match.group(1)),
-                    'value': int(vp_match.group(2))
-                })
-            state_data['victory_points'] = victory_points
+            state_data.update(StateEditor.read_state_fields(state))
             
             return state_data
             
@@ -221,159 +492,1191 @@ class StateEditor:
             print(f"Error parsing state file {filepath}: {e}")
             return None
     
-    def load_all_states(self):
-        """Load all state files from history/states/"""
-        self.states = {}
-        self.province_to_state = {}
+    @staticmethod
+    def read_state_fields(state):
+        """Extract the editable fields from a parsed `state = { ... }` block"""
+        fields = {}
+        
+        state_id = _to_int(state.get('id'))
+        if state_id is not None:
+            fields['id'] = state_id
+        
+        name = state.find('name')
+        if name is not None and not name.is_block and name.value:
+            fields['name'] = unescape_string(name.value) if name.quoted else name.value
+        
+        manpower = _to_int(state.get('manpower'))
+        fields['manpower'] = manpower if manpower is not None else 1000
+        fields['state_category'] = state.get('state_category') or 'rural'
         
+        provinces = state.find('provinces')
+        fields['provinces'] = [int(p) for p in provinces.values() if p.isdigit()] if provinces else []
+        
+        resources = {}
+        resources_block = state.find('resources')
+        for resource in resources_block or ():
+            amount = _to_float(resource.value) if resource.key and not resource.is_block else None
+            if amount is not None:
+                resources[resource.key] = amount
+        fields['resources'] = resources
+        
+        history = state.find('history')
+        if history is None or not history.is_block:
+            history = ScriptNode(None, None, [], 0)
+        
+        owner = history.get('owner')
+        if owner:
+            fields['owner'] = owner
+        
+        fields['cores'] = [node.value for node in history.find_all('add_core_of') if not node.is_block]
+        fields['claims'] = [node.value for node in history.find_all('add_claim_by') if not node.is_block]
+        
+        # State-level buildings, falling back to the highest
+        # province-level value (e.g. naval bases) for the rest
+        buildings = {'infrastructure': 0, 'industrial_complex': 0, 'air_base': 0, 
+                    'naval_base': 0, 'synthetic_refinery': 0, 'fuel_silo': 0}
+        buildings_block = history.find('buildings')
+        for node in buildings_block or ():
+            if node.key in buildings and not node.is_block:
+                buildings[node.key] = _to_int(node.value) or 0
+        for node in buildings_block or ():
+            if node.is_block and node.key and node.key.isdigit():
+                for building in node:
+                    if building.key in buildings and buildings_block.find(building.key) is None:
+                        buildings[building.key] = max(buildings[building.key], _to_int(building.value) or 0)
+        fields['buildings'] = buildings
+        
+        victory_points = []
+        for node in history.find_all('victory_points'):
+            values = node.values() if node.is_block else []
+            if len(values) >= 2 and _to_int(values[0]) is not None and _to_int(values[1]) is not None:
+                victory_points.append({
+                    'province': _to_int(values[0]),
+                    'value': _to_int(values[1])
+                })
+        fields['victory_points'] = victory_points
+        
+        return fields
+    
+    def load_all_states(self, workers=None, progress=None):
+        """Load all state files from history/states/
+        
+        Parsed states are kept in the project's parse cache, so only files
+        whose mtime or size changed are parsed again. Those are parsed on a
+        process pool when there are enough of them. `workers` overrides
+        self.load_workers, and `progress` is called with (done, total).
+        """
         if not os.path.exists(self.states_dir):
             return False, "States directory not found"
         
+        # Never drop edits that haven't reached the disk yet
+        with self.lock:
+            if self.has_unsaved_changes():
+                self.flush()
+            replayed = self.replay_journal()
+            
+            self.states = {}
+            self.province_to_state = {}
+            self.dirty_states = set()
+            self.deleted_files = set()
+            self.history.clear()
+            self.loaded = False
+        
+        start = time.perf_counter()
         try:
-            for filename in os.listdir(self.states_dir):
-                if filename.endswith('.txt'):
-                    filepath = os.path.join(self.states_dir, filename)
-                    state_data = self.parse_state_file(filepath)
+            with os.scandir(self.states_dir) as entries:
+                files = sorted((entry.name, entry.path, entry.stat()) for entry in entries
+                               if entry.name.endswith('.txt') and entry.is_file())
+            
+            # Reuse cached results for unchanged files
+            cached = self.parse_cache.get_all(self.STATE_CACHE_KIND)
+            results = [None] * len(files)
+            stale = []
+            for index, (name, path, stat) in enumerate(files):
+                entry = cached.pop(name, None)
+                if entry and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+                    results[index] = json.loads(entry[2])
+                else:
+                    stale.append(index)
+            
+            self.load_progress = {'done': len(files) - len(stale), 'total': len(files),
+                                  'elapsed': 0.0, 'running': True}
+            
+            workers = workers or self.load_workers or os.cpu_count() or 1
+            workers = min(workers, max(1, len(stale)))
+            if len(stale) < self.PARALLEL_LOAD_MIN_FILES:
+                workers = 1
+            
+            parsed = self._parse_states([files[i][1] for i in stale], workers, start, progress)
+            for index, state_data in zip(stale, parsed):
+                results[index] = state_data
+            
+            self.parse_cache.put_many(self.STATE_CACHE_KIND, [
+                (files[i][0], files[i][2], results[i]) for i in stale if results[i] is not None
+            ])
+            self.parse_cache.remove_many(self.STATE_CACHE_KIND, cached.keys())
+            
+            for state_data in results:
+                if state_data and 'id' in state_data:
+                    state_id = state_data['id']
+                    self.states[state_id] = state_data
                     
-                    if state_data and 'id' in state_data:
-                        state_id = state_data['id']
-                        self.states[state_id] = state_data
-                        
-                        for prov_id in state_data.get('provinces', []):
-                            self.province_to_state[prov_id] = state_id
+                    for prov_id in state_data.get('provinces', []):
+                        self.province_to_state[prov_id] = state_id
             
-            return True, f"Loaded {len(self.states)} states"
+            elapsed = time.perf_counter() - start
+            self.load_progress.update({'elapsed': round(elapsed, 3), 'running': False})
+            
+            # Reloading unchanged files gives the same states back
+            state_files = [(name, stat.st_mtime_ns, stat.st_size) for name, _, stat in files]
+            if state_files != self._state_files or replayed:
+                self._reset_change_log()
+            self._state_files = state_files
+            self.loaded = True
+            
+            worker_text = f"{workers} workers" if workers > 1 else "1 worker"
+            replay_text = f", {replayed} recovered from journal" if replayed else ""
+            return True, (f"Loaded {len(self.states)} states from {len(files)} files in {elapsed:.2f}s "
+                          f"({len(stale)} parsed with {worker_text}, {len(files) - len(stale)} cached{replay_text})")
         except Exception as e:
+            self.load_progress['running'] = False
+            self._state_files = None
+            self._reset_change_log()
             return False, f"Error loading states: {str(e)}"
     
+    def _parse_states(self, filepaths, workers, start, progress=None):
+        """Parse state files in order, on a process pool if workers > 1"""
+        results = []
+        if workers > 1:
+            try:
+                for state_data in self._parse_states_parallel(filepaths, workers):
+                    results.append(state_data)
+                    self._report_progress(start, progress)
+                return results
+            except (OSError, BrokenProcessPool) as e:
+                print(f"Parallel state loading failed, loading serially: {e}")
+                self.load_progress['done'] -= len(results)
+                results = []
+        
+        for filepath in filepaths:
+            results.append(self.parse_state_file(filepath))
+            self._report_progress(start, progress)
+        return results
+    
+    def _parse_states_parallel(self, filepaths, workers):
+        """Parse state files on a process pool, yielding results in file order"""
+        chunksize = max(1, len(filepaths) // (workers * 8))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            yield from pool.map(StateEditor.parse_state_file, filepaths, chunksize=chunksize)
+    
+    def _report_progress(self, start, progress=None):
+        self.load_progress['done'] += 1
+        self.load_progress['elapsed'] = round(time.perf_counter() - start, 3)
+        if progress:
+            progress(self.load_progress['done'], self.load_progress['total'])
+    
     def get_province_state(self, province_id):
         """Get which state a province belongs to"""
         return self.province_to_state.get(province_id)
     
     def create_new_state(self, province_id=None, owner_tag="XXX", name=None):
         """Create a new state"""
-        # Find next available state ID
-        if self.states:
-            new_id = max(self.states.keys()) + 1
-        else:
-            new_id = 1
-        
-        provinces = []
-        if province_id:
-            self.remove_province_from_states(province_id)
-            provinces = [province_id]
-        
-        state_data = {
-            'id': new_id,
-            'name': name or f'STATE_{new_id}',
-            'manpower': 1000,
-            'state_category': 'rural',
-            'owner': owner_tag,
-            'provinces': provinces,
-            'file': f'{new_id}-New_State.txt',
-            'resources': {},
-            'cores': [],
-            'claims': [],
-            'buildings': {'infrastructure': 1, 'industrial_complex': 0, 'air_base': 0,
-                         'naval_base': 0, 'synthetic_refinery': 0, 'fuel_silo': 0},
-            'victory_points': []
-        }
-        
-        state_data['raw_content'] = self.generate_state_content(state_data)
-        
-        self.states[new_id] = state_data
-        if province_id:
-            self.province_to_state[province_id] = new_id
-        
-        return new_id
+        with self.lock:
+            # Find next available state ID
+            if self.states:
+                new_id = max(self.states.keys()) + 1
+            else:
+                new_id = 1
+            
+            state_data = {
+                'id': new_id,
+                'name': name or f'STATE_{new_id}',
+                'manpower': 1000,
+                'state_category': 'rural',
+                'owner': owner_tag,
+                'provinces': [],
+                'file': f'{new_id}-New_State.txt',
+                'resources': {},
+                'cores': [],
+                'claims': [],
+                'buildings': {'infrastructure': 1, 'industrial_complex': 0, 'air_base': 0,
+                             'naval_base': 0, 'synthetic_refinery': 0, 'fuel_silo': 0},
+                'victory_points': []
+            }
+            
+            self.states[new_id] = state_data
+            self._note_changes('create', [new_id])
+            changes = [('create', new_id, copy.deepcopy(state_data))]
+            old_state_id = None
+            if province_id:
+                old_state_id = self.province_to_state.get(province_id)
+                changes.append(self._move_province(province_id, new_id))
+            success, message = self._finish_edit(f"Create state {new_id}", changes, [old_state_id, new_id])
+            if not success:
+                raise StateWriteError(message)
+            
+            return new_id
     
     def update_state_properties(self, state_id, properties):
         """Update state properties"""
-        if state_id not in self.states:
-            return False, "State not found"
-        
-        state = self.states[state_id]
-        
-        # Update all provided properties
-        if 'name' in properties:
-            state['name'] = properties['name']
-        if 'manpower' in properties:
-            state['manpower'] = int(properties['manpower'])
-        if 'state_category' in properties:
-            state['state_category'] = properties['state_category']
-        if 'owner' in properties:
-            state['owner'] = properties['owner']
-        if 'resources' in properties:
-            state['resources'] = properties['resources']
-        if 'cores' in properties:
-            state['cores'] = properties['cores']
-        if 'claims' in properties:
-            state['claims'] = properties['claims']
-        if 'buildings' in properties:
-            state['buildings'] = properties['buildings']
-        if 'victory_points' in properties:
-            state['victory_points'] = properties['victory_points']
-        
-        # Regenerate file content
-        state['raw_content'] = self.generate_state_content(state)
-        
-        return True, "State updated successfully"
+        with self.lock:
+            if state_id not in self.states:
+                return False, "State not found"
+            
+            state = self.states[state_id]
+            before = {key: copy.deepcopy(state.get(key, MISSING)) for key in self.EDITABLE_FIELDS if key in properties}
+            
+            # Update all provided properties
+            if 'name' in properties:
+                state['name'] = properties['name']
+            if 'manpower' in properties:
+                state['manpower'] = int(properties['manpower'])
+            if 'state_category' in properties:
+                state['state_category'] = properties['state_category']
+            if 'owner' in properties:
+                state['owner'] = properties['owner']
+            if 'resources' in properties:
+                state['resources'] = properties['resources']
+            if 'cores' in properties:
+                state['cores'] = properties['cores']
+            if 'claims' in properties:
+                state['claims'] = properties['claims']
+            if 'buildings' in properties:
+                state['buildings'] = properties['buildings']
+            if 'victory_points' in properties:
+                state['victory_points'] = properties['victory_points']
+            
+            after = {key: copy.deepcopy(state.get(key, MISSING)) for key in before}
+            success, message = self._finish_edit(f"Edit state {state_id}",
+                                                 [('fields', state_id, before, after)], [state_id])
+            if not success:
+                return False, message
+            
+            return True, "State updated successfully"
     
     def add_province_to_state(self, state_id, province_id):
         """Add a province to a state, removing it from any previous state"""
-        if state_id not in self.states:
-            return False, "Target state not found"
-        
-        # Check if province is already in this state
-        if province_id in self.states[state_id]['provinces']:
-            return True, f"Province {province_id} is already in state {state_id}"
-        
-        # Remove province from old state if it exists
-        old_state_id = self.province_to_state.get(province_id)
-        if old_state_id and old_state_id in self.states:
-            # Remove from old state
-            if province_id in self.states[old_state_id]['provinces']:
-                self.states[old_state_id]['provinces'].remove(province_id)
-                # Regenerate and save old state
-                self.states[old_state_id]['raw_content'] = self.generate_state_content(
-                    self.states[old_state_id]
-                )
-                self.save_state(old_state_id)
-                print(f"Removed province {province_id} from state {old_state_id}")
-        
-        # Add to new state
-        self.states[state_id]['provinces'].append(province_id)
-        self.province_to_state[province_id] = state_id
-        
-        # Regenerate new state content
-        self.states[state_id]['raw_content'] = self.generate_state_content(self.states[state_id])
-        
-        # Save new state
-        success, message = self.save_state(state_id)
-        
-        if success:
+        with self.lock:
+            if state_id not in self.states:
+                return False, "Target state not found"
+            
+            # Check if province is already in this state
+            if province_id in self.states[state_id]['provinces']:
+                return True, f"Province {province_id} is already in state {state_id}"
+            
+            # Remove province from old state if it exists, then add it
+            old_state_id = self.province_to_state.get(province_id)
+            change = self._move_province(province_id, state_id)
+            success, message = self._finish_edit(f"Move province {province_id} to state {state_id}",
+                                                 [change], [old_state_id, state_id])
+            if not success:
+                return False, message
+            
             return True, f"Province {province_id} moved to state {state_id}"
-        else:
-            return False, f"Failed to save state: {message}"
+    
+    def remove_province_from_state(self, state_id, province_id):
+        """Remove a province from a state, leaving the province unassigned"""
+        with self.lock:
+            if state_id not in self.states:
+                return False, "State not found"
+            
+            if province_id not in self.states[state_id]['provinces']:
+                return False, "Province not in this state"
+            
+            change = self._move_province(province_id, None, from_state=state_id)
+            success, message = self._finish_edit(f"Remove province {province_id} from state {state_id}",
+                                                 [change], [state_id])
+            if not success:
+                return False, message
+            
+            return True, f"Province {province_id} removed from state {state_id}"
     
     def remove_province_from_states(self, province_id):
         """Remove a province from any state it belongs to"""
-        if province_id in self.province_to_state:
+        with self.lock:
+            if province_id not in self.province_to_state:
+                return True, f"Province {province_id} is not in a state"
             old_state_id = self.province_to_state[province_id]
-            if old_state_id in self.states:
-                self.states[old_state_id]['provinces'].remove(province_id)
-                self.states[old_state_id]['raw_content'] = self.generate_state_content(self.states[old_state_id])
-            del self.province_to_state[province_id]
+            change = self._move_province(province_id, None)
+            success, message = self._finish_edit(f"Unassign province {province_id}", [change], [old_state_id])
+            if not success:
+                return False, message
+            return True, f"Province {province_id} unassigned"
+    
+    def _move_province(self, province_id, state_id, from_state=None):
+        """Move a province between states (None = unassigned) without serializing.
+        
+        Returns the ('move', province, from, to, from_index) change for the
+        edit history.
+        """
+        old_state_id = self.province_to_state.get(province_id, from_state)
+        index = None
+        old_state = self.states.get(old_state_id)
+        if old_state is not None and province_id in old_state['provinces']:
+            index = old_state['provinces'].index(province_id)
+            del old_state['provinces'][index]
+        else:
+            old_state_id = None
+        
+        if state_id is None:
+            self.province_to_state.pop(province_id, None)
+        else:
+            self.states[state_id]['provinces'].append(province_id)
+            self.province_to_state[province_id] = state_id
+        self._note_changes('province', [province_id])
+        return ('move', province_id, old_state_id, state_id, index)
     
     def set_state_owner(self, state_id, owner_tag):
         """Set the owner of a state"""
+        with self.lock:
+            if state_id not in self.states:
+                return False, "State not found"
+            
+            old_owner = self.states[state_id].get('owner', MISSING)
+            self.states[state_id]['owner'] = owner_tag
+            success, message = self._finish_edit(f"Set owner of state {state_id} to {owner_tag}",
+                                                 [('fields', state_id, {'owner': old_owner}, {'owner': owner_tag})],
+                                                 [state_id])
+            if not success:
+                return False, message
+            
+            return True, f"State owner set to {owner_tag}"
+    
+    def delete_state(self, state_id):
+        """Delete a state, leaving its provinces unassigned
+        
+        The state file is removed on the next flush.
+        """
+        with self.lock:
+            if state_id not in self.states:
+                return False, "State not found"
+            
+            state_data = self.states.pop(state_id)
+            # Logged as unassigning each province in turn (always from the
+            # front of the list), then removing the now empty state
+            changes = []
+            for prov_id in state_data.get('provinces', []):
+                if self.province_to_state.get(prov_id) == state_id:
+                    del self.province_to_state[prov_id]
+                changes.append(('move', prov_id, state_id, None, 0))
+            # The file text stays in the snapshot so a restore patches it
+            snapshot = dict(state_data, provinces=[])
+            changes.append(('delete', state_id, copy.deepcopy(snapshot)))
+            self._log_edit(f"Delete state {state_id}", changes)
+            self._note_changes('province', state_data.get('provinces', []))
+            self._note_changes('delete', [state_id])
+            
+            self.dirty_states.discard(state_id)
+            self.deleted_files.add(state_data['file'])
+            # A batch reaches the revision once it is done
+            if self._batch_touched is None:
+                if self.write_behind:
+                    self.journal.record_delete(state_data['file'])
+                self._bump_revision()
+            
+            return True, f"State {state_id} deleted"
+    
+    def _log_edit(self, label, changes):
+        """Add an edit's changes to the open batch, or record it as one undo step"""
+        changes = [change for change in changes if change is not None]
+        if self._edit_log is not None:
+            self._edit_log.extend(changes)
+        else:
+            self.history.record(label, changes)
+    
+    def _finish_edit(self, label, changes, state_ids):
+        """Serialize the states an edit changed and log it as one undo step
+        
+        Inside a batch both are left to the batch. Returns (success,
+        message); when a state can't be written safely the edit is reverted
+        in memory and nothing is queued for the disk.
+        """
+        changes = [change for change in changes if change is not None]
+        if self._batch_touched is not None:
+            self._batch_touched.update(state_id for state_id in state_ids if state_id in self.states)
+            self._log_edit(label, changes)
+            return True, None
+        
+        try:
+            contents = self._serialize_states(state_ids)
+        except StateWriteError as e:
+            self._revert_changes(changes)
+            return False, str(e)
+        for state_id, content in contents.items():
+            self._store_content(state_id, content)
+        self._log_edit(label, changes)
+        return True, None
+    
+    def _revert_changes(self, changes):
+        """Take back changes already made in memory, without serializing anything"""
+        dirty_states, deleted_files = set(self.dirty_states), set(self.deleted_files)
+        self._batch_touched = set()
+        try:
+            self._apply_change_list([invert_change(change) for change in reversed(changes)])
+        finally:
+            self._batch_touched = None
+        self.dirty_states, self.deleted_files = dirty_states, deleted_files
+        self._discard_pending_changes()
+    
+    def undo(self):
+        """Revert the latest edit
+        
+        Returns (success, result) like apply_batch, with the undone edit's
+        label, or an error message when there is nothing to undo or the
+        undone states can't be written.
+        """
+        with self.lock:
+            entry = self.history.pop_undo()
+            if entry is None:
+                return False, "Nothing to undo"
+            try:
+                return True, self._apply_changes(*entry)
+            except StateWriteError as e:
+                self.history.pop_redo()
+                return False, str(e)
+    
+    def redo(self):
+        """Re-apply the latest undone edit"""
+        with self.lock:
+            entry = self.history.pop_redo()
+            if entry is None:
+                return False, "Nothing to redo"
+            try:
+                return True, self._apply_changes(*entry)
+            except StateWriteError as e:
+                self.history.pop_undo()
+                return False, str(e)
+    
+    def _apply_changes(self, label, changes):
+        """Apply logged changes, serializing each touched state once
+        
+        Only the states named in the changes are touched; everything else,
+        on disk and in memory, is left alone. Raises StateWriteError, with
+        the changes taken back, when a touched state can't be written.
+        """
+        dirty_states, deleted_files = set(self.dirty_states), set(self.deleted_files)
+        self._batch_touched = set()
+        try:
+            states, removed, province_ids = self._apply_change_list(changes)
+        finally:
+            touched = self._batch_touched
+            self._batch_touched = None
+        
+        try:
+            contents = self._serialize_states(touched)
+        except StateWriteError:
+            self._revert_changes(changes)
+            self.dirty_states, self.deleted_files = dirty_states, deleted_files
+            raise
+        for state_id, content in contents.items():
+            self._store_content(state_id, content)
+        if self.write_behind:
+            for change in changes:
+                if change[0] == 'delete' and change[1] in removed:
+                    self.journal.record_delete(change[2]['file'])
+        self._bump_revision()
+        
+        return {
+            'label': label,
+            'states': sorted(states),
+            'removed_states': sorted(removed),
+            'province_ids': sorted(province_ids)
+        }
+    
+    def _apply_change_list(self, changes):
+        """Apply logged changes in memory, collecting touched states in _batch_touched
+        
+        Returns the sets of changed states, removed states and provinces.
+        """
+        states = set()
+        removed = set()
+        province_ids = set()
+        
+        for change in changes:
+            kind = change[0]
+            if kind in ('move', 'unmove'):
+                _, province_id, from_state, to_state, index = change
+                self._apply_move(province_id, from_state, to_state, index if kind == 'unmove' else None)
+                states.update(state_id for state_id in (from_state, to_state) if state_id is not None)
+                province_ids.add(province_id)
+            elif kind == 'fields':
+                _, state_id, _, after = change
+                state = self.states[state_id]
+                for key, value in after.items():
+                    if value is MISSING:
+                        state.pop(key, None)
+                    else:
+                        state[key] = copy.deepcopy(value)
+                self._batch_touched.add(state_id)
+                states.add(state_id)
+                province_ids.update(state['provinces'])
+            elif kind == 'create':
+                _, state_id, state_data = change
+                state_data = copy.deepcopy(state_data)
+                self.states[state_id] = state_data
+                self.deleted_files.discard(state_data['file'])
+                self._batch_touched.add(state_id)
+                self._note_changes('create', [state_id])
+                states.add(state_id)
+                removed.discard(state_id)
+            elif kind == 'delete':
+                _, state_id, _ = change
+                state_data = self.states.pop(state_id)
+                self.dirty_states.discard(state_id)
+                self.deleted_files.add(state_data['file'])
+                self._note_changes('delete', [state_id])
+                states.discard(state_id)
+                removed.add(state_id)
+        
+        return states, removed, province_ids
+    
+    def _apply_move(self, province_id, from_state, to_state, index=None):
+        """Move a province for undo/redo, inserting at index when given"""
+        self._note_changes('province', [province_id])
+        if from_state in self.states:
+            provinces = self.states[from_state]['provinces']
+            if province_id in provinces:
+                provinces.remove(province_id)
+            self._batch_touched.add(from_state)
+        
+        if to_state is None:
+            self.province_to_state.pop(province_id, None)
+            return
+        provinces = self.states[to_state]['provinces']
+        if index is None:
+            provinces.append(province_id)
+        else:
+            provinces.insert(index, province_id)
+        self.province_to_state[province_id] = to_state
+        self._batch_touched.add(to_state)
+    
+    def mark_dirty(self, state_id):
+        """Regenerate a changed state's file content and queue it for the next flush"""
+        with self.lock:
+            if self._batch_touched is not None:
+                self._batch_touched.add(state_id)
+                return
+            self._store_content(state_id, self.serialize_state(self.states[state_id]))
+    
+    def _serialize_states(self, state_ids):
+        """File content for each existing state in state_ids
+        
+        Everything is serialized before anything is stored, so a
+        StateWriteError for one state leaves all of them untouched.
+        """
+        return {state_id: self.serialize_state(self.states[state_id])
+                for state_id in sorted(set(state_ids) & self.states.keys())}
+    
+    def _store_content(self, state_id, content):
+        """Keep a state's new file content and queue it for the next flush"""
+        state_data = self.states[state_id]
+        state_data['raw_content'] = content
+        self.dirty_states.add(state_id)
+        if self.write_behind:
+            self.journal.record_write(state_data['file'], content)
+        self._note_changes('state', [state_id])
+        self._bump_revision()
+    
+    def _bump_revision(self):
+        with self.lock:
+            self.revision += 1
+    
+    def _note_changes(self, kind, ids):
+        """Log states ('state', 'create', 'delete') or provinces ('province')
+        
+        Entries carry the revision the current edit is about to reach;
+        every edit bumps the revision once it is done.
+        """
+        with self.lock:
+            revision = self.revision + 1
+            entries = [(revision, kind, key) for key in ids]
+            overflow = len(self.change_log) + len(entries) - self.change_log.maxlen
+            if overflow > 0:
+                # Revisions losing entries off the front aren't covered any more
+                evicted = self.change_log[overflow - 1][0] if overflow <= len(self.change_log) else revision
+                self._log_floor = max(self._log_floor, evicted)
+            self.change_log.extend(entries)
+    
+    def _discard_pending_changes(self):
+        """Drop log entries of an edit that was taken back before its revision was reached"""
+        with self.lock:
+            while self.change_log and self.change_log[-1][0] > self.revision:
+                self.change_log.pop()
+    
+    def _reset_change_log(self):
+        """Start a new revision that clients can only catch up to with a full reload"""
+        with self.lock:
+            self._bump_revision()
+            self.change_log.clear()
+            self._log_floor = self.revision
+    
+    def changes_since(self, revision, session=None):
+        """Get what changed after `revision`, for clients that have it
+        
+        Returns {'revision', 'session', 'full', 'created', 'updated',
+        'deleted', 'moves'}. created and updated are IDs of states that
+        exist now, deleted the IDs of states that don't, and moves maps each
+        moved province to its current state (None = unassigned). 'full' is set instead when the
+        log doesn't reach back to `revision` or `session` belongs to
+        another editor; the client then has to reload everything.
+        """
+        with self.lock:
+            result = {'revision': self.revision, 'session': self.session, 'full': False,
+                      'created': [], 'updated': [], 'deleted': [], 'moves': {}}
+            
+            if (session is not None and session != self.session) or not self._log_floor <= revision <= self.revision:
+                result['full'] = True
+                return result
+            
+            states = set()
+            created = set()
+            provinces = set()
+            for entry_revision, kind, key in reversed(self.change_log):
+                if entry_revision <= revision:
+                    break
+                if kind == 'province':
+                    provinces.add(key)
+                else:
+                    states.add(key)
+                    if kind == 'create':
+                        created.add(key)
+            
+            # Only where things ended up matters, not how they got there
+            for state_id in sorted(states):
+                if state_id not in self.states:
+                    result['deleted'].append(state_id)
+                elif state_id in created:
+                    result['created'].append(state_id)
+                else:
+                    result['updated'].append(state_id)
+            result['moves'] = {province_id: self.province_to_state.get(province_id)
+                               for province_id in sorted(provinces)}
+            return result
+    
+    def apply_batch(self, operations):
+        """Apply a list of edits as one all-or-nothing change
+        
+        Each operation is a dict with an 'op' from BATCH_OPERATIONS:
+        move_provinces (state_id, province_ids), remove_provinces
+        (province_ids), set_owner (state_id, owner), update_state
+        (state_id, properties), create_state (province_ids, owner, name)
+        and delete_state (state_id). A state_id of "$N" refers to the state
+        created by operation N of the same batch.
+        
+        Everything is validated first; if any operation then fails, all
+        earlier ones are rolled back. Touched states are serialized once at
+        the end. Returns (success, result) where result has 'created',
+        'states', 'removed_states' and 'province_ids', or 'errors'.
+        """
+        errors = self._validate_batch(operations)
+        if errors:
+            return False, {'errors': errors}
+        
+        with self.lock:
+            saved_states = {}
+            saved_province_to_state = dict(self.province_to_state)
+            saved_dirty = set(self.dirty_states)
+            saved_deleted = set(self.deleted_files)
+            
+            created = {}
+            province_ids = set()
+            self._batch_touched = set()
+            self._edit_log = []
+            try:
+                for index, operation in enumerate(operations):
+                    success, message = self._apply_operation(index, operation, created, saved_states, province_ids)
+                    if not success:
+                        raise ValueError(f"Operation {index} ({operation['op']}): {message}")
+                # Serialized while the batch can still be rolled back
+                contents = self._serialize_states(self._batch_touched)
+            except Exception as e:
+                # Put back every state as it was before the batch
+                for state_id, state_data in saved_states.items():
+                    if state_data is None:
+                        self.states.pop(state_id, None)
+                    else:
+                        self.states[state_id] = state_data
+                self.province_to_state = saved_province_to_state
+                self.dirty_states = saved_dirty
+                self.deleted_files = saved_deleted
+                self._discard_pending_changes()
+                return False, {'errors': [str(e)]}
+            finally:
+                changes = self._edit_log
+                self._batch_touched = None
+                self._edit_log = None
+            
+            self.history.record(f"Batch of {len(operations)} edits", changes)
+            for state_id, content in contents.items():
+                self._store_content(state_id, content)
+            if not contents:
+                # Only deletes, nothing left to store
+                self._bump_revision()
+            
+            removed = [state_id for state_id, state_data in saved_states.items()
+                       if state_data is not None and state_id not in self.states]
+            if self.write_behind:
+                for state_id in removed:
+                    self.journal.record_delete(saved_states[state_id]['file'])
+            
+            return True, {
+                'created': created,
+                'states': sorted(state_id for state_id in saved_states if state_id in self.states),
+                'removed_states': sorted(removed),
+                'province_ids': sorted(province_ids)
+            }
+    
+    def _validate_batch(self, operations):
+        """Check the shape of every batch operation before anything is applied"""
+        if not isinstance(operations, list) or not operations:
+            return ["Operations must be a non-empty list"]
+        
+        errors = []
+        creates = set()
+        for index, operation in enumerate(operations):
+            def error(message):
+                errors.append(f"Operation {index}: {message}")
+            
+            if not isinstance(operation, dict) or operation.get('op') not in self.BATCH_OPERATIONS:
+                error(f"unknown operation, expected one of {', '.join(self.BATCH_OPERATIONS)}")
+                continue
+            op = operation['op']
+            
+            if op in ('move_provinces', 'set_owner', 'update_state', 'delete_state'):
+                state_ref = operation.get('state_id')
+                if isinstance(state_ref, str) and state_ref.startswith('$'):
+                    if _to_int(state_ref[1:]) not in creates:
+                        error(f"{state_ref} does not refer to an earlier create_state")
+                elif _to_int(state_ref) is None:
+                    error("state_id is required")
+            
+            if op in ('move_provinces', 'remove_provinces', 'create_state'):
+                province_ids = operation.get('province_ids', [])
+                if not isinstance(province_ids, list) or (op != 'create_state' and not province_ids):
+                    error("province_ids must be a non-empty list")
+                else:
+                    unknown = [p for p in province_ids
+                               if _to_int(p) is None or (self.provinces and _to_int(p) not in self.provinces)]
+                    if unknown:
+                        error(f"unknown provinces {unknown[:10]}")
+            
+            owner = operation.get('owner')
+            if op == 'set_owner' or owner is not None:
+                if not isinstance(owner, str) or not re.match(r'^[A-Z][A-Z0-9]{2}$', owner):
+                    error("owner must be a country tag")
+            
+            if op == 'update_state':
+                properties = operation.get('properties')
+                if not isinstance(properties, dict) or not properties:
+                    error("properties must be a non-empty object")
+                elif 'manpower' in properties and _to_int(properties['manpower']) is None:
+                    error("manpower must be a number")
+            
+            if op == 'create_state':
+                creates.add(index)
+        return errors
+    
+    def _apply_operation(self, index, operation, created, saved_states, province_ids):
+        def save(state_id):
+            # Remember a state the first time the batch touches it
+            if state_id is not None and state_id not in saved_states:
+                saved_states[state_id] = copy.deepcopy(self.states.get(state_id))
+        
+        def resolve(state_ref):
+            if isinstance(state_ref, str) and state_ref.startswith('$'):
+                return created[int(state_ref[1:])]
+            return _to_int(state_ref)
+        
+        op = operation['op']
+        provinces = [_to_int(p) for p in operation.get('province_ids', [])]
+        for prov_id in provinces:
+            save(self.province_to_state.get(prov_id))
+        province_ids.update(provinces)
+        
+        if op == 'create_state':
+            state_id = self.create_new_state(provinces[0] if provinces else None,
+                                             owner_tag=operation.get('owner') or 'XXX',
+                                             name=operation.get('name'))
+            saved_states.setdefault(state_id, None)
+            created[index] = state_id
+            for prov_id in provinces[1:]:
+                success, message = self.add_province_to_state(state_id, prov_id)
+                if not success:
+                    return False, message
+            return True, f"State {state_id} created"
+        
+        if op == 'remove_provinces':
+            for prov_id in provinces:
+                self.remove_province_from_states(prov_id)
+            return True, f"{len(provinces)} provinces unassigned"
+        
+        state_id = resolve(operation['state_id'])
         if state_id not in self.states:
-            return False, "State not found"
+            return False, f"State {state_id} not found"
+        save(state_id)
+        
+        if op == 'move_provinces':
+            for prov_id in provinces:
+                success, message = self.add_province_to_state(state_id, prov_id)
+                if not success:
+                    return False, message
+            return True, f"{len(provinces)} provinces moved to state {state_id}"
+        
+        # The whole state changes colour or disappears from the map
+        province_ids.update(self.states[state_id].get('provinces', []))
+        if op == 'set_owner':
+            return self.set_state_owner(state_id, operation['owner'])
+        if op == 'update_state':
+            return self.update_state_properties(state_id, operation['properties'])
+        return self.delete_state(state_id)
+    
+    def has_unsaved_changes(self):
+        return bool(self.dirty_states or self.deleted_files)
+    
+    def commit(self):
+        """Persist the edits of one request
+        
+        Flushes right away, or in write-behind mode leaves it to the
+        background thread and reports what is pending.
+        """
+        with self.lock:
+            if self.write_behind:
+                self.write_behind.schedule()
+                return {'deferred': True, 'pending_states': len(self.dirty_states),
+                        'pending_deletes': len(self.deleted_files)}
+            return self.flush()
+    
+    def enable_write_behind(self, interval=2.0):
+        """Switch to journaled, debounced background saving"""
+        with self.lock:
+            if self.write_behind:
+                self.write_behind.interval = interval
+                return
+            self.write_behind = WriteBehindFlusher(self, interval=interval)
+            # Edits made before now are still only in memory
+            for state_id in self.dirty_states:
+                self.journal.record_write(self.states[state_id]['file'], self.states[state_id]['raw_content'])
+            for filename in self.deleted_files:
+                self.journal.record_delete(filename)
+    
+    def disable_write_behind(self):
+        """Flush outstanding edits and go back to saving in each request"""
+        flusher = self.write_behind
+        if flusher is None:
+            return None
+        report = flusher.stop(flush=True)
+        with self.lock:
+            self.write_behind = None
+        return report
+    
+    def replay_journal(self):
+        """Apply edits left in the journal by a crash, returning how many"""
+        records = self.journal.read()
+        for record in records:
+            # Only ever touch files directly inside history/states
+            filepath = os.path.join(self.states_dir, os.path.basename(record['file']))
+            if record['op'] == 'write':
+                self._write_file_atomic(filepath, record['content'])
+            elif record['op'] == 'delete' and os.path.exists(filepath):
+                os.remove(filepath)
+                self._own_writes[filepath] = None
+        self.journal.clear()
+        if records:
+            print(f"Recovered {len(records)} unsaved state edits from the journal")
+        return len(records)
+    
+    def serialize_state(self, state_data):
+        """Get the file content for a state
+        
+        States that have file text are patched in place so everything the
+        editor doesn't model survives; only new states come from the
+        template. Raises StateWriteError when the result wouldn't read back
+        as the edited state; existing text is never regenerated.
+        """
+        if state_data.get('raw_content'):
+            return self.patch_state_content(state_data)
+        
+        content = self.generate_state_content(state_data)
+        document = parse_script(content)
+        check = document.find('state')
+        if document.errors or check is None or not self._fields_match(self.read_state_fields(check), state_data):
+            raise StateWriteError(f"State {state_data.get('id')} can't be written from the template")
+        return content
+    
+    def patch_state_content(self, state_data):
+        """Splice changed fields into a state's current file text
+        
+        Only fields that differ from what the text already says are touched,
+        each by replacing, inserting or removing single statements; all other
+        bytes are copied verbatim. Raises StateWriteError when the text
+        can't be patched safely.
+        """
+        text = state_data.get('raw_content') or ''
+        document = parse_script(text)
+        state = document.find('state')
+        if state is None or not state.is_block:
+            raise StateWriteError(f"State {state_data.get('id')} has no state block in {state_data.get('file')}")
+        
+        current = self.read_state_fields(state)
+        patcher = ScriptPatcher(text)
+        
+        try:
+            for key, quoted in (('id', False), ('name', True), ('manpower', False), ('state_category', False)):
+                if key in state_data:
+                    if not same_value(current.get(key), state_data[key]):
+                        self._patch_scalar(patcher, state, key, state_data[key], quoted)
+                elif key in self.OPTIONAL_FIELDS and key in current:
+                    patcher.remove(next(child for child in state.find_all(key) if not child.is_block))
+            
+            if not self._same_field('provinces', current['provinces'], state_data.get('provinces', [])):
+                self._patch_provinces(patcher, state, state_data.get('provinces', []))
+            
+            if not self._same_field('resources', current['resources'], state_data.get('resources', {})):
+                self._patch_resources(patcher, state, state_data.get('resources', {}))
+            
+            history_fields = ('owner', 'cores', 'claims', 'buildings', 'victory_points')
+            if any(not self._same_field(key, current.get(key), state_data.get(key))
+                   for key in history_fields if key in state_data or key in self.OPTIONAL_FIELDS):
+                history = state.find('history')
+                if history is None or not history.is_block:
+                    patcher.append_to_block(state, ['history = {', '}'])
+                    # Patch the freshly inserted block on the next pass
+                    return self._reparse_and_patch(patcher.apply(), state_data)
+                self._patch_history(patcher, history, current, state_data)
+            
+            patched = patcher.apply()
+        except StateWriteError:
+            raise
+        except ValueError as e:
+            raise StateWriteError(f"Could not patch state {state_data.get('id')}: {e}") from e
         
-        self.states[state_id]['owner'] = owner_tag
-        self.states[state_id]['raw_content'] = self.generate_state_content(self.states[state_id])
+        # Never write something that doesn't read back as the edited state
+        check_document = parse_script(patched)
+        check = check_document.find('state')
+        if (len(check_document.errors) > len(document.errors) or check is None
+                or not self._fields_match(self.read_state_fields(check), state_data)):
+            raise StateWriteError(f"Editing state {state_data.get('id')} would change {state_data.get('file')} "
+                                  f"in ways the editor can't read back; the file was left as it is")
+        return patched
+    
+    def _reparse_and_patch(self, text, state_data):
+        return self.patch_state_content(dict(state_data, raw_content=text))
+    
+    def _fields_match(self, fields, state_data):
+        keys = (fields.keys() & state_data.keys()) | set(self.OPTIONAL_FIELDS)
+        return all(self._same_field(key, fields.get(key), state_data.get(key)) for key in keys)
+    
+    @staticmethod
+    def _same_field(key, old, new):
+        """Compare a field read from the file with the edited value"""
+        if key in ('cores', 'claims'):
+            return sorted(old or []) == sorted(new or [])
+        if key == 'victory_points':
+            return ({vp['province']: vp['value'] for vp in old or []} ==
+                    {int(vp['province']): int(vp['value']) for vp in new or []})
+        if key in ('buildings', 'resources'):
+            old, new = old or {}, new or {}
+            return all(same_value(old.get(k, 0), new.get(k, 0)) for k in set(old) | set(new))
+        if key == 'provinces':
+            return list(old or []) == list(new or [])
+        if key in StateEditor.OPTIONAL_FIELDS:
+            # An empty name or owner reads back as no statement at all
+            old, new = old or None, new or None
+        if old is None or new is None:
+            return old == new
+        return same_value(old, new)
+    
+    def _patch_scalar(self, patcher, block, key, value, quoted=False, anchor=None):
+        """Set `key = value` in a block, adding the statement if it's missing"""
+        node = next((child for child in block.find_all(key) if not child.is_block), None)
+        if node is not None:
+            patcher.set_value(node, value, quoted)
+        elif anchor is not None:
+            patcher.insert_after(anchor, [f"{key} = {format_value(value, quoted)}"])
+        else:
+            patcher.append_to_block(block, [f"{key} = {format_value(value, quoted)}"])
+    
+    def _patch_provinces(self, patcher, state, provinces):
+        province_text = ' '.join(str(p) for p in provinces)
+        node = state.find('provinces')
+        if node is None or not node.is_block:
+            patcher.append_to_block(state, ['provinces = {', '\t' + province_text, '}'])
+            return
         
-        return True, f"State owner set to {owner_tag}"
+        values = [child for child in node if child.key is None]
+        if values:
+            # Keep the list's own layout, only swap the IDs
+            patcher.replace(values[0].start, values[-1].end, province_text)
+        elif provinces:
+            patcher.append_to_block(node, [province_text])
+    
+    def _patch_resources(self, patcher, state, resources):
+        node = state.find('resources')
+        if node is None or not node.is_block:
+            if resources:
+                lines = ['resources = {'] + [f"\t{k} = {format_value(v)}" for k, v in resources.items()] + ['}']
+                patcher.append_to_block(state, lines)
+            return
+        
+        existing = {child.key: child for child in node if child.key and not child.is_block}
+        for key, child in existing.items():
+            if key not in resources:
+                patcher.remove(child)
+            elif not same_value(child.value, resources[key]):
+                patcher.set_value(child, format_value(resources[key]))
+        added = [f"{k} = {format_value(v)}" for k, v in resources.items() if k not in existing]
+        if added:
+            patcher.append_to_block(node, added)
+    
+    def _patch_history(self, patcher, history, current, state_data):
+        """Patch owner, cores, claims, buildings and VPs in the base history block"""
+        owner_node = next((c for c in history.find_all('owner') if not c.is_block), None)
+        if not self._same_field('owner', current.get('owner'), state_data.get('owner')):
+            if state_data.get('owner'):
+                self._patch_scalar(patcher, history, 'owner', state_data['owner'])
+            elif owner_node is not None:
+                patcher.remove(owner_node)
+                owner_node = None
+        
+        for key, statement in (('cores', 'add_core_of'), ('claims', 'add_claim_by')):
+            if key in state_data and not self._same_field(key, current[key], state_data[key]):
+                self._patch_tag_list(patcher, history, statement, state_data[key], owner_node)
+        
+        if 'buildings' in state_data and not self._same_field('buildings', current['buildings'], state_data['buildings']):
+            self._patch_buildings(patcher, history, current['buildings'], state_data['buildings'],
+                                  state_data.get('provinces', current['provinces']))
+        
+        if 'victory_points' in state_data and not self._same_field('victory_points', current['victory_points'],
+                                                                   state_data['victory_points']):
+            self._patch_victory_points(patcher, history, state_data['victory_points'], owner_node)
+    
+    def _patch_tag_list(self, patcher, history, statement, tags, anchor):
+        nodes = [child for child in history.find_all(statement) if not child.is_block]
+        wanted = list(tags)
+        kept = []
+        for node in nodes:
+            if node.value in wanted:
+                wanted.remove(node.value)
+                kept.append(node)
+            else:
+                patcher.remove(node)
+        if wanted:
+            lines = [f"{statement} = {tag}" for tag in wanted]
+            anchor = kept[-1] if kept else anchor
+            if anchor is not None:
+                patcher.insert_after(anchor, lines)
+            else:
+                patcher.append_to_block(history, lines)
+    
+    def _patch_buildings(self, patcher, history, current, buildings, provinces):
+        node = history.find('buildings')
+        if node is None or not node.is_block:
+            lines = ["\t" + line for line in self._building_lines(buildings, provinces)]
+            if lines:
+                patcher.append_to_block(history, ['buildings = {'] + lines + ['}'])
+            return
+        
+        # Province-level buildings (`11506 = { naval_base = 3 }`) count for
+        # the state when it has no state-level statement for them; the
+        # state reads as the highest province level (see read_state_fields)
+        province_blocks = [child for child in node if child.is_block and child.key and child.key.isdigit()]
+        added = []
+        removed = set()
+        for key, value in buildings.items():
+            if same_value(current.get(key, 0), value):
+                continue
+            value = _to_int(value) or 0
+            child = next((c for c in node.find_all(key) if not c.is_block), None)
+            province_nodes = [building for block in province_blocks for building in block
+                              if building.key == key and not building.is_block]
+            if child is not None and value:
+                patcher.set_value(child, value)
+            elif child is not None or (province_nodes and not value):
+                # Nothing may be left for the value to fall back to
+                if child is not None:
+                    patcher.remove(child)
+                removed.update(id(building) for building in province_nodes)
+            elif province_nodes:
+                levels = [_to_int(building.value) or 0 for building in province_nodes]
+                for building, level in zip(province_nodes, levels):
+                    if level > value:
+                        patcher.set_value(building, value)
+                if max(levels) < value:
+                    patcher.set_value(province_nodes[levels.index(max(levels))], value)
+            elif value and key in self.PROVINCE_BUILDINGS:
+                province = self._building_province(key, provinces, province_blocks)
+                block = next((b for b in province_blocks if b.key == str(province)), None)
+                if block is not None:
+                    patcher.append_to_block(block, [f"{key} = {value}"])
+                else:
+                    added.append(f"{province} = {{ {key} = {value} }}")
+            elif value:
+                added.append(f"{key} = {value}")
+        
+        for block in province_blocks:
+            gone = [building for building in block if id(building) in removed]
+            if gone and len(gone) == len(block.value):
+                patcher.remove(block)
+            else:
+                for building in gone:
+                    patcher.remove(building)
+        if added:
+            patcher.append_to_block(node, added)
+    
+    def _building_lines(self, buildings, provinces):
+        """Statements for a new buildings block, province-level ones in their province's block"""
+        buildings = {key: _to_int(value) or 0 for key, value in buildings.items()}
+        lines = [f"{key} = {value}" for key, value in buildings.items()
+                 if value > 0 and key not in self.PROVINCE_BUILDINGS]
+        by_province = {}
+        for key, value in buildings.items():
+            if value > 0 and key in self.PROVINCE_BUILDINGS:
+                by_province.setdefault(self._building_province(key, provinces), []).append(f"{key} = {value}")
+        lines.extend(f"{province} = {{ {' '.join(statements)} }}" for province, statements in by_province.items())
+        return lines
+    
+    def _building_province(self, key, provinces, province_blocks=()):
+        """Province to put a province-level building in when the state has none
+        
+        Provinces that already have buildings come first, and naval
+        buildings go to a coastal province when the map knows of one.
+        Raises StateWriteError for a state without provinces.
+        """
+        provinces = [int(p) for p in provinces]
+        if not provinces:
+            raise StateWriteError(f"State has no province to put {key} in")
+        
+        built = [int(block.key) for block in province_blocks if int(block.key) in provinces]
+        candidates = built + [p for p in provinces if p not in built]
+        if key in ('naval_base', 'coastal_bunker'):
+            coastal = [p for p in candidates if self.provinces.get(p, {}).get('coastal')]
+            candidates = coastal or candidates
+        return candidates[0]
+    
+    def _patch_victory_points(self, patcher, history, victory_points, anchor):
+        existing = {}
+        for node in history.find_all('victory_points'):
+            values = [child for child in node if child.key is None] if node.is_block else []
+            if len(values) >= 2:
+                existing.setdefault(_to_int(values[0].value), (node, values[1]))
+        
+        wanted = {int(vp['province']): int(vp['value']) for vp in victory_points}
+        last_kept = None
+        for province, (node, value_node) in existing.items():
+            if province not in wanted:
+                patcher.remove(node)
+                continue
+            last_kept = node
+            if not same_value(value_node.value, wanted[province]):
+                patcher.set_value(value_node, wanted[province])
+        
+        lines = [f"victory_points = {{ {p} {v} }}" for p, v in wanted.items() if p not in existing]
+        if lines:
+            anchor = last_kept or anchor
+            if anchor is not None:
+                patcher.insert_after(anchor, lines)
+            else:
+                patcher.append_to_block(history, lines)
     
     def generate_state_content(self, state_data):
         """Generate state file content from state data"""
@@ -392,18 +1695,8 @@ class StateEditor:
         # Build buildings section
         buildings = state_data.get('buildings', {})
         buildings_str = "\t\tbuildings = {\n"
-        if buildings.get('infrastructure', 0) > 0:
-            buildings_str += f"\t\t\tinfrastructure = {buildings['infrastructure']}\n"
-        if buildings.get('industrial_complex', 0) > 0:
-            buildings_str += f"\t\t\tindustrial_complex = {buildings['industrial_complex']}\n"
-        if buildings.get('air_base', 0) > 0:
-            buildings_str += f"\t\t\tair_base = {buildings['air_base']}\n"
-        if buildings.get('naval_base', 0) > 0:
-            buildings_str += f"\t\t\tnaval_base = {buildings['naval_base']}\n"
-        if buildings.get('synthetic_refinery', 0) > 0:
-            buildings_str += f"\t\t\tsynthetic_refinery = {buildings['synthetic_refinery']}\n"
-        if buildings.get('fuel_silo', 0) > 0:
-            buildings_str += f"\t\t\tfuel_silo = {buildings['fuel_silo']}\n"
+        for line in self._building_lines(buildings, state_data.get('provinces', [])):
+            buildings_str += f"\t\t\t{line}\n"
         buildings_str += "\t\t}\n"
         
         # Build cores/claims section
@@ -420,12 +1713,13 @@ class StateEditor:
         for vp in state_data.get('victory_points', []):
             vp_str += f"\t\tvictory_points = {{\n\t\t\t{vp['province']} {vp['value']}\n\t\t}}\n"
         
+        owner_str = f"\t\towner = {state_data['owner']}\n" if state_data.get('owner') else ""
+        
         content = f"""state={{
 \tid={state_data.get('id', 1)}
-\tname="{state_data.get('name', 'STATE_1')}"
+\tname={format_value(state_data.get('name', 'STATE_1'), quoted=True)}
 {resources_str}\thistory={{
-\t\towner = {state_data.get('owner', 'XXX')}
-{cores_str}{claims_str}{vp_str}{buildings_str}\t}}
+{owner_str}{cores_str}{claims_str}{vp_str}{buildings_str}\t}}
 \tprovinces={{
 \t\t{provinces_str}
 \t}}
@@ -444,48 +1738,323 @@ class StateEditor:
         filepath = os.path.join(self.states_dir, state_data['file'])
         
         try:
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(state_data['raw_content'])
+            self._write_file_atomic(filepath, state_data['raw_content'])
+            self.dirty_states.discard(state_id)
             return True, "State saved successfully"
         except Exception as e:
             return False, f"Error saving state: {str(e)}"
     
-    def save_all_states(self):
-        """Save all modified states"""
-        saved_count = 0
-        errors = []
+    def flush(self):
+        """Write dirty states and remove files of deleted states
+        
+        Only states changed since the last flush are written, each through a
+        temporary file renamed into place so a crash never leaves a
+        half-written state behind. Returns a report of what was touched.
+        """
+        with self.lock:
+            return self._flush()
+    
+    def _flush(self):
+        start = time.perf_counter()
+        report = {'files_written': 0, 'bytes_written': 0, 'files_deleted': 0, 'errors': []}
+        
+        # Deletions first, so a new state reusing a deleted file name survives
+        live_files = {state['file'] for state in self.states.values()}
+        failed_deletes = set()
+        for filename in sorted(self.deleted_files - live_files):
+            filepath = os.path.join(self.states_dir, filename)
+            try:
+                if os.path.exists(filepath):
+                    os.remove(filepath)
+                    self._own_writes[filepath] = None
+                    report['files_deleted'] += 1
+            except OSError as e:
+                report['errors'].append(f"{filename}: {e}")
+                failed_deletes.add(filename)
+        self.deleted_files = failed_deletes
+        
+        # States that fail to write stay dirty for the next flush
+        failed = set()
+        for state_id in sorted(self.dirty_states):
+            state_data = self.states.get(state_id)
+            if state_data is None:
+                continue
+            filepath = os.path.join(self.states_dir, state_data['file'])
+            try:
+                report['bytes_written'] += self._write_file_atomic(filepath, state_data['raw_content'])
+                report['files_written'] += 1
+            except OSError as e:
+                report['errors'].append(f"State {state_id}: {e}")
+                failed.add(state_id)
+        self.dirty_states = failed
         
-        for state_id, state_data in self.states.items():
-            success, message = self.save_state(state_id)
-            if success:
-                saved_count += 1
+        # Everything journaled is on disk now
+        if not report['errors']:
+            self.journal.clear()
+        
+        report['elapsed'] = round(time.perf_counter() - start, 4)
+        return report
+    
+    def _write_file_atomic(self, filepath, content):
+        """Write a text file via a temp file and rename, returning bytes written"""
+        directory = os.path.dirname(filepath)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(filepath), suffix='.tmp')
+        try:
+            # mkstemp files are private (0600); keep the mode the file had,
+            # or the usual one for a new file
+            try:
+                mode = os.stat(filepath).st_mode & 0o7777
+            except FileNotFoundError:
+                mode = _NEW_FILE_MODE
+            os.chmod(tmp_path, mode)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(content)
+                f.flush()
+                stat = os.fstat(f.fileno())
+            os.replace(tmp_path, filepath)
+            self._own_writes[filepath] = (stat.st_mtime_ns, stat.st_size)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        return stat.st_size
+    
+    def _is_own_write(self, filepath):
+        """Check whether a file is still exactly as this editor left it"""
+        if filepath not in self._own_writes:
+            return False
+        expected = self._own_writes.pop(filepath)
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            return expected is None
+        return expected == (stat.st_mtime_ns, stat.st_size)
+    
+    def apply_file_changes(self, changes):
+        """Bring in edits made to project files outside the editor
+        
+        `changes` is a FileWatcher report of relative paths. Changed state
+        files are parsed again one by one and definition.csv is re-read;
+        files the editor wrote itself are skipped. A state with unsaved
+        edits keeps the in-memory version and is reported as a conflict.
+        """
+        result = {'states_updated': [], 'states_removed': [], 'province_ids': set(),
+                  'definition': False, 'other': [], 'conflicts': []}
+        
+        with self.lock:
+            for kind in ('deleted', 'modified', 'added'):
+                for relpath in changes.get(kind, []):
+                    filepath = os.path.join(self.project_root, *relpath.split('/'))
+                    if self._is_own_write(filepath):
+                        continue
+                    
+                    parts = relpath.split('/')
+                    if len(parts) == 3 and parts[:2] == ['history', 'states'] and relpath.endswith('.txt'):
+                        self._reload_state_file(parts[2], filepath, kind == 'deleted', result)
+                    elif relpath == 'map/definition.csv':
+                        if not result['definition']:
+                            self.parse_definition_csv()
+                            result['definition'] = True
+                    else:
+                        result['other'].append(relpath)
+        
+        result['province_ids'] = sorted(result['province_ids'])
+        if result['states_updated'] or result['states_removed']:
+            # Logged edits may refer to state contents that no longer exist
+            self.history.clear()
+            self._bump_revision()
+        elif result['definition']:
+            self._bump_revision()
+        return result
+    
+    def _reload_state_file(self, filename, filepath, deleted, result):
+        old_id = next((state_id for state_id, state in self.states.items()
+                       if state.get('file') == filename), None)
+        if old_id is not None and old_id in self.dirty_states:
+            result['conflicts'].append(old_id)
+            return
+        
+        state_data = None
+        if not deleted:
+            try:
+                stat = os.stat(filepath)
+            except OSError:
+                deleted = True
             else:
-                errors.append(f"State {state_id}: {message}")
+                state_data = self.parse_state_file(filepath)
+                if state_data:
+                    self.parse_cache.put(self.STATE_CACHE_KIND, filename, stat, state_data)
+        if deleted:
+            self.parse_cache.remove_many(self.STATE_CACHE_KIND, [filename])
         
-        if errors:
-            return False, f"Saved {saved_count} states with errors: {'; '.join(errors)}"
-        return True, f"Saved {saved_count} states successfully"
+        if old_id is not None:
+            old_state = self.states.pop(old_id)
+            for prov_id in old_state.get('provinces', []):
+                if self.province_to_state.get(prov_id) == old_id:
+                    del self.province_to_state[prov_id]
+                result['province_ids'].add(prov_id)
+            self._note_changes('province', old_state.get('provinces', []))
+            if state_data is None or state_data.get('id') != old_id:
+                result['states_removed'].append(old_id)
+                self._note_changes('delete', [old_id])
+        
+        if state_data and 'id' in state_data:
+            state_id = state_data['id']
+            self._note_changes('state' if state_id in self.states or state_id == old_id else 'create', [state_id])
+            self.states[state_id] = state_data
+            for prov_id in state_data.get('provinces', []):
+                self.province_to_state[prov_id] = state_id
+                result['province_ids'].add(prov_id)
+            self._note_changes('province', state_data.get('provinces', []))
+            result['states_updated'].append(state_id)
+    
+    def save_all_states(self):
+        """Save all modified states"""
+        if self.write_behind:
+            report = self.write_behind.flush_now()
+        else:
+            report = self.flush()
+        
+        summary = (f"Saved {report['files_written']} changed states "
+                   f"({report['bytes_written']:,} bytes, {report['files_deleted']} files removed)")
+        if report['errors']:
+            return False, f"{summary} with errors: {'; '.join(report['errors'])}"
+        return True, summary
     
     def get_state_info(self, state_id):
         """Get information about a specific state"""
         return self.states.get(state_id)
     
+    def get_state_summary(self, state_id):
+        """Get the frontend summary of one state"""
+        state_data = self.states[state_id]
+        return {
+            'id': state_id,
+            'name': state_data.get('name', 'Unknown'),
+            'owner': state_data.get('owner', 'None'),
+            'provinces': state_data.get('provinces', []),
+            'province_count': len(state_data.get('provinces', [])),
+            'manpower': state_data.get('manpower', 0),
+            'state_category': state_data.get('state_category', 'rural'),
+            'resources': state_data.get('resources', {}),
+            'cores': state_data.get('cores', []),
+            'claims': state_data.get('claims', []),
+            'buildings': state_data.get('buildings', {}),
+            'victory_points': state_data.get('victory_points', [])
+        }
+    
+    def get_province_columns(self):
+        """Get the province table as (columns, strings) for encode_payload
+        
+        One row per province sorted by ID: colour, type, coastal, terrain,
+        continent, owning state (0 = none) and, when the map is loaded,
+        bbox, area and label point. Repeated strings are dictionary coded.
+        """
+        ids = sorted(self.provinces)
+        rows = [self.provinces[province_id] for province_id in ids]
+        types, type_table = dictionary_encode([row['type'] for row in rows])
+        terrains, terrain_table = dictionary_encode([row['terrain'] for row in rows])
+        continents, continent_table = dictionary_encode([row['continent'] for row in rows])
+        
+        columns = {
+            'id': compact_ints(ids),
+            'color': np.asarray([(row['r'], row['g'], row['b']) for row in rows], dtype=np.uint8).reshape(-1, 3),
+            'type': types,
+            'coastal': np.asarray([row['coastal'] for row in rows], dtype=np.uint8),
+            'terrain': terrains,
+            'continent': continents,
+            'state': compact_ints([self.province_to_state.get(p, 0) for p in ids])
+        }
+        geometry = self.get_geometry()
+        if geometry is not None:
+            shapes = geometry.columns(ids)
+            columns['bbox'] = compact_ints(shapes['bbox'])
+            columns['area'] = compact_ints(shapes['area'])
+            columns['label_point'] = shapes['label_point']
+        
+        return columns, {'type': type_table, 'terrain': terrain_table, 'continent': continent_table}
+    
+    def get_state_columns(self, state_ids=None, display_names=None):
+        """Get state summaries as (columns, strings) for encode_payload
+        
+        Carries everything get_state_summary() does. Lists (provinces,
+        resources, cores, claims, victory points) are flattened with an
+        offsets column per list; `display_names` maps state name -> text.
+        """
+        ids = sorted(self.states) if state_ids is None else list(state_ids)
+        states = [self.states[state_id] for state_id in ids]
+        display_names = display_names or {}
+        
+        names, name_table = dictionary_encode([state.get('name', 'Unknown') for state in states])
+        display, display_table = dictionary_encode([display_names.get(state.get('name')) for state in states])
+        owners, owner_table = dictionary_encode([state.get('owner', 'None') for state in states])
+        categories, category_table = dictionary_encode([state.get('state_category', 'rural') for state in states])
+        
+        province_offsets, provinces = ragged([state.get('provinces', []) for state in states])
+        resources = [state.get('resources', {}) for state in states]
+        resource_offsets, resource_keys, resource_table = ragged_strings([list(r) for r in resources])
+        _, resource_amounts = ragged([list(r.values()) for r in resources], np.float64)
+        core_offsets, cores, core_table = ragged_strings([state.get('cores', []) for state in states])
+        claim_offsets, claims, claim_table = ragged_strings([state.get('claims', []) for state in states])
+        victory_points = [state.get('victory_points', []) for state in states]
+        vp_offsets, vp_provinces = ragged([[vp['province'] for vp in vps] for vps in victory_points])
+        _, vp_values = ragged([[vp['value'] for vp in vps] for vps in victory_points])
+        
+        building_table = sorted({key for state in states for key in state.get('buildings', {})})
+        buildings = compact_ints([[state.get('buildings', {}).get(key, 0) for key in building_table]
+                                  for state in states]).reshape(len(states), len(building_table))
+        
+        columns = {
+            'id': compact_ints(ids),
+            'name': names,
+            'display_name': display,
+            'owner': owners,
+            'state_category': categories,
+            'manpower': compact_ints([state.get('manpower', 0) for state in states]),
+            'province_offsets': province_offsets,
+            'provinces': provinces,
+            'resource_offsets': resource_offsets,
+            'resource_keys': resource_keys,
+            'resource_amounts': resource_amounts,
+            'core_offsets': core_offsets,
+            'cores': cores,
+            'claim_offsets': claim_offsets,
+            'claims': claims,
+            'vp_offsets': vp_offsets,
+            'vp_provinces': vp_provinces,
+            'vp_values': vp_values,
+            'buildings': buildings
+        }
+        strings = {
+            'name': name_table,
+            'display_name': display_table,
+            'owner': owner_table,
+            'state_category': category_table,
+            'resource_keys': resource_table,
+            'cores': core_table,
+            'claims': claim_table,
+            'buildings': building_table
+        }
+        return columns, strings
+    
     def get_all_states_summary(self):
         """Get summary of all states for frontend"""
-        summary = []
-        for state_id, state_data in self.states.items():
-            summary.append({
-                'id': state_id,
-                'name': state_data.get('name', 'Unknown'),
-                'owner': state_data.get('owner', 'None'),
-                'provinces': state_data.get('provinces', []),
-                'province_count': len(state_data.get('provinces', [])),
-                'manpower': state_data.get('manpower', 0),
-                'state_category': state_data.get('state_category', 'rural'),
-                'resources': state_data.get('resources', {}),
-                'cores': state_data.get('cores', []),
-                'claims': state_data.get('claims', []),
-                'buildings': state_data.get('buildings', {}),
-                'victory_points': state_data.get('victory_points', [])
-            })
-        return summary
+        return [self.get_state_summary(state_id) for state_id in self.states]
+
+
+def _to_int(value):
+    """Convert a script value to int, accepting values like "1000.000" """
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
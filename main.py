@@ -18,6 +18,7 @@ try:
     from app import create_app
     import webbrowser
     import threading
+    import multiprocessing
     import time
 except ImportError as e:
     print(f"Import error: {e}")
@@ -34,6 +35,9 @@ def open_browser():
 
 
 if __name__ == '__main__':
+    # Needed for process pools in the frozen exe
+    multiprocessing.freeze_support()
+    
     print("Starting Hitler Particle Accelerator...")
     
     if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
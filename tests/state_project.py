@@ -0,0 +1,52 @@
+"""Small state editor projects on disk for the tests"""
+import os
+import shutil
+import tempfile
+
+from editors.state_editor import StateEditor
+
+STATE_FILE = """state={{
+	id={state_id}
+	name="STATE_{state_id}"
+	history={{
+		owner = GER
+		buildings = {{
+			infrastructure = 2
+		}}
+	}}
+	provinces={{
+		{provinces}
+	}}
+	manpower = 1000
+	state_category = town
+}}
+"""
+
+
+def make_project(test, states):
+    """Write {state_id: [province, ...]} to a temp project removed after `test`"""
+    root = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, root)
+    states_dir = os.path.join(root, 'history', 'states')
+    os.makedirs(states_dir)
+    for state_id, provinces in states.items():
+        with open(os.path.join(states_dir, f'{state_id}-State.txt'), 'w', encoding='utf-8') as f:
+            f.write(STATE_FILE.format(state_id=state_id, provinces=' '.join(map(str, provinces))))
+    return root
+
+
+def load_editor(test, root):
+    editor = StateEditor(root)
+    success, message = editor.load_all_states(workers=1)
+    test.assertTrue(success, message)
+    return editor
+
+
+def read_state_files(root):
+    """Contents of every state file, by file name"""
+    states_dir = os.path.join(root, 'history', 'states')
+    contents = {}
+    for name in sorted(os.listdir(states_dir)):
+        with open(os.path.join(states_dir, name), 'rb') as f:
+            contents[name] = f.read()
+    return contents
@@ -0,0 +1,90 @@
+import unittest
+
+from state_project import load_editor, make_project, read_state_files
+
+
+class BatchTest(unittest.TestCase):
+    """apply_batch() applies every operation or none of them"""
+
+    def setUp(self):
+        self.root = make_project(self, {1: [1, 2], 2: [3, 4], 3: [5]})
+        self.editor = load_editor(self, self.root)
+        self.files = read_state_files(self.root)
+
+    def assertUnchanged(self, revision):
+        editor = self.editor
+        self.assertEqual(editor.revision, revision)
+        self.assertEqual(sorted(editor.states), [1, 2, 3])
+        self.assertEqual(editor.states[1]['provinces'], [1, 2])
+        self.assertEqual(editor.states[2]['owner'], 'GER')
+        self.assertEqual(editor.province_to_state, {1: 1, 2: 1, 3: 2, 4: 2, 5: 3})
+        self.assertFalse(editor.has_unsaved_changes())
+        self.assertFalse(editor.history.status()['can_undo'])
+        editor.flush()
+        self.assertEqual(read_state_files(self.root), self.files)
+
+    def test_invalid_operations_are_all_reported(self):
+        revision = self.editor.revision
+        success, result = self.editor.apply_batch([
+            {'op': 'paint_state'},
+            {'op': 'set_owner', 'owner': 'ENG'},
+            {'op': 'set_owner', 'state_id': 1, 'owner': 'england'},
+            {'op': 'move_provinces', 'state_id': '$3', 'province_ids': [1]},
+            {'op': 'move_provinces', 'state_id': 1, 'province_ids': []},
+            {'op': 'update_state', 'state_id': 1, 'properties': {'manpower': 'lots'}},
+        ])
+        self.assertFalse(success)
+        self.assertEqual([error.split(':')[0] for error in result['errors']],
+                         [f'Operation {index}' for index in range(6)])
+        self.assertUnchanged(revision)
+
+    def test_empty_batch_is_refused(self):
+        self.assertEqual(self.editor.apply_batch([]), (False, {'errors': ["Operations must be a non-empty list"]}))
+
+    def test_failing_operation_rolls_back_earlier_ones(self):
+        revision = self.editor.revision
+        success, result = self.editor.apply_batch([
+            {'op': 'move_provinces', 'state_id': 1, 'province_ids': [3, 5]},
+            {'op': 'set_owner', 'state_id': 2, 'owner': 'ENG'},
+            {'op': 'create_state', 'province_ids': [4], 'owner': 'ITA'},
+            {'op': 'delete_state', 'state_id': 3},
+            {'op': 'update_state', 'state_id': 99, 'properties': {'manpower': 5}},
+        ])
+        self.assertFalse(success)
+        self.assertIn('Operation 4', result['errors'][0])
+        self.assertUnchanged(revision)
+
+    def test_unwritable_state_rolls_back_the_batch(self):
+        revision = self.editor.revision
+        self.editor.states[2]['raw_content'] = 'no state block here'
+        success, _ = self.editor.apply_batch([
+            {'op': 'set_owner', 'state_id': 1, 'owner': 'ENG'},
+            {'op': 'set_owner', 'state_id': 2, 'owner': 'ENG'},
+        ])
+        self.assertFalse(success)
+        self.assertEqual(self.editor.states[1]['owner'], 'GER')
+        self.editor.states[2]['raw_content'] = self.files['2-State.txt'].decode('utf-8')
+        self.assertUnchanged(revision)
+
+    def test_batch_is_one_edit_and_can_refer_to_created_states(self):
+        success, result = self.editor.apply_batch([
+            {'op': 'create_state', 'province_ids': [1], 'owner': 'ITA', 'name': 'New'},
+            {'op': 'move_provinces', 'state_id': '$0', 'province_ids': [3, 5]},
+            {'op': 'delete_state', 'state_id': 3},
+        ])
+        self.assertTrue(success, result)
+        new_state = result['created'][0]
+        self.assertEqual(self.editor.states[new_state]['provinces'], [1, 3, 5])
+        self.assertEqual(result['removed_states'], [3])
+        self.assertEqual(result['province_ids'], [1, 3, 5])
+        self.assertEqual(self.editor.history.status()['undo_depth'], 1)
+
+        self.editor.flush()
+        editor = load_editor(self, self.root)
+        self.assertEqual(editor.states[new_state]['owner'], 'ITA')
+        self.assertEqual(editor.states[new_state]['provinces'], [1, 3, 5])
+        self.assertNotIn(3, editor.states)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import unittest
+from collections import deque
+from unittest import mock
+
+from app import create_app, routes
+from state_project import load_editor, make_project
+
+
+class ChangeFeedTest(unittest.TestCase):
+    """changes_since() must report exactly the edits that were made"""
+
+    def setUp(self):
+        self.root = make_project(self, {1: [1, 2], 2: [3], 3: [4]})
+        self.editor = load_editor(self, self.root)
+
+    def assertNoChanges(self, revision):
+        changes = self.editor.changes_since(revision)
+        self.assertFalse(changes['full'])
+        self.assertEqual((changes['created'], changes['updated'], changes['deleted'], changes['moves']),
+                         ([], [], [], {}))
+
+    def test_reports_where_things_ended_up(self):
+        revision = self.editor.revision
+        self.editor.add_province_to_state(2, 1)
+        self.editor.add_province_to_state(3, 1)
+        new_state = self.editor.create_new_state(province_id=2, owner_tag='ENG')
+        self.editor.delete_state(1)
+
+        changes = self.editor.changes_since(revision)
+        self.assertEqual(changes['revision'], self.editor.revision)
+        self.assertEqual((changes['created'], changes['updated'], changes['deleted']), ([new_state], [2, 3], [1]))
+        self.assertEqual(changes['moves'], {1: 3, 2: new_state})
+        self.assertNoChanges(self.editor.revision)
+
+    def test_failed_batch_leaves_no_changes(self):
+        revision = self.editor.revision
+        success, result = self.editor.apply_batch([
+            {'op': 'move_provinces', 'state_id': 1, 'province_ids': [3]},
+            {'op': 'delete_state', 'state_id': 2},
+            {'op': 'set_owner', 'state_id': 99, 'owner': 'ENG'},
+        ])
+        self.assertFalse(success)
+        self.assertEqual(self.editor.revision, revision)
+        self.assertNoChanges(revision)
+
+        # The next edit publishes only itself
+        success, message = self.editor.set_state_owner(3, 'ENG')
+        self.assertTrue(success, message)
+        changes = self.editor.changes_since(revision)
+        self.assertEqual((changes['updated'], changes['deleted'], changes['moves']), ([3], [], {}))
+
+    def test_refused_write_leaves_no_changes(self):
+        revision = self.editor.revision
+        self.editor.states[2]['raw_content'] = 'no state block here'
+        success, message = self.editor.add_province_to_state(2, 1)
+        self.assertFalse(success)
+        self.assertEqual(self.editor.province_to_state[1], 1)
+        self.assertNoChanges(revision)
+
+    def test_truncated_log_asks_for_a_full_reload(self):
+        # Room for all but the first edit's entry
+        self.editor.change_log = deque(maxlen=5)
+        revision = self.editor.revision
+        self.editor.set_state_owner(1, 'ENG')
+        recent = self.editor.revision
+        for state_id in (2, 3):
+            self.editor.set_state_owner(state_id, 'ENG')
+        self.editor.add_province_to_state(3, 1)
+
+        self.assertTrue(self.editor.changes_since(revision)['full'])
+        changes = self.editor.changes_since(recent)
+        self.assertFalse(changes['full'])
+        self.assertEqual((changes['updated'], changes['moves']), ([1, 2, 3], {1: 3}))
+
+    def test_failed_batch_keeps_the_log_floor_when_the_log_is_full(self):
+        self.editor.change_log = deque(maxlen=4)
+        self.editor.set_state_owner(1, 'ENG')
+        self.editor.set_state_owner(2, 'ENG')
+        revision = self.editor.revision
+
+        # Fills the log past its limit before failing
+        success, _ = self.editor.apply_batch([
+            {'op': 'move_provinces', 'state_id': 3, 'province_ids': [1, 2, 3]},
+            {'op': 'set_owner', 'state_id': 99, 'owner': 'ENG'},
+        ])
+        self.assertFalse(success)
+        self.assertNoChanges(revision)
+        self.assertTrue(self.editor.changes_since(0)['full'])
+
+    def test_other_sessions_and_reloads_ask_for_a_full_reload(self):
+        revision = self.editor.revision
+        self.assertTrue(self.editor.changes_since(revision, session='other')['full'])
+        self.assertTrue(self.editor.changes_since(self.editor.revision + 1)['full'])
+
+        self.editor.set_state_owner(1, 'ENG')
+        self.editor.flush()
+        self.editor.load_all_states(workers=1)
+        self.assertTrue(self.editor.changes_since(revision)['full'])
+        self.assertNoChanges(self.editor.revision)
+
+    def test_changes_route(self):
+        client = create_app().test_client()
+        with mock.patch.object(routes, 'state_editor', self.editor):
+            revision = self.editor.revision
+            self.editor.add_province_to_state(2, 1)
+            self.editor.delete_state(3)
+
+            data = client.get(f'/api/state_editor/changes?since={revision}').get_json()
+            self.assertTrue(data['success'])
+            self.assertFalse(data['full'])
+            self.assertEqual([state['id'] for state in data['updated']], [1, 2])
+            self.assertEqual(data['deleted'], [3])
+            self.assertEqual(data['moves'], [[1, 2], [4, None]])
+
+            data = client.get(f'/api/state_editor/changes?since={revision}&session=other').get_json()
+            self.assertTrue(data['full'])
+            self.assertFalse(client.get('/api/state_editor/changes').get_json()['success'])
+
+
+if __name__ == '__main__':
+    unittest.main()
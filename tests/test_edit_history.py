@@ -0,0 +1,76 @@
+import os
+import unittest
+
+from state_project import load_editor, make_project, read_state_files
+
+
+class EditHistoryTest(unittest.TestCase):
+    """Undo puts state files back byte for byte; redo replays the edits"""
+
+    def setUp(self):
+        self.root = make_project(self, {1: [1, 2], 2: [3, 4], 3: [5]})
+        self.editor = load_editor(self, self.root)
+        self.files = read_state_files(self.root)
+
+    def edit(self):
+        editor = self.editor
+        self.assertTrue(editor.set_state_owner(1, 'ENG')[0])
+        self.assertTrue(editor.add_province_to_state(2, 1)[0])
+        success, result = editor.apply_batch([
+            {'op': 'create_state', 'province_ids': [3], 'owner': 'ITA', 'name': 'New'},
+            {'op': 'move_provinces', 'state_id': '$0', 'province_ids': [5]},
+            {'op': 'delete_state', 'state_id': 3},
+            {'op': 'update_state', 'state_id': 2, 'properties': {'manpower': 2500}},
+        ])
+        self.assertTrue(success, result)
+        editor.flush()
+        return result['created'][0]
+
+    def test_undo_restores_files_exactly(self):
+        self.edit()
+        for _ in range(3):
+            success, result = self.editor.undo()
+            self.assertTrue(success, result)
+        self.assertFalse(self.editor.undo()[0])
+
+        self.editor.flush()
+        self.assertEqual(read_state_files(self.root), self.files)
+        self.assertEqual(self.editor.province_to_state, {1: 1, 2: 1, 3: 2, 4: 2, 5: 3})
+
+    def test_redo_replays_the_edits(self):
+        new_state = self.edit()
+        edited = read_state_files(self.root)
+        for _ in range(3):
+            self.editor.undo()
+        for _ in range(3):
+            success, result = self.editor.redo()
+            self.assertTrue(success, result)
+        self.assertFalse(self.editor.redo()[0])
+
+        self.editor.flush()
+        self.assertEqual(read_state_files(self.root), edited)
+        self.assertEqual(self.editor.states[new_state]['provinces'], [3, 5])
+        self.assertNotIn(3, self.editor.states)
+
+    def test_undo_of_a_batch_reports_what_it_touched(self):
+        new_state = self.edit()
+        success, result = self.editor.undo()
+        self.assertTrue(success, result)
+        self.assertEqual(result['label'], 'Batch of 4 edits')
+        self.assertEqual(result['removed_states'], [new_state])
+        self.assertEqual(result['states'], [2, 3])
+        self.assertEqual(result['province_ids'], [1, 3, 4, 5])
+
+        self.editor.flush()
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'history', 'states', f'{new_state}-State.txt')))
+
+    def test_new_edit_clears_redo(self):
+        self.edit()
+        self.editor.undo()
+        self.assertTrue(self.editor.history.status()['can_redo'])
+        self.editor.set_state_owner(2, 'FRA')
+        self.assertFalse(self.editor.redo()[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+
+from editors.state_editor import StateEditor
+from utils.file_parser import ScriptParseError, parse_script
+
+SCRIPT = """# comment with { braces } and "quotes"
+state = {
+	id = 7
+	name = "Some \\"quoted\\" name" # trailing
+	history = {
+		1939.1.1 = { owner = ENG add_core_of = ENG }
+		owner = GER
+		buildings = { infrastructure = 3 11506 = { naval_base = 2 } }
+	}
+	provinces = { 11506 11507 }
+	color = rgb { 10 20 30 }
+}
+"""
+
+
+class ParseScriptTest(unittest.TestCase):
+    def test_spans_match_the_source(self):
+        document = parse_script(SCRIPT, strict=True)
+        state = document.find('state')
+        self.assertEqual(SCRIPT[state.start:state.end], SCRIPT[SCRIPT.index('state'):SCRIPT.rindex('}') + 1])
+
+        name = state.find('name')
+        self.assertEqual(SCRIPT[name.start:name.end], 'name = "Some \\"quoted\\" name"')
+        self.assertEqual(SCRIPT[name.value_start:name.value_end], '"Some \\"quoted\\" name"')
+
+        provinces = state.find('provinces')
+        self.assertEqual(SCRIPT[provinces.value_start:provinces.value_end], '{ 11506 11507 }')
+        self.assertEqual([SCRIPT[node.start:node.end] for node in provinces], ['11506', '11507'])
+
+        naval_base = state.find('history').find('buildings').find('11506').find('naval_base')
+        self.assertEqual(SCRIPT[naval_base.value_start:naval_base.value_end], '2')
+
+    def test_comments_and_tagged_blocks(self):
+        state = parse_script(SCRIPT, strict=True).find('state')
+        self.assertEqual(state.get('id'), '7')
+        color = state.find('color')
+        self.assertEqual((color.tag, color.values()), ('rgb', ['10', '20', '30']))
+
+    def test_dated_blocks_do_not_shadow_base_keys(self):
+        history = parse_script(SCRIPT, strict=True).find('state').find('history')
+        self.assertEqual(history.get('owner'), 'GER')
+        self.assertEqual(history.find('1939.1.1').get('owner'), 'ENG')
+
+        fields = StateEditor.read_state_fields(parse_script(SCRIPT).find('state'))
+        self.assertEqual((fields['owner'], fields['cores']), ('GER', []))
+        self.assertEqual(fields['buildings']['naval_base'], 2)
+
+    def test_operators(self):
+        document = parse_script('a < 5 b>=2 c != d e == "f" g?=h limit = { x > 1 }', strict=True)
+        self.assertEqual([(node.key, node.op, node.value) for node in list(document)[:5]],
+                         [('a', '<', '5'), ('b', '>=', '2'), ('c', '!=', 'd'), ('e', '==', 'f'), ('g', '?=', 'h')])
+        self.assertEqual(document.find('limit').find('x').op, '>')
+
+    def test_quoted_keys_and_escaped_quotes(self):
+        document = parse_script('"quoted key" = yes\nname = "say \\"hi\\" there"', strict=True)
+        key = document.find('quoted key')
+        self.assertEqual(key.value, 'yes')
+        name = document.find('name')
+        self.assertTrue(name.quoted)
+        self.assertEqual(name.value, 'say \\"hi\\" there')
+
+    def test_unclosed_string_recovers_at_end_of_line(self):
+        text = 'name = "unclosed\nowner = GER\n'
+        document = parse_script(text)
+        self.assertEqual(document.get('name'), 'unclosed')
+        self.assertEqual(document.get('owner'), 'GER')
+        self.assertEqual(document.errors, [(7, "Unclosed string")])
+        with self.assertRaises(ScriptParseError):
+            parse_script(text, strict=True)
+
+    def test_unbalanced_braces_recover(self):
+        text = 'a = { b = 1 }\n}\nc = { d = 2\n'
+        document = parse_script(text)
+        self.assertEqual(document.find('a').get('b'), '1')
+        c = document.find('c')
+        self.assertEqual((c.get('d'), c.end), ('2', len(text)))
+        self.assertEqual([message for _, message in document.errors], ["Unmatched '}'", "Unclosed block 'c'"])
+        with self.assertRaises(ScriptParseError):
+            parse_script(text, strict=True)
+        with self.assertRaises(ScriptParseError):
+            parse_script('c = { d = 2', strict=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
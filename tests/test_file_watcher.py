@@ -0,0 +1,52 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from utils.file_watcher import FileWatcher
+
+
+class FileWatcherTest(unittest.TestCase):
+    """Changes are reported, including in folders created after the watch started"""
+
+    def watch(self, use_inotify):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        changes = []
+        changed = threading.Event()
+
+        def callback(change):
+            changes.append(change)
+            changed.set()
+
+        watcher = FileWatcher(root, callback, poll_interval=0.05, debounce=0.05, use_inotify=use_inotify).start()
+        self.addCleanup(watcher.stop)
+        return root, changes, changed
+
+    def assertReportsNewFolder(self, use_inotify):
+        root, changes, changed = self.watch(use_inotify)
+        states_dir = os.path.join(root, 'history', 'states')
+        os.makedirs(states_dir)
+        with open(os.path.join(states_dir, '1-State.txt'), 'w', encoding='utf-8') as f:
+            f.write('state = { id = 1 }')
+        # Files outside the watched folders are ignored
+        with open(os.path.join(root, 'notes.txt'), 'w', encoding='utf-8') as f:
+            f.write('ignored')
+
+        self.assertTrue(changed.wait(5))
+        while changed.wait(0.3):
+            changed.clear()
+        added = [path for change in changes for path in change['added']]
+        self.assertEqual(added, ['history/states/1-State.txt'])
+
+    @unittest.skipUnless(os.path.exists('/proc/sys/fs/inotify'), "needs inotify")
+    def test_folder_created_after_start_inotify(self):
+        self.assertReportsNewFolder(use_inotify=True)
+
+    def test_folder_created_after_start_polling(self):
+        self.assertReportsNewFolder(use_inotify=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
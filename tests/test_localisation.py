@@ -0,0 +1,77 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from utils.localisation import LocalisationIndex, iter_localisation
+
+
+class LocalisationParseTest(unittest.TestCase):
+    def values(self, *entries):
+        lines = ['l_english:\n'] + [entry + '\n' for entry in entries]
+        return {key: value for _, key, _, value, _ in iter_localisation(lines)}
+
+    def test_comment_with_quotes_is_not_part_of_the_value(self):
+        self.assertEqual(self.values(' K3:0 "a" # "quoted" comment'), {'K3': 'a'})
+
+    def test_escaped_quotes(self):
+        self.assertEqual(self.values(' K4:0 "He said \\"hi\\"" # note'), {'K4': 'He said "hi"'})
+
+    def test_unescaped_inner_quotes(self):
+        self.assertEqual(self.values(' K5:0 "bare "inner" quotes"'), {'K5': 'bare "inner" quotes'})
+
+
+class LocalisationIndexTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = tmp.name
+        os.makedirs(os.path.join(self.root, 'localisation', 'english'))
+
+    def write(self, name, *entries):
+        path = os.path.join(self.root, 'localisation', 'english', name)
+        with open(path, 'w', encoding='utf-8-sig') as f:
+            f.write('l_english:\n' + ''.join(entry + '\n' for entry in entries))
+
+    def test_lookups_see_the_old_index_until_a_reload_finishes(self):
+        self.write('a_l_english.yml', ' KEY:0 "old"')
+        index = LocalisationIndex(self.root)
+        index.load()
+        self.write('a_l_english.yml', ' KEY:0 "new"', ' OTHER:0 "other"')
+
+        scanning, release = threading.Event(), threading.Event()
+        scan = index._scan
+
+        def slow_scan():
+            paths = scan()
+            scanning.set()
+            release.wait(5)
+            return paths
+
+        with mock.patch.object(index, '_scan', slow_scan):
+            loader = threading.Thread(target=index.load)
+            loader.start()
+            self.assertTrue(scanning.wait(5))
+            self.assertEqual(index.lookup(['KEY', 'OTHER']), {'KEY': 'old'})
+            release.set()
+            loader.join(5)
+
+        self.assertEqual(index.lookup(['KEY', 'OTHER']), {'KEY': 'new', 'OTHER': 'other'})
+        self.assertEqual(index.language_counts(), {'english': 2})
+
+    def test_reload_file_swaps_a_single_file(self):
+        self.write('a_l_english.yml', ' KEY:0 "a"')
+        self.write('b_l_english.yml', ' KEY:0 "b"')
+        index = LocalisationIndex(self.root)
+        index.load()
+        self.assertEqual(len(index.duplicates()['KEY']), 2)
+
+        os.remove(os.path.join(self.root, 'localisation', 'english', 'a_l_english.yml'))
+        index.reload_file('localisation/english/a_l_english.yml')
+        self.assertEqual(index.get('KEY'), 'b')
+        self.assertEqual(index.duplicates(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
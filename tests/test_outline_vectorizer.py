@@ -0,0 +1,58 @@
+import unittest
+from collections import Counter
+
+import numpy as np
+
+from utils.outline_vectorizer import trace_province
+
+
+class OutlineVectorizerTest(unittest.TestCase):
+    """Simplified outlines of neighbouring provinces share their borders exactly"""
+
+    def trace_all(self, labels, tolerance):
+        outlines = {}
+        for province_id in np.unique(labels).tolist():
+            ys, xs = np.nonzero(labels == province_id)
+            bbox = (xs.min(), ys.min(), xs.max() + 1, ys.max() + 1)
+            outlines[province_id] = trace_province(labels, province_id, bbox, tolerance)
+        return outlines
+
+    def segments(self, outlines):
+        segments = Counter()
+        for rings in outlines.values():
+            for ring in rings:
+                points = list(zip(ring[::2], ring[1::2]))
+                segments.update(zip(points, points[1:] + points[:1]))
+        return segments
+
+    def test_neighbours_share_simplified_borders(self):
+        rng = np.random.default_rng(0)
+        height, width = 90, 120
+        seeds = rng.integers(0, [width, height], size=(25, 2))
+        ys, xs = np.mgrid[0:height, 0:width]
+        distance = (xs[..., None] - seeds[:, 0]) ** 2 + (ys[..., None] - seeds[:, 1]) ** 2 + rng.random((height, width, 25)) * 40
+        labels = (np.argmin(distance, axis=2) + 1).astype(np.uint16)
+        # A single pixel and an enclosed province with a hole
+        labels[40, 60] = 26
+        labels[10:14, 10:13] = 27
+        labels[11, 11] = 28
+
+        segments = self.segments(self.trace_all(labels, tolerance=1.5))
+        for (a, b), count in segments.items():
+            self.assertEqual(count, 1, (a, b))
+            on_map_edge = (a[0] == b[0] in (0, width)) or (a[1] == b[1] in (0, height))
+            if not on_map_edge:
+                # Walked the other way by the province across the border
+                self.assertEqual(segments[(b, a)], 1, (a, b))
+
+    def test_single_pixel_province_keeps_its_area(self):
+        labels = np.ones((5, 5), dtype=np.uint16)
+        labels[2, 2] = 2
+        outlines = self.trace_all(labels, tolerance=2.0)
+        self.assertEqual(outlines[2], [[2, 2, 3, 2, 3, 3, 2, 3]])
+        hole = self.segments({1: outlines[1][1:]})
+        self.assertEqual(set(hole), {(b, a) for a, b in self.segments({2: outlines[2]})})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import stat
+import unittest
+
+from editors.state_editor import _NEW_FILE_MODE
+from state_project import load_editor, make_project
+
+
+class StateFlushTest(unittest.TestCase):
+    """flush() writes only edited states, atomically and keeping file modes"""
+
+    def setUp(self):
+        self.root = make_project(self, {1: [1, 2], 2: [3], 3: [4]})
+        self.states_dir = os.path.join(self.root, 'history', 'states')
+        self.editor = load_editor(self, self.root)
+
+    def path(self, state_id):
+        return os.path.join(self.states_dir, f'{state_id}-State.txt')
+
+    def test_only_dirty_states_are_written(self):
+        # Old enough that a rewrite would show up in the mtime
+        for state_id in (1, 2, 3):
+            os.utime(self.path(state_id), ns=(10 ** 18, 10 ** 18))
+        self.editor.set_state_owner(2, 'ENG')
+
+        report = self.editor.flush()
+        self.assertEqual((report['files_written'], report['files_deleted'], report['errors']), (1, 0, []))
+        self.assertEqual([os.stat(self.path(state_id)).st_mtime_ns == 10 ** 18 for state_id in (1, 2, 3)],
+                         [True, False, True])
+        self.assertFalse(self.editor.has_unsaved_changes())
+        self.assertEqual(self.editor.flush()['files_written'], 0)
+
+    def test_deleted_state_file_is_removed(self):
+        self.editor.delete_state(3)
+        self.assertTrue(os.path.exists(self.path(3)))
+        self.assertEqual(self.editor.flush()['files_deleted'], 1)
+        self.assertFalse(os.path.exists(self.path(3)))
+
+    def test_write_keeps_the_file_mode(self):
+        os.chmod(self.path(1), 0o640)
+        self.editor.set_state_owner(1, 'ENG')
+        self.editor.flush()
+        self.assertEqual(stat.S_IMODE(os.stat(self.path(1)).st_mode), 0o640)
+
+    def test_new_file_gets_the_usual_mode(self):
+        state_id = self.editor.create_new_state(province_id=4, owner_tag='ENG')
+        self.editor.flush()
+        path = os.path.join(self.states_dir, self.editor.states[state_id]['file'])
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), _NEW_FILE_MODE)
+
+    def test_failed_write_leaves_the_old_file_and_no_temp_file(self):
+        self.editor.set_state_owner(1, 'ENG')
+        with open(self.path(1), 'rb') as f:
+            before = f.read()
+        os.replace(self.path(1), self.path(1) + '.bak')
+        os.mkdir(self.path(1))
+        try:
+            report = self.editor.flush()
+        finally:
+            os.rmdir(self.path(1))
+            os.replace(self.path(1) + '.bak', self.path(1))
+
+        self.assertEqual(len(report['errors']), 1)
+        self.assertEqual(self.editor.dirty_states, {1})
+        with open(self.path(1), 'rb') as f:
+            self.assertEqual(f.read(), before)
+        self.assertEqual([name for name in os.listdir(self.states_dir) if name.endswith('.tmp')], [])
+
+        # Still dirty, so the next flush writes it
+        self.assertEqual(self.editor.flush()['files_written'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from editors.state_editor import StateEditor
+from utils.file_parser import parse_script
+
+STATE_FILE = """# Hand-written state
+state={
+	id=1
+	name="STATE_1" # keep this comment
+	manpower = 500
+
+	history={
+		owner = GER
+		buildings = {
+			infrastructure = 3
+			11506 = { naval_base = 3 }
+		}
+		1939.1.1 = { owner = GER }
+	}
+
+	provinces={
+		11506 11507
+	}
+	state_category = town
+}
+"""
+
+
+class StateWriterTest(unittest.TestCase):
+    """Edited states must read back exactly as edited, without losing file content"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        states_dir = os.path.join(self.root, 'history', 'states')
+        os.makedirs(states_dir)
+        with open(os.path.join(states_dir, '1-State.txt'), 'w', encoding='utf-8') as f:
+            f.write(STATE_FILE)
+        self.editor = StateEditor(self.root)
+        success, message = self.editor.load_all_states(workers=1)
+        self.assertTrue(success, message)
+
+    def reload(self, state_id):
+        """Flush, then read a state back from disk with a fresh editor"""
+        self.editor.flush()
+        editor = StateEditor(self.root)
+        editor.load_all_states(workers=1)
+        return editor.states[state_id]
+
+    def assertKeepsFileContent(self, text):
+        self.assertIn('# keep this comment', text)
+        self.assertIn('1939.1.1 = { owner = GER }', text)
+
+    def test_quoted_name_is_patched_into_existing_file(self):
+        name = 'My "quoted" state \\ with a backslash'
+        success, message = self.editor.update_state_properties(1, {'name': name})
+        self.assertTrue(success, message)
+
+        state = self.reload(1)
+        self.assertEqual(state['name'], name)
+        self.assertKeepsFileContent(state['raw_content'])
+        self.assertEqual(parse_script(state['raw_content']).errors, [])
+
+    def test_quoted_name_in_new_state_template(self):
+        name = 'New "quoted" state'
+        state_id = self.editor.create_new_state(owner_tag='ENG', name=name)
+
+        state = self.reload(state_id)
+        self.assertEqual(state['name'], name)
+        self.assertEqual(parse_script(state['raw_content'], strict=True).find('state').get('id'), str(state_id))
+
+    def test_province_level_naval_base_is_removed(self):
+        buildings = dict(self.editor.states[1]['buildings'], naval_base=0)
+        success, message = self.editor.update_state_properties(1, {'buildings': buildings})
+        self.assertTrue(success, message)
+
+        state = self.reload(1)
+        self.assertEqual(state['buildings']['naval_base'], 0)
+        self.assertEqual(state['buildings']['infrastructure'], 3)
+        self.assertNotIn('11506 = {', state['raw_content'])
+        self.assertKeepsFileContent(state['raw_content'])
+
+    def test_undone_naval_base_goes_back_into_a_province_block(self):
+        buildings = dict(self.editor.states[1]['buildings'], naval_base=0)
+        self.editor.update_state_properties(1, {'buildings': buildings})
+        success, message = self.editor.undo()
+        self.assertTrue(success, message)
+
+        state = self.reload(1)
+        self.assertEqual(state['buildings']['naval_base'], 3)
+        self.assertIn('11506 = { naval_base = 3 }', state['raw_content'])
+        history = parse_script(state['raw_content']).find('state').find('history')
+        self.assertIsNone(history.find('buildings').find('naval_base'))
+
+    def test_naval_base_in_new_state_template(self):
+        state_id = self.editor.create_new_state(province_id=11507, owner_tag='ENG')
+        buildings = dict(self.editor.states[state_id]['buildings'], naval_base=2)
+        success, message = self.editor.update_state_properties(state_id, {'buildings': buildings})
+        self.assertTrue(success, message)
+
+        state = self.reload(state_id)
+        self.assertEqual(state['buildings']['naval_base'], 2)
+        self.assertIn('11507 = { naval_base = 2 }', state['raw_content'])
+
+    def test_naval_base_without_provinces_is_refused(self):
+        success, message = self.editor.remove_province_from_state(1, 11506)
+        self.assertTrue(success, message)
+        success, message = self.editor.remove_province_from_state(1, 11507)
+        self.assertTrue(success, message)
+        buildings = dict(self.editor.states[1]['buildings'], naval_base=0)
+        success, message = self.editor.update_state_properties(1, {'buildings': buildings})
+        self.assertTrue(success, message)
+
+        success, message = self.editor.update_state_properties(1, {'buildings': dict(buildings, naval_base=4)})
+        self.assertFalse(success)
+        self.assertEqual(self.editor.states[1]['buildings'], buildings)
+
+    def test_province_level_naval_base_is_changed(self):
+        buildings = dict(self.editor.states[1]['buildings'], naval_base=5)
+        success, message = self.editor.update_state_properties(1, {'buildings': buildings})
+        self.assertTrue(success, message)
+
+        state = self.reload(1)
+        self.assertEqual(state['buildings']['naval_base'], 5)
+        self.assertIn('11506 = { naval_base = 5 }', state['raw_content'])
+        self.assertKeepsFileContent(state['raw_content'])
+
+    def test_undo_removes_a_field_the_state_did_not_have(self):
+        raw = self.editor.states[1]['raw_content']
+        self.editor.states[1]['raw_content'] = raw.replace('\t\towner = GER\n', '', 1)
+        del self.editor.states[1]['owner']
+
+        success, message = self.editor.set_state_owner(1, 'ENG')
+        self.assertTrue(success, message)
+        success, message = self.editor.undo()
+        self.assertTrue(success, message)
+
+        self.assertNotIn('owner', self.editor.states[1])
+        state = self.reload(1)
+        self.assertNotIn('owner', state)
+        self.assertNotIn('ENG', state['raw_content'])
+        self.assertKeepsFileContent(state['raw_content'])
+
+    def test_unwritable_edit_is_refused_and_reverted(self):
+        self.editor.states[1]['raw_content'] = 'no state block here'
+        success, message = self.editor.set_state_owner(1, 'ENG')
+        self.assertFalse(success)
+        self.assertEqual(self.editor.states[1]['owner'], 'GER')
+        self.assertEqual(self.editor.states[1]['raw_content'], 'no state block here')
+        self.assertFalse(self.editor.has_unsaved_changes())
+
+
+if __name__ == '__main__':
+    unittest.main()
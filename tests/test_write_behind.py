@@ -0,0 +1,62 @@
+import os
+import unittest
+
+from state_project import load_editor, make_project, read_state_files
+
+
+class WriteBehindTest(unittest.TestCase):
+    """Edits journaled in write-behind mode survive a crash before the flush"""
+
+    def setUp(self):
+        self.root = make_project(self, {1: [1, 2], 2: [3], 3: [4]})
+        self.editor = load_editor(self, self.root)
+        self.files = read_state_files(self.root)
+        # Long enough that the background thread never flushes on its own
+        self.editor.enable_write_behind(interval=3600)
+
+    def crash(self):
+        """Stop the editor the way a killed process would, without flushing"""
+        self.editor.write_behind.stop(flush=False)
+        self.editor.journal.close()
+
+    def test_edits_are_deferred(self):
+        self.editor.set_state_owner(1, 'ENG')
+        report = self.editor.commit()
+        self.assertEqual((report['deferred'], report['pending_states']), (True, 1))
+        self.assertEqual(read_state_files(self.root), self.files)
+        self.assertTrue(os.path.exists(self.editor.journal.path))
+        self.crash()
+
+    def test_journal_is_replayed_after_a_crash(self):
+        self.editor.set_state_owner(1, 'ENG')
+        self.editor.set_state_owner(1, 'FRA')
+        self.editor.add_province_to_state(2, 4)
+        self.editor.delete_state(3)
+        self.crash()
+        self.assertEqual(read_state_files(self.root), self.files)
+
+        editor = load_editor(self, self.root)
+        self.assertEqual(editor.states[1]['owner'], 'FRA')
+        self.assertEqual(editor.states[2]['provinces'], [3, 4])
+        self.assertNotIn(3, editor.states)
+        self.assertFalse(os.path.exists(editor.journal.path))
+
+    def test_torn_last_record_is_ignored(self):
+        self.editor.set_state_owner(1, 'ENG')
+        self.crash()
+        with open(self.editor.journal.path, 'a', encoding='utf-8') as f:
+            f.write('{"op":"write","file":"2-State.txt","cont')
+
+        editor = load_editor(self, self.root)
+        self.assertEqual(editor.states[1]['owner'], 'ENG')
+        self.assertEqual(read_state_files(self.root)['2-State.txt'], self.files['2-State.txt'])
+
+    def test_flush_clears_the_journal(self):
+        self.editor.set_state_owner(1, 'ENG')
+        report = self.editor.disable_write_behind()
+        self.assertEqual(report['files_written'], 1)
+        self.assertFalse(os.path.exists(self.editor.journal.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import json
+import struct
+import numpy as np
+
+MAGIC = b'HPAB'
+VERSION = 1
+MIMETYPE = 'application/octet-stream'
+
+# Column types the client can view directly as JS typed arrays
+_DTYPES = {
+    'u1': 'uint8', 'u2': 'uint16', 'u4': 'uint32',
+    'i1': 'int8', 'i2': 'int16', 'i4': 'int32',
+    'f4': 'float32', 'f8': 'float64'
+}
+_ALIGN = 8
+
+
+def encode_payload(columns, strings=None, meta=None):
+    """Pack numpy columns into one binary payload.
+
+    Layout: b'HPAB', a little-endian uint32 header length, a JSON header
+    padded to 8 bytes, then every column as raw little-endian data, each
+    8-byte aligned so the client can view it as a typed array without
+    copying. The header has the version, `meta` (any JSON), `strings`
+    (name -> list of strings that dictionary-coded columns index into)
+    and, per column, its dtype, byte offset, length and width (values per
+    row, for 2D columns).
+    """
+    header = {'version': VERSION, 'meta': meta or {}, 'strings': strings or {}, 'columns': {}}
+    blobs = []
+    offset = 0
+    for name, values in columns.items():
+        values = np.asarray(values)
+        dtype = values.dtype.newbyteorder('<') if values.dtype.byteorder == '>' else values.dtype
+        kind = f"{dtype.kind}{dtype.itemsize}"
+        if kind not in _DTYPES:
+            raise ValueError(f"Column {name} has unsupported dtype {values.dtype}")
+        data = np.ascontiguousarray(values, dtype=dtype.newbyteorder('<')).tobytes()
+        header['columns'][name] = {
+            'dtype': _DTYPES[kind],
+            'offset': offset,
+            'length': int(values.shape[0]) if values.ndim else 1,
+            'width': int(np.prod(values.shape[1:])) if values.ndim > 1 else 1
+        }
+        blobs.append(data)
+        padding = -len(data) % _ALIGN
+        if padding:
+            blobs.append(b'\0' * padding)
+        offset += len(data) + padding
+
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    header_bytes += b' ' * (-(len(header_bytes) + 8) % _ALIGN)
+    return b''.join([MAGIC, struct.pack('<I', len(header_bytes)), header_bytes] + blobs)
+
+
+def decode_payload(payload):
+    """Read a payload back into (meta, strings, {name: numpy array})"""
+    if payload[:4] != MAGIC:
+        raise ValueError("Not a binary payload")
+    header_length, = struct.unpack_from('<I', payload, 4)
+    header = json.loads(payload[8:8 + header_length])
+    data_start = 8 + header_length
+    columns = {}
+    for name, column in header['columns'].items():
+        dtype = np.dtype(column['dtype']).newbyteorder('<')
+        count = column['length'] * column['width']
+        values = np.frombuffer(payload, dtype=dtype, count=count, offset=data_start + column['offset'])
+        columns[name] = values.reshape(column['length'], column['width']) if column['width'] != 1 else values
+    return header['meta'], header['strings'], columns
+
+
+def dictionary_encode(values):
+    """Code repeated strings as small integers: (codes, table).
+
+    The code width is picked from the table size; None is kept as a
+    table entry like any other value.
+    """
+    table = []
+    index = {}
+    codes = []
+    for value in values:
+        code = index.get(value)
+        if code is None:
+            code = index[value] = len(table)
+            table.append(value)
+        codes.append(code)
+    dtype = np.uint8 if len(table) <= 0xFF else np.uint16 if len(table) <= 0xFFFF else np.uint32
+    return np.asarray(codes, dtype=dtype), table
+
+
+def compact_ints(values):
+    """Integers in the narrowest dtype that holds them all"""
+    values = np.asarray(values, dtype=np.int64)
+    if values.size == 0:
+        return values.astype(np.uint8)
+    low, high = int(values.min()), int(values.max())
+    for dtype in ((np.uint8, np.uint16, np.uint32) if low >= 0 else (np.int8, np.int16, np.int32)):
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return values.astype(dtype)
+    raise ValueError("Values don't fit in 32 bits")
+
+
+def ragged(lists, dtype=None):
+    """Flatten a list of lists to (offsets, values), CSR style.
+
+    Row i is values[offsets[i]:offsets[i + 1]]. Without a dtype the values
+    are integers, stored as narrow as they allow.
+    """
+    flat = [value for values in lists for value in values]
+    return _offsets(lists), compact_ints(flat) if dtype is None else np.asarray(flat, dtype=dtype)
+
+
+def ragged_strings(lists):
+    """Like ragged(), with the strings dictionary coded: (offsets, codes, table)"""
+    codes, table = dictionary_encode([value for values in lists for value in values])
+    return _offsets(lists), codes, table
+
+
+def _offsets(lists):
+    offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(values) for values in lists])
+    return compact_ints(offsets)
@@ -0,0 +1,74 @@
+import numpy as np
+from PIL import Image
+
+# Overlay colours used by the state editor
+PROVINCE_BORDER_COLOR = (180, 180, 180, 255)
+STATE_BORDER_COLOR = (0, 0, 0, 255)
+THIN_PROVINCE_BORDER_COLOR = (110, 110, 110, 200)
+
+
+def pack_rgb(rgb_array):
+    """Pack an (H, W, 3) uint8 array into 24-bit integer colour keys"""
+    rgb = rgb_array.astype(np.uint32)
+    return (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+
+
+def edge_mask(labels, valid=None, thin=False):
+    """Mark every pixel whose label differs from one of its 4 neighbours.
+
+    Works with whole-array shifted comparisons, so the cost is a handful of
+    vectorized passes instead of a Python loop per pixel. If `valid` is
+    given, a neighbour pair only counts when both pixels are valid. With
+    `thin`, only the left/top pixel of each pair is marked (1px lines).
+    """
+    mask = np.zeros(labels.shape, dtype=bool)
+
+    # Horizontal neighbours
+    diff = labels[:, 1:] != labels[:, :-1]
+    if valid is not None:
+        diff &= valid[:, 1:] & valid[:, :-1]
+    mask[:, :-1] |= diff
+    if not thin:
+        mask[:, 1:] |= diff
+
+    # Vertical neighbours
+    diff = labels[1:, :] != labels[:-1, :]
+    if valid is not None:
+        diff &= valid[1:, :] & valid[:-1, :]
+    mask[:-1, :] |= diff
+    if not thin:
+        mask[1:, :] |= diff
+
+    return mask
+
+
+def build_state_lookup(province_to_state, size):
+    """Build a province ID -> state ID lookup array (0 means unassigned)"""
+    lookup = np.zeros(size, dtype=np.uint32)
+    for prov_id, state_id in province_to_state.items():
+        if 0 <= prov_id < size and state_id:
+            lookup[prov_id] = state_id
+    return lookup
+
+
+def province_border_mask(labels):
+    """Border mask between any two different provinces"""
+    return edge_mask(labels)
+
+
+def state_border_mask(labels, state_lookup):
+    """Border mask between provinces that belong to different states.
+
+    Pixels that don't map to a known province (label 0) never produce a
+    state border, matching the behaviour of the old per-pixel scan.
+    """
+    states = state_lookup[labels]
+    return edge_mask(states, valid=labels != 0)
+
+
+def render_overlay(mask, color):
+    """Turn a boolean mask into a transparent RGBA overlay image"""
+    height, width = mask.shape
+    rgba = np.zeros((height, width, 4), dtype=np.uint8)
+    rgba[mask] = color
+    return Image.fromarray(rgba, 'RGBA')
@@ -0,0 +1,129 @@
+import os
+import re
+import colorsys
+import threading
+from utils.file_parser import parse_script_file
+
+_TAG_RE = re.compile(r'^[A-Z][A-Z0-9]{2}$')
+
+
+class CountryRegistry:
+    """Country tags of a project with their colours and graphical cultures.
+
+    Tags come from every file in common/country_tags/ (in file name order,
+    the first definition of a tag wins) and point at a country file in
+    common/countries/. Everything is parsed once and kept in memory; each
+    call re-checks the mtimes of the tag files and the country files and
+    re-reads only what changed.
+    """
+
+    def __init__(self, project_root):
+        self.project_root = project_root
+        self.common_dir = os.path.join(project_root, 'common')
+        self.tags_dir = os.path.join(self.common_dir, 'country_tags')
+
+        self._countries = {}
+        self._tag_files = None
+        self._country_files = {}
+        self._lock = threading.RLock()
+
+    def _stat(self, path):
+        try:
+            stat = os.stat(path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def _scan_tag_files(self):
+        tag_files = {}
+        try:
+            with os.scandir(self.tags_dir) as entries:
+                for entry in entries:
+                    if entry.name.endswith('.txt') and entry.is_file():
+                        stat = entry.stat()
+                        tag_files[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            pass
+        return tag_files
+
+    def refresh(self):
+        """Re-read tag and country files whose mtime or size changed"""
+        with self._lock:
+            tag_files = self._scan_tag_files()
+            if tag_files != self._tag_files:
+                self._load_tags(sorted(tag_files))
+                self._tag_files = tag_files
+
+            for country in self._countries.values():
+                path = os.path.join(self.common_dir, country['file'])
+                stat = self._stat(path)
+                cached = self._country_files.get(country['file'])
+                if cached is None or cached[0] != stat:
+                    self._country_files[country['file']] = (stat, self._read_country_file(path))
+                country.update(self._country_files[country['file']][1])
+
+    def _load_tags(self, filenames):
+        countries = {}
+        for filename in filenames:
+            try:
+                document = parse_script_file(os.path.join(self.tags_dir, filename))
+            except OSError as e:
+                print(f"Failed to read {filename}: {e}")
+                continue
+            for node in document:
+                if node.key and not node.is_block and _TAG_RE.match(node.key) and node.key not in countries:
+                    countries[node.key] = {
+                        'tag': node.key,
+                        'file': node.value.replace('\\', '/'),
+                        'tags_file': filename,
+                        'color': None,
+                        'graphical_culture': None,
+                        'graphical_culture_2d': None
+                    }
+        self._countries = countries
+
+    @staticmethod
+    def _read_country_file(path):
+        info = {'color': None, 'graphical_culture': None, 'graphical_culture_2d': None}
+        try:
+            document = parse_script_file(path)
+        except OSError:
+            return info
+
+        info['graphical_culture'] = document.get('graphical_culture')
+        info['graphical_culture_2d'] = document.get('graphical_culture_2d')
+        color = document.find('color')
+        if color is not None and color.is_block:
+            try:
+                values = [float(v) for v in color.values()[:3]]
+            except ValueError:
+                values = []
+            if len(values) == 3:
+                if color.tag == 'hsv':
+                    values = [c * 255 for c in colorsys.hsv_to_rgb(*values)]
+                info['color'] = [int(round(c)) for c in values]
+        return info
+
+    def tags(self):
+        """All tags, in the order the tag files define them"""
+        self.refresh()
+        return list(self._countries)
+
+    def has_tag(self, tag):
+        self.refresh()
+        return tag in self._countries
+
+    def get(self, tag):
+        """Info for one tag: tag, file, tags_file, color, graphical cultures"""
+        self.refresh()
+        country = self._countries.get(tag)
+        return dict(country) if country else None
+
+    def colors(self):
+        """Tag -> [r, g, b] for every country with a colour"""
+        self.refresh()
+        return {tag: country['color'] for tag, country in self._countries.items() if country['color']}
+
+    def all(self):
+        self.refresh()
+        return [dict(country) for country in self._countries.values()]
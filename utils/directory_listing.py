@@ -0,0 +1,90 @@
+import os
+import threading
+from collections import OrderedDict
+
+# File types shown in the project tree
+TREE_EXTENSIONS = ('.txt', '.yml', '.yaml', '.gfx', '.gui', '.dds', '.tga', '.mod')
+SKIPPED_FOLDERS = ('__pycache__', 'cache')
+
+
+class DirectoryListing:
+    """List project folders one level at a time, with a listing cache.
+
+    Each listing comes from a single os.scandir pass (reusing the dirent
+    type instead of an extra stat per entry) and is cached against the
+    folder's mtime, which changes whenever an entry is added, removed or
+    renamed. Pages are sliced from the cached, sorted listing.
+    """
+
+    def __init__(self, root, max_cached=1024):
+        self.root = os.path.abspath(root)
+        self.max_cached = max_cached
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def resolve(self, rel_path):
+        """Get the absolute folder for a project-relative path, or None if outside"""
+        rel_path = (rel_path or '').replace('\\', '/').strip('/')
+        path = os.path.normpath(os.path.join(self.root, rel_path)) if rel_path not in ('', '.') else self.root
+        if path != self.root and not path.startswith(self.root + os.sep):
+            return None
+        return path
+
+    def list(self, rel_path='', offset=0, limit=500):
+        """Get one page of a folder: {'path', 'entries', 'total', 'offset', 'has_more'}
+
+        Raises FileNotFoundError for a missing folder and ValueError for a
+        path outside the project.
+        """
+        path = self.resolve(rel_path)
+        if path is None:
+            raise ValueError("Path is outside the project")
+
+        entries = self._entries(path)
+        offset = max(0, int(offset))
+        page = entries[offset:offset + limit] if limit else entries[offset:]
+        return {
+            'path': self._relative(path),
+            'entries': page,
+            'total': len(entries),
+            'offset': offset,
+            'has_more': offset + len(page) < len(entries)
+        }
+
+    def _entries(self, path):
+        mtime = os.stat(path).st_mtime_ns
+        with self._lock:
+            cached = self._cache.get(path)
+            if cached and cached[0] == mtime:
+                self._cache.move_to_end(path)
+                return cached[1]
+
+        entries = []
+        with os.scandir(path) as it:
+            for entry in it:
+                # Skip hidden files and cache directories
+                if entry.name.startswith('.') or entry.name in SKIPPED_FOLDERS:
+                    continue
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    continue
+                if is_dir:
+                    entries.append({'name': entry.name, 'path': self._relative(entry.path), 'type': 'folder'})
+                elif entry.name.endswith(TREE_EXTENSIONS):
+                    entries.append({'name': entry.name, 'path': self._relative(entry.path), 'type': 'file'})
+
+        # Sort: folders first, then files, both alphabetically
+        entries.sort(key=lambda x: (x['type'] != 'folder', x['name'].lower()))
+
+        with self._lock:
+            self._cache[path] = (mtime, entries)
+            self._cache.move_to_end(path)
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+        return entries
+
+    def _relative(self, path):
+        if path == self.root:
+            return '.'
+        return os.path.relpath(path, self.root)
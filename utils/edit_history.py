@@ -0,0 +1,104 @@
+import threading
+from collections import deque
+
+
+class _Missing:
+    """Value of a field the state didn't have, in 'fields' changes"""
+
+    def __repr__(self):
+        return 'MISSING'
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+MISSING = _Missing()
+
+
+def invert_change(change):
+    """Get the change that undoes a logged change.
+
+    Changes are small tuples:
+      ('move', province_id, from_state, to_state, from_index)
+      ('fields', state_id, before, after)
+      ('create', state_id, state_data) / ('delete', state_id, state_data)
+    A state of None in a move means unassigned, and a field value of
+    MISSING means the state didn't have that field; state_data never
+    carries provinces, those always travel as moves.
+    """
+    kind = change[0]
+    if kind == 'move':
+        _, province_id, from_state, to_state, from_index = change
+        return ('unmove', province_id, to_state, from_state, from_index)
+    if kind == 'unmove':
+        _, province_id, from_state, to_state, to_index = change
+        return ('move', province_id, to_state, from_state, to_index)
+    if kind == 'fields':
+        _, state_id, before, after = change
+        return ('fields', state_id, after, before)
+    if kind == 'create':
+        return ('delete',) + change[1:]
+    if kind == 'delete':
+        return ('create',) + change[1:]
+    raise ValueError(f"Unknown change {kind}")
+
+
+class EditHistory:
+    """Bounded undo/redo log of state editor changes.
+
+    Each entry is (label, [change, ...]) for one user action, holding only
+    what that action touched: province moves and the old and new values of
+    the fields it set, never whole state files. Undone entries move to the
+    redo stack until a new edit clears it. The oldest entries fall off once
+    `limit` is reached.
+    """
+
+    def __init__(self, limit=200):
+        self.limit = limit
+        self._undo = deque(maxlen=limit)
+        self._redo = []
+        self._lock = threading.Lock()
+
+    def record(self, label, changes):
+        if not changes:
+            return
+        with self._lock:
+            self._undo.append((label, list(changes)))
+            self._redo.clear()
+
+    def pop_undo(self):
+        """Take the latest entry as (label, inverse changes in apply order), or None"""
+        with self._lock:
+            if not self._undo:
+                return None
+            label, changes = self._undo.pop()
+            self._redo.append((label, changes))
+        return label, [invert_change(change) for change in reversed(changes)]
+
+    def pop_redo(self):
+        """Take the latest undone entry as (label, changes), or None"""
+        with self._lock:
+            if not self._redo:
+                return None
+            label, changes = self._redo.pop()
+            self._undo.append((label, changes))
+        return label, list(changes)
+
+    def clear(self):
+        with self._lock:
+            self._undo.clear()
+            self._redo.clear()
+
+    def status(self):
+        with self._lock:
+            return {
+                'can_undo': bool(self._undo),
+                'can_redo': bool(self._redo),
+                'undo_label': self._undo[-1][0] if self._undo else None,
+                'redo_label': self._redo[-1][0] if self._redo else None,
+                'undo_depth': len(self._undo),
+                'redo_depth': len(self._redo)
+            }
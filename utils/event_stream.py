@@ -0,0 +1,55 @@
+import json
+import queue
+import threading
+
+
+def format_event(event):
+    """Format an event dict as one SSE message, named after its 'type'"""
+    return f"event: {event.get('type', 'message')}\ndata: {json.dumps(event)}\n\n"
+
+
+class EventStream:
+    """Fan-out of server events to connected clients over Server-Sent Events.
+
+    Every subscriber gets its own bounded queue; a client that stops
+    reading just misses events instead of blocking the publisher.
+    """
+
+    def __init__(self, max_queued=256):
+        self.max_queued = max_queued
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        subscriber = queue.Queue(maxsize=self.max_queued)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                pass
+
+    def stream(self, subscriber, keepalive=15.0):
+        """Yield SSE-formatted events for one subscriber until it disconnects"""
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    event = subscriber.get(timeout=keepalive)
+                except queue.Empty:
+                    # Comment line keeps proxies and the browser from timing out
+                    yield ': keepalive\n\n'
+                    continue
+                yield format_event(event)
+        finally:
+            self.unsubscribe(subscriber)
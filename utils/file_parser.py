@@ -1,6 +1,250 @@
 import os
 import re
+import sys
+import time
 from PIL import Image  # We have Pillow now!
+from utils.localisation import iter_localisation
+
+# One alternation for every token in Clausewitz script, most common first.
+# Each match also swallows the whitespace before it, so a file is
+# tokenized in a single scan without the regex engine retrying at every
+# blank character.
+_TOKEN_RE = re.compile(r"""
+    \s*(?:
+        (?P<word>(?:[^\s=<>!?{}\#"]|[!?](?!=))[^\s=<>!?{}\#"]*(?:[!?](?!=)[^\s=<>!?{}\#"]*)*)
+      | (?P<op>[<>!?]=|==|[=<>])
+      | (?P<open>\{)
+      | (?P<close>\})
+      | (?P<string>"[^"\\\n]*(?:\\.[^"\\\n]*)*"?)
+      | (?P<comment>\#[^\n]*)
+    )
+""", re.VERBOSE)
+
+_VALUE_TOKENS = ('word', 'string')
+
+
+class ScriptNode:
+    """One statement in a parsed script file.
+
+    A node is `key op value`, where value is either a scalar string or a
+    list of child nodes (a `{ }` block). Bare values inside a block, like
+    the IDs in `provinces = { 1 2 3 }`, are nodes with key None. `tag` holds
+    the word before a block in forms like `color = rgb { 1 2 3 }`.
+
+    Spans are character offsets into the source: start/end cover the whole
+    statement and value_start/value_end cover the value (braces included),
+    so callers can patch a single value without reserializing the file.
+    """
+
+    __slots__ = ('key', 'op', 'value', 'tag', 'quoted', 'start', 'end', 'value_start', 'value_end')
+
+    def __init__(self, key, op, value, start, end=None, value_start=None, value_end=None,
+                 tag=None, quoted=False):
+        self.key = key
+        self.op = op
+        self.value = value
+        self.tag = tag
+        self.quoted = quoted
+        self.start = start
+        self.end = end
+        self.value_start = value_start
+        self.value_end = value_end
+
+    @property
+    def is_block(self):
+        return isinstance(self.value, list)
+
+    def __iter__(self):
+        return iter(self.value if self.is_block else ())
+
+    def __repr__(self):
+        if self.is_block:
+            return f"ScriptNode({self.key!r} {self.op} {{{len(self.value)} items}})"
+        return f"ScriptNode({self.key!r} {self.op} {self.value!r})"
+
+    def find(self, key):
+        """First child with the given key, or None"""
+        for child in self:
+            if child.key == key:
+                return child
+        return None
+
+    def find_all(self, key):
+        """All children with the given key, in file order"""
+        return [child for child in self if child.key == key]
+
+    def get(self, key, default=None):
+        """Scalar value of the first child with the given key"""
+        child = self.find(key)
+        if child is None or child.is_block:
+            return default
+        return child.value
+
+    def values(self):
+        """Bare scalar values in this block, e.g. the IDs of a province list"""
+        return [child.value for child in self if child.key is None and not child.is_block]
+
+    def to_dict(self):
+        """Convert a block to plain dicts; repeated keys become lists"""
+        data = {}
+        repeated = set()
+        bare = []
+        for child in self:
+            value = child.to_dict() if child.is_block else child.value
+            if child.key is None:
+                bare.append(value)
+            elif child.key in repeated:
+                data[child.key].append(value)
+            elif child.key in data:
+                data[child.key] = [data[child.key], value]
+                repeated.add(child.key)
+            else:
+                data[child.key] = value
+        if bare and not data:
+            return bare
+        if bare:
+            data['_values'] = bare
+        return data
+
+
+class ScriptDocument(ScriptNode):
+    """Root of a parsed file: a block spanning the whole text.
+
+    `errors` lists (offset, message) pairs for anything that had to be
+    recovered from, like unbalanced braces.
+    """
+
+    __slots__ = ('errors',)
+
+
+class ScriptParseError(ValueError):
+    pass
+
+
+def parse_script(text, strict=False):
+    """Parse Clausewitz script text into a tree of ScriptNode.
+
+    Returns a ScriptDocument. Problems like unbalanced braces are recovered
+    from the way the game does (extra closing braces are ignored, unclosed
+    blocks end at end of file, unclosed strings at end of line) and listed
+    in its errors; with strict=True the first one raises ScriptParseError
+    instead.
+    """
+    tokens = [(m.lastgroup, m.start(m.lastindex), m.end()) for m in _TOKEN_RE.finditer(text)
+              if m.lastgroup != 'comment']
+    root = ScriptDocument(None, None, [], 0, len(text), 0, len(text))
+    root.errors = errors = []
+    stack = [root]
+    entries = root.value
+
+    def error(offset, message):
+        if strict:
+            raise ScriptParseError(f"{message} at offset {offset}")
+        errors.append((offset, message))
+
+    def scalar(kind, start, end):
+        if kind == 'string':
+            # An unclosed string ends at the end of its line
+            closed = end - start > 1 and text[end - 1] == '"'
+            if not closed:
+                error(start, "Unclosed string")
+            return text[start + 1:end - 1 if closed else end], True
+        return text[start:end], False
+
+    i, count = 0, len(tokens)
+    while i < count:
+        kind, start, end = tokens[i]
+
+        if kind == 'close':
+            if len(stack) > 1:
+                block = stack.pop()
+                block.end = block.value_end = end
+                entries = stack[-1].value
+            else:
+                error(start, "Unmatched '}'")
+            i += 1
+            continue
+
+        if kind == 'open':
+            # Anonymous block, e.g. one entry of a list of blocks
+            node = ScriptNode(None, None, [], start, value_start=start)
+            entries.append(node)
+            stack.append(node)
+            entries = node.value
+            i += 1
+            continue
+
+        if kind == 'op':
+            error(start, "Operator without a key")
+            i += 1
+            continue
+
+        if i + 1 < count and tokens[i + 1][0] == 'op':
+            key = scalar(kind, start, end)[0]
+            op = text[tokens[i + 1][1]:tokens[i + 1][2]]
+            if i + 2 >= count:
+                error(start, f"Missing value for '{key}'")
+                break
+
+            value_kind, value_start, value_end = tokens[i + 2]
+            if value_kind == 'open':
+                node = ScriptNode(key, op, [], start, value_start=value_start)
+                i += 3
+            elif value_kind in _VALUE_TOKENS and i + 3 < count and tokens[i + 3][0] == 'open':
+                # Tagged block: key = rgb { ... }
+                node = ScriptNode(key, op, [], start, value_start=value_start,
+                                  tag=text[value_start:value_end])
+                i += 4
+            elif value_kind in _VALUE_TOKENS:
+                value, quoted = scalar(value_kind, value_start, value_end)
+                entries.append(ScriptNode(key, op, value, start, value_end, value_start, value_end,
+                                          quoted=quoted))
+                i += 3
+                continue
+            else:
+                error(value_start, f"Missing value for '{key}'")
+                i += 2
+                continue
+
+            entries.append(node)
+            stack.append(node)
+            entries = node.value
+            continue
+
+        # Bare value inside a block
+        value, quoted = scalar(kind, start, end)
+        entries.append(ScriptNode(None, None, value, start, end, start, end, quoted=quoted))
+        i += 1
+
+    while len(stack) > 1:
+        block = stack.pop()
+        error(block.start, f"Unclosed block '{block.key}'")
+        block.end = block.value_end = len(text)
+
+    return root
+
+
+def parse_script_file(file_path, strict=False):
+    """Read and parse a script file (UTF-8, optional BOM)"""
+    with open(file_path, 'r', encoding='utf-8-sig', errors='ignore') as f:
+        return parse_script(f.read(), strict=strict)
+
+
+def benchmark_directory(directory):
+    """Parse every .txt file under a directory, returning (files, bytes, seconds)"""
+    texts = []
+    for root_dir, _, filenames in os.walk(directory):
+        for filename in filenames:
+            if filename.endswith('.txt'):
+                with open(os.path.join(root_dir, filename), 'r', encoding='utf-8-sig', errors='ignore') as f:
+                    texts.append(f.read())
+
+    total_bytes = sum(len(text.encode('utf-8')) for text in texts)
+    start = time.perf_counter()
+    for text in texts:
+        parse_script(text)
+    return len(texts), total_bytes, time.perf_counter() - start
+
 
 class HOI4FileParser:
     def __init__(self):
@@ -9,7 +253,7 @@ class HOI4FileParser:
     def parse_file(self, file_path):
         """Basic HOI4 file parser - handles common formats"""
         try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            with open(file_path, 'r', encoding='utf-8-sig', errors='ignore') as f:
                 content = f.read()
             
             # Simple detection of file type by extension and content
@@ -24,41 +268,24 @@ class HOI4FileParser:
             return {'type': 'error', 'error': str(e)}
     
     def parse_txt_file(self, content):
-        """Parse HOI4 .txt files (often key=value pairs)"""
-        data = {}
-        lines = content.split('\n')
-        
-        for line in lines:
-            line = line.strip()
-            if line and not line.startswith('#'):
-                # Simple key=value parsing
-                if '=' in line:
-                    key, value = line.split('=', 1)
-                    data[key.strip()] = value.strip()
-        
-        return {'type': 'txt', 'data': data}
+        """Parse HOI4 .txt script files into a tree (and plain dicts)"""
+        tree = parse_script(content)
+        return {'type': 'txt', 'data': tree.to_dict(), 'tree': tree, 'errors': tree.errors}
     
     def parse_yaml_file(self, content):
-        """Basic YAML-like parsing for HOI4 files"""
-        # HOI4 uses a simplified YAML-like format
+        """Parse a HOI4 localisation file (l_<language>: header, key:0 "value")"""
         data = {}
-        lines = content.split('\n')
-        current_key = None
-        
-        for line in lines:
-            line = line.strip()
-            if line and not line.startswith('#'):
-                if ':' in line and not line.startswith(' '):
-                    # New key
-                    key = line.split(':', 1)[0].strip()
-                    value = line.split(':', 1)[1].strip() if ':' in line else ''
-                    data[key] = value
-                    current_key = key
-                elif line.startswith(' ') and current_key:
-                    # Continuation of previous key
-                    data[current_key] += ' ' + line.strip()
+        language = None
+        duplicates = []
+        for header_language, key, _, value, line_number in iter_localisation(content.splitlines()):
+            language = header_language or language
+            if key in data:
+                # The first definition is the one the game uses
+                duplicates.append({'key': key, 'line': line_number})
+            else:
+                data[key] = value
         
-        return {'type': 'yaml', 'data': data}
+        return {'type': 'yaml', 'language': language, 'data': data, 'duplicates': duplicates}
     
     def validate_image(self, image_path):
         """Validate HOI4 image files using Pillow"""
@@ -72,3 +299,10 @@ class HOI4FileParser:
                 }
         except Exception as e:
             return {'valid': False, 'error': str(e)}
+
+
+if __name__ == '__main__':
+    # Usage: python -m utils.file_parser <history dir>
+    files, total_bytes, seconds = benchmark_directory(sys.argv[1] if len(sys.argv) > 1 else 'history')
+    megabytes = total_bytes / (1024 * 1024)
+    print(f"Parsed {files} files ({megabytes:.1f} MB) in {seconds:.2f}s: {megabytes / max(seconds, 1e-9):.1f} MB/s")
@@ -0,0 +1,246 @@
+import os
+import sys
+import time
+import ctypes
+import ctypes.util
+import select
+import struct
+import threading
+
+# Folders and file types the tool reads; everything else is ignored
+DEFAULT_FOLDERS = ('history', 'common', 'map', 'localisation', 'events')
+DEFAULT_EXTENSIONS = ('.txt', '.csv', '.yml')
+
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_Q_OVERFLOW = 0x00004000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = (_IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO
+               | _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF)
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+class _Inotify:
+    """Minimal ctypes binding for Linux inotify"""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self.fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.paths = {}
+
+    def add_watch(self, path):
+        wd = self._add_watch(self.fd, os.fsencode(path), _WATCH_MASK)
+        if wd >= 0:
+            self.paths[wd] = path
+        return wd
+
+    def read(self, timeout):
+        """Wait for events and return (directory, name, mask) tuples"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            events.append((self.paths.get(wd), name, mask))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FileWatcher:
+    """Watch a project folder and report changed, added and deleted files.
+
+    Uses inotify on Linux and falls back to polling with an os.scandir
+    stat snapshot elsewhere. Watched folders created after the start, like
+    `history` in a new mod, are picked up too. Either way the result comes from diffing a
+    snapshot of (mtime, size) per file, so events for files that end up
+    unchanged never surface. Changes are collected for `debounce` seconds
+    and passed to `callback` as a dict with 'added', 'modified' and
+    'deleted' lists of paths relative to the root, using forward slashes.
+    """
+
+    def __init__(self, root, callback, folders=DEFAULT_FOLDERS, extensions=DEFAULT_EXTENSIONS,
+                 poll_interval=1.0, debounce=0.25, use_inotify=None):
+        self.root = os.path.abspath(root)
+        self.callback = callback
+        self.folders = folders
+        self.extensions = tuple(extensions)
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+
+        if use_inotify is None:
+            use_inotify = sys.platform.startswith('linux')
+        self.backend = 'inotify' if use_inotify else 'polling'
+
+        self._stop = threading.Event()
+        self._snapshot = {}
+        self._thread = None
+
+    def start(self):
+        self._snapshot = self.scan()
+        inotify = None
+        if self.backend == 'inotify':
+            try:
+                inotify = _Inotify()
+                if self.folders:
+                    # Watched folders may not exist yet, e.g. in a new mod
+                    inotify.add_watch(self.root)
+                for directory in self._watch_roots():
+                    self._watch_tree(inotify, directory)
+            except (OSError, AttributeError) as e:
+                print(f"inotify unavailable, polling for file changes instead: {e}")
+                inotify = None
+                self.backend = 'polling'
+
+        target = self._run_inotify if inotify else self._run_polling
+        self._thread = threading.Thread(target=target, args=(inotify,) if inotify else (),
+                                        name='file-watcher', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+
+    def _watch_roots(self):
+        if not self.folders:
+            return [self.root]
+        roots = [os.path.join(self.root, folder) for folder in self.folders]
+        return [path for path in roots if os.path.isdir(path)]
+
+    def _accept(self, name):
+        return name.endswith(self.extensions) and not name.startswith('.')
+
+    def _relative(self, path):
+        return os.path.relpath(path, self.root).replace(os.sep, '/')
+
+    def scan(self, directories=None):
+        """Stat every watched file: {relative path: (mtime_ns, size)}"""
+        snapshot = {}
+        stack = list(directories or self._watch_roots())
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if not entry.name.startswith('.'):
+                                stack.append(entry.path)
+                        elif self._accept(entry.name):
+                            try:
+                                stat = entry.stat()
+                            except OSError:
+                                continue
+                            snapshot[self._relative(entry.path)] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                continue
+        return snapshot
+
+    def _diff(self, new_snapshot, paths=None):
+        """Compare against the stored snapshot, optionally for some paths only"""
+        old_snapshot = self._snapshot
+        if paths is None:
+            paths = set(old_snapshot) | set(new_snapshot)
+
+        changes = {'added': [], 'modified': [], 'deleted': []}
+        for path in sorted(paths):
+            old, new = old_snapshot.get(path), new_snapshot.get(path)
+            if old == new:
+                continue
+            if old is None:
+                changes['added'].append(path)
+                old_snapshot[path] = new
+            elif new is None:
+                changes['deleted'].append(path)
+                del old_snapshot[path]
+            else:
+                changes['modified'].append(path)
+                old_snapshot[path] = new
+        return changes
+
+    def _emit(self, changes):
+        if any(changes.values()):
+            try:
+                self.callback(changes)
+            except Exception as e:
+                print(f"File change handler failed: {e}")
+
+    def _run_polling(self):
+        while not self._stop.wait(self.poll_interval):
+            self._emit(self._diff(self.scan()))
+
+    def _watch_tree(self, inotify, directory):
+        inotify.add_watch(directory)
+        for root, dirs, _ in os.walk(directory):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            for name in dirs:
+                inotify.add_watch(os.path.join(root, name))
+
+    def _run_inotify(self, inotify):
+        try:
+            while not self._stop.is_set():
+                events = inotify.read(0.5)
+                if not events:
+                    continue
+
+                # Collect the burst, then re-stat only the touched paths
+                deadline = time.monotonic() + self.debounce
+                while time.monotonic() < deadline:
+                    events.extend(inotify.read(max(0.0, deadline - time.monotonic())))
+
+                full_rescan = False
+                touched = set()
+                for directory, name, mask in events:
+                    if mask & _IN_Q_OVERFLOW or directory is None:
+                        full_rescan = True
+                        continue
+                    if directory == self.root and self.folders and name not in self.folders:
+                        continue
+                    path = os.path.join(directory, name) if name else directory
+                    if mask & _IN_ISDIR:
+                        # New or moved-in folders need watches and a scan;
+                        # removed ones are covered by the snapshot diff
+                        if mask & (_IN_CREATE | _IN_MOVED_TO) and not name.startswith('.'):
+                            self._watch_tree(inotify, path)
+                        full_rescan = True
+                    elif self._accept(name):
+                        touched.add(path)
+
+                if full_rescan:
+                    self._emit(self._diff(self.scan()))
+                    continue
+
+                new_stats = {}
+                for path in touched:
+                    try:
+                        stat = os.stat(path)
+                        new_stats[self._relative(path)] = (stat.st_mtime_ns, stat.st_size)
+                    except OSError:
+                        pass
+                self._emit(self._diff(new_stats, {self._relative(p) for p in touched}))
+        finally:
+            inotify.close()
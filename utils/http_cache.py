@@ -0,0 +1,99 @@
+import gzip
+import threading
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Content codings we can produce, best first
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def accepted_encoding(header):
+    """Best content coding an Accept-Encoding header allows, or None for identity"""
+    qualities = {}
+    for part in (header or '').split(','):
+        coding, _, params = part.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[coding] = quality
+
+    for coding in ENCODINGS:
+        if qualities.get(coding, qualities.get('*', 0.0)) > 0:
+            return coding
+    return None
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    if encoding == 'gzip':
+        # mtime=0 keeps the output identical for identical bodies
+        return gzip.compress(body, compresslevel=6, mtime=0)
+    return body
+
+
+class ResponseCache:
+    """Response bodies keyed by a content tag, kept in every coding served.
+
+    The tag must change whenever the content does (a revision counter, a
+    file fingerprint), so a cached body never needs invalidating: bodies
+    of old tags just age out. The least recently used bodies are dropped
+    once `max_bytes` is exceeded.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._bodies = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, tag, encoding, build):
+        """Body for `tag` in `encoding`; `build()` makes the identity body on a miss"""
+        body = self._lookup((tag, encoding))
+        if body is not None:
+            return body
+
+        identity = self._lookup((tag, None))
+        if identity is None:
+            identity = build()
+            self._store((tag, None), identity)
+        if encoding is None:
+            return identity
+
+        body = compress(identity, encoding)
+        self._store((tag, encoding), body)
+        return body
+
+    def _lookup(self, key):
+        with self._lock:
+            body = self._bodies.get(key)
+            if body is not None:
+                self._bodies.move_to_end(key)
+            return body
+
+    def _store(self, key, body):
+        with self._lock:
+            previous = self._bodies.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._bodies[key] = body
+            self._size += len(body)
+            while self._size > self.max_bytes and len(self._bodies) > 1:
+                _, dropped = self._bodies.popitem(last=False)
+                self._size -= len(dropped)
+
+    def clear(self):
+        with self._lock:
+            self._bodies.clear()
+            self._size = 0
@@ -0,0 +1,200 @@
+import os
+import re
+import threading
+import time
+
+DEFAULT_LANGUAGE = 'english'
+
+# Loc files are named like focus_l_english.yml
+_FILE_LANGUAGE_RE = re.compile(r'_l_(\w+)\.yml$', re.IGNORECASE)
+_HEADER_RE = re.compile(r'^\s*l_(\w+)\s*:\s*(?:#.*)?$')
+# key:0 "value" # comment (the version number and comment are optional);
+# the value is a quoted string with backslash escapes
+_ENTRY_RE = re.compile(r'^\s*([^\s:#"]+)\s*:\s*(\d*)\s*"((?:[^"\\]|\\.)*)"\s*(?:#.*)?$')
+# Lines with unescaped quotes inside the value, which the game also
+# accepts: the value runs to the last quote on the line
+_LOOSE_ENTRY_RE = re.compile(r'^\s*([^\s:#"]+)\s*:\s*(\d*)\s*"(.*)"[^"]*$')
+
+
+def file_language(filename):
+    """Language a loc file is for, from its _l_<language>.yml suffix"""
+    match = _FILE_LANGUAGE_RE.search(filename)
+    return match.group(1).lower() if match else None
+
+
+def iter_localisation(lines):
+    """Parse loc lines, yielding (language, key, version, value, line number)
+
+    `lines` is any iterable of text lines, e.g. an open file, so large
+    files are never held in memory. Entries before the l_<language>:
+    header get a language of None.
+    """
+    language = None
+    for line_number, line in enumerate(lines, 1):
+        if line_number == 1:
+            line = line.lstrip('\ufeff')
+        stripped = line.strip()
+        if not stripped or stripped.startswith('#'):
+            continue
+
+        header = _HEADER_RE.match(line)
+        if header:
+            language = header.group(1).lower()
+            continue
+
+        entry = _ENTRY_RE.match(line) or _LOOSE_ENTRY_RE.match(line)
+        if entry:
+            version = int(entry.group(2)) if entry.group(2) else None
+            yield language, entry.group(1), version, entry.group(3).replace('\\"', '"'), line_number
+
+
+def read_localisation_file(path):
+    """Read one loc file: (language, [(key, value, line number), ...])"""
+    entries = []
+    language = file_language(os.path.basename(path))
+    with open(path, 'r', encoding='utf-8-sig', errors='replace') as f:
+        for header_language, key, _, value, line_number in iter_localisation(f):
+            language = header_language or language
+            entries.append((key, value, line_number))
+    return language, entries
+
+
+def _precedence(definition):
+    """Sort key putting the definition the game uses first"""
+    relpath, line_number, _ = definition
+    return ('/replace/' not in '/' + relpath, relpath, line_number)
+
+
+class LocalisationIndex:
+    """In-memory index of every localisation key in a project.
+
+    Keeps one dict per language mapping key -> list of (path, line, value)
+    definitions. The first definition wins, except that files under a
+    replace/ folder override the rest, like in the game; any key with more
+    than one definition shows up in duplicates(). Each file's keys are
+    remembered so reload_file() can swap a single file in place.
+
+    load() builds the index off to the side and swaps it in at the end, so
+    lookups from other threads never see it half filled or wait for it.
+    """
+
+    def __init__(self, project_root):
+        self.project_root = os.path.abspath(project_root)
+        self.loc_dir = os.path.join(self.project_root, 'localisation')
+        self.languages = {}
+        self._files = {}
+        # _lock guards the maps; _load_lock keeps loads and reloads in order
+        self._lock = threading.RLock()
+        self._load_lock = threading.RLock()
+        self.loaded = False
+        self.load_time = 0.0
+        # Bumped whenever the indexed text changes
+        self.revision = 0
+
+    def _relative(self, path):
+        return os.path.relpath(path, self.project_root).replace(os.sep, '/')
+
+    def _scan(self):
+        paths = []
+        stack = [self.loc_dir]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif file_language(entry.name):
+                            paths.append(self._relative(entry.path))
+            except OSError:
+                continue
+        return sorted(paths)
+
+    def load(self):
+        """Index every loc file in the project, returning (files, keys)"""
+        start = time.perf_counter()
+        with self._load_lock:
+            languages, files = {}, {}
+            for relpath in self._scan():
+                self._add_file(relpath, languages, files)
+            with self._lock:
+                self.languages, self._files = languages, files
+                self.load_time = time.perf_counter() - start
+                self.loaded = True
+                self.revision += 1
+            return len(files), sum(len(keys) for keys in languages.values())
+
+    def ensure_loaded(self):
+        """Load on first use; waits for a load already running on another thread"""
+        with self._load_lock:
+            if not self.loaded:
+                self.load()
+
+    def reload_file(self, relpath):
+        """Re-read one changed (or removed) loc file"""
+        with self._load_lock, self._lock:
+            self._remove_file(relpath)
+            if os.path.exists(os.path.join(self.project_root, *relpath.split('/'))):
+                self._add_file(relpath, self.languages, self._files)
+            self.revision += 1
+
+    def _add_file(self, relpath, languages, files):
+        try:
+            language, entries = read_localisation_file(os.path.join(self.project_root, *relpath.split('/')))
+        except OSError as e:
+            print(f"Failed to read {relpath}: {e}")
+            return
+        if not language:
+            return
+
+        keys = languages.setdefault(language, {})
+        for key, value, line_number in entries:
+            definitions = keys.get(key)
+            if definitions is None:
+                keys[key] = [(relpath, line_number, value)]
+            else:
+                definitions.append((relpath, line_number, value))
+                definitions.sort(key=_precedence)
+        files[relpath] = (language, [key for key, _, _ in entries])
+
+    def _remove_file(self, relpath):
+        language, file_keys = self._files.pop(relpath, (None, ()))
+        keys = self.languages.get(language, {})
+        for key in set(file_keys):
+            definitions = [d for d in keys.get(key, ()) if d[0] != relpath]
+            if definitions:
+                keys[key] = definitions
+            else:
+                keys.pop(key, None)
+
+    def language_counts(self):
+        """Number of keys per language: {language: count}"""
+        with self._lock:
+            return {language: len(keys) for language, keys in self.languages.items()}
+
+    def get(self, key, language=DEFAULT_LANGUAGE, default=None):
+        """Text of a key, or default if it isn't localised"""
+        with self._lock:
+            definitions = self.languages.get(language, {}).get(key)
+            return definitions[0][2] if definitions else default
+
+    def lookup(self, keys, language=DEFAULT_LANGUAGE):
+        """Texts for many keys at once, skipping ones that aren't localised"""
+        with self._lock:
+            index = self.languages.get(language, {})
+            return {key: index[key][0][2] for key in keys if key in index}
+
+    def locate(self, key, language=DEFAULT_LANGUAGE):
+        """Every definition of a key as {'path', 'line', 'value'}"""
+        with self._lock:
+            return [{'path': path, 'line': line, 'value': value}
+                    for path, line, value in self.languages.get(language, {}).get(key, ())]
+
+    def duplicates(self, language=DEFAULT_LANGUAGE):
+        """Keys defined more than once: {key: [{'path', 'line', 'value'}, ...]}"""
+        with self._lock:
+            return {key: self.locate(key, language)
+                    for key, definitions in self.languages.get(language, {}).items() if len(definitions) > 1}
+
+    def is_localisation_file(self, relpath):
+        return relpath.startswith('localisation/') and file_language(relpath) is not None
@@ -0,0 +1,272 @@
+import os
+import json
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+# Right turn, straight on, left turn: the order in which outgoing edges are
+# tried at a vertex. Preferring right turns keeps diagonal-touching parts of
+# a province in separate rings.
+_TURN_ORDER = {
+    (1, 0): ((0, 1), (1, 0), (0, -1)),
+    (0, 1): ((-1, 0), (0, 1), (1, 0)),
+    (-1, 0): ((0, -1), (-1, 0), (0, 1)),
+    (0, -1): ((1, 0), (0, -1), (-1, 0)),
+}
+
+# Set in each worker process by _init_worker
+_worker_labels = None
+
+
+def trace_province(labels, province_id, bbox, tolerance=1.0):
+    """Trace the outline rings of one province.
+
+    Rings follow pixel edges (so they are exact before simplification) and
+    are returned as flat [x0, y0, x1, y1, ...] lists in map coordinates.
+    Outer rings run clockwise on screen and holes run counter-clockwise, so
+    they can be filled with the non-zero or even-odd rule. Borders are
+    simplified between junctions, so neighbours share their edges exactly.
+    """
+    x0, y0, x1, y1 = bbox
+
+    # Cut the province's box with a 1px frame so every edge has an outside
+    mask = np.zeros((y1 - y0 + 2, x1 - x0 + 2), dtype=bool)
+    mask[1:-1, 1:-1] = np.asarray(labels[y0:y1, x0:x1]) == province_id
+
+    inside = mask[1:-1, 1:-1]
+    if not inside.any():
+        return []
+
+    # Directed boundary edges, one per pixel side that faces outside
+    outgoing = {}
+    sides = (
+        (~mask[:-2, 1:-1], 0, 0, 1, 0),    # top: left -> right
+        (~mask[1:-1, 2:], 1, 0, 0, 1),     # right: top -> bottom
+        (~mask[2:, 1:-1], 1, 1, -1, 0),    # bottom: right -> left
+        (~mask[1:-1, :-2], 0, 1, 0, -1),   # left: bottom -> top
+    )
+    for facing_out, ox, oy, dx, dy in sides:
+        edge = facing_out & inside
+        ex = np.nonzero(edge)
+        for py, px in zip((ex[0] + y0 + oy).tolist(), (ex[1] + x0 + ox).tolist()):
+            outgoing.setdefault((px, py), []).append((dx, dy))
+
+    junctions = _find_junctions(labels, province_id, bbox)
+    rings = []
+    while outgoing:
+        start = next(iter(outgoing))
+        ring = _follow_ring(outgoing, start, junctions)
+        if len(ring) >= 3:
+            rings.append(_simplify_ring(ring, tolerance, junctions))
+    return [[coord for point in ring for coord in point] for ring in rings if len(ring) >= 3]
+
+
+def _find_junctions(labels, province_id, bbox):
+    """Vertices of a province's border where one border meets another.
+
+    That is where the four pixels around a vertex hold three or more
+    provinces (beyond the map edge counts as one), or two provinces that
+    touch only diagonally. Between two junctions a border separates the
+    same two provinces all along.
+    """
+    x0, y0, x1, y1 = bbox
+    height, width = labels.shape
+
+    # Pixels from (x0 - 1, y0 - 1) to (x1, y1), -1 beyond the map edge
+    window = np.full((y1 - y0 + 2, x1 - x0 + 2), -1, dtype=np.int64)
+    top, left = max(y0 - 1, 0), max(x0 - 1, 0)
+    bottom, right = min(y1 + 1, height), min(x1 + 1, width)
+    window[top - y0 + 1:bottom - y0 + 1, left - x0 + 1:right - x0 + 1] = labels[top:bottom, left:right]
+
+    # The pixels up-left, up-right, down-left and down-right of each vertex
+    a, b, c, d = window[:-1, :-1], window[:-1, 1:], window[1:, :-1], window[1:, 1:]
+    distinct = 1 + (b != a) + ((c != a) & (c != b)) + ((d != a) & (d != b) & (d != c))
+    diagonal = (a == d) & (b == c) & (a != b)
+    touches = (a == province_id) | (b == province_id) | (c == province_id) | (d == province_id)
+    ys, xs = np.nonzero(((distinct >= 3) | diagonal) & touches)
+    return set(zip((xs + x0).tolist(), (ys + y0).tolist()))
+
+
+def _follow_ring(outgoing, start, junctions=()):
+    """Walk boundary edges from a vertex until the ring closes.
+
+    Every vertex has as many incoming as outgoing edges, so the walk can
+    only end back at the start. Only corners and junctions are kept.
+    """
+    direction = first_direction = _pop_edge(outgoing, start, None)
+    corners = [start]
+    x, y = start
+    while True:
+        x, y = x + direction[0], y + direction[1]
+        if (x, y) == start:
+            break
+        next_direction = _pop_edge(outgoing, (x, y), direction)
+        if next_direction != direction or (x, y) in junctions:
+            corners.append((x, y))
+        direction = next_direction
+
+    # The walk may have started halfway along a side
+    if direction == first_direction and start not in junctions:
+        corners.pop(0)
+    return corners
+
+
+def _pop_edge(outgoing, vertex, direction):
+    edges = outgoing[vertex]
+    choice = edges[0]
+    if direction is not None and len(edges) > 1:
+        for preferred in _TURN_ORDER[direction]:
+            if preferred in edges:
+                choice = preferred
+                break
+    edges.remove(choice)
+    if not edges:
+        del outgoing[vertex]
+    return choice
+
+
+def _simplify_ring(ring, tolerance, junctions=()):
+    """Douglas-Peucker simplification of a closed ring.
+
+    The ring is simplified one border at a time, from junction to junction.
+    A ring without junctions is one border all round, shared whole with
+    the hole of the province around it, and starts at its smallest vertex.
+    Either way both provinces along a border get the same line.
+    """
+    if tolerance <= 0 or len(ring) < 4:
+        return ring
+
+    breaks = [i for i, point in enumerate(ring) if point in junctions]
+    if not breaks:
+        breaks = [min(range(len(ring)), key=ring.__getitem__)]
+    first = breaks[0]
+    ring = ring[first:] + ring[:first]
+    breaks = [i - first for i in breaks]
+
+    simplified = []
+    for start, end in zip(breaks, breaks[1:] + [len(ring)]):
+        arc = ring[start:end] + [ring[end % len(ring)]]
+        simplified.extend(_simplify_arc(arc, tolerance)[:-1])
+    return simplified if len(simplified) >= 3 else ring
+
+
+def _simplify_arc(points, tolerance):
+    """Douglas-Peucker over an arc, walked the same way from either side.
+
+    An arc keeps at least one point between its ends (two when it closes
+    on itself), so a small province can't collapse into a line on one side
+    of a border only.
+    """
+    reverse = points[-1] < points[0] or (points[-1] == points[0] and points[-2] < points[1])
+    if reverse:
+        points = points[::-1]
+
+    if points[0] == points[-1]:
+        # Split a closed arc at the vertex farthest from its ends
+        first = points[0]
+        far = max(range(len(points)), key=lambda i: (points[i][0] - first[0]) ** 2 + (points[i][1] - first[1]) ** 2)
+        kept = _simplify_open(points[:far + 1], tolerance)[:-1] + _simplify_open(points[far:], tolerance)
+    else:
+        kept = _simplify_open(points, tolerance)
+    return kept[::-1] if reverse else kept
+
+
+def _simplify_open(points, tolerance):
+    kept = _douglas_peucker(points, tolerance)
+    if len(kept) == 2 and len(points) > 2:
+        # Douglas-Peucker's first split point, kept even within tolerance
+        (ax, ay), (bx, by) = points[0], points[-1]
+        kept.insert(1, max(points[1:-1], key=lambda p: abs((bx - ax) * (p[1] - ay) - (by - ay) * (p[0] - ax))))
+    return kept
+
+
+def _douglas_peucker(points, tolerance):
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    tolerance_sq = tolerance * tolerance
+
+    while stack:
+        start, end = stack.pop()
+        ax, ay = points[start]
+        bx, by = points[end]
+        dx, dy = bx - ax, by - ay
+        length_sq = dx * dx + dy * dy
+
+        max_dist, index = -1.0, None
+        for i in range(start + 1, end):
+            px, py = points[i]
+            if length_sq == 0:
+                dist = (px - ax) ** 2 + (py - ay) ** 2
+            else:
+                cross = dx * (py - ay) - dy * (px - ax)
+                dist = cross * cross / length_sq
+            if dist > max_dist:
+                max_dist, index = dist, i
+
+        if index is not None and max_dist > tolerance_sq:
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+
+    return [p for p, k in zip(points, keep) if k]
+
+
+def _init_worker(labels_path):
+    global _worker_labels
+    _worker_labels = np.load(labels_path, mmap_mode='r')
+
+
+def _trace_batch(batch, tolerance):
+    return {province_id: trace_province(_worker_labels, province_id, bbox, tolerance)
+            for province_id, bbox in batch}
+
+
+def vectorize_provinces(raster, province_ids, tolerance=1.0, workers=None, batch_size=200):
+    """Trace outlines for many provinces, spread across a process pool.
+
+    Workers memory-map the cached raster file themselves, so only province
+    IDs and bounding boxes cross process boundaries.
+    """
+    bboxes = raster.get_bounding_boxes()
+    jobs = [(p, tuple(int(v) for v in bboxes[p])) for p in sorted(province_ids)
+            if p < len(bboxes) and bboxes[p][0] < bboxes[p][2]]
+    batches = [jobs[i:i + batch_size] for i in range(0, len(jobs), batch_size)]
+
+    workers = workers or os.cpu_count() or 1
+    labels_path = raster.cache_file()
+    outlines = {}
+
+    if workers <= 1 or len(batches) <= 1 or not labels_path:
+        for batch in batches:
+            outlines.update({p: trace_province(raster.labels, p, bbox, tolerance) for p, bbox in batch})
+        return outlines
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(labels_path,)) as pool:
+        for result in pool.map(_trace_batch, batches, [tolerance] * len(batches)):
+            outlines.update(result)
+    return outlines
+
+
+def load_or_build_outlines(raster, province_ids, tolerance=1.0, workers=None):
+    """Get province outlines from the disk cache, vectorizing them if needed"""
+    cache_path = os.path.join(raster.cache_dir, f"province_outlines-v2-{raster.key}-t{tolerance:g}.json")
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                return {int(k): v for k, v in json.load(f).items()}, True
+        except (OSError, ValueError):
+            pass
+
+    outlines = vectorize_provinces(raster, province_ids, tolerance, workers)
+
+    try:
+        os.makedirs(raster.cache_dir, exist_ok=True)
+        tmp_path = cache_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(outlines, f, separators=(',', ':'))
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"Could not write outline cache: {e}")
+
+    return outlines, False
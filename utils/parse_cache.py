@@ -0,0 +1,112 @@
+import os
+import json
+import sqlite3
+import threading
+
+
+class ParseCache:
+    """Persistent cache of parsed file data in a single SQLite file.
+
+    Entries are grouped by kind (e.g. "state", "definition") and keyed on
+    the file path; each remembers the mtime and size the file had when it
+    was parsed, so a lookup only hits while the file is unchanged. Values
+    are stored as JSON rather than pickles, so a cache folder shipped
+    inside a mod can't run code when the project is opened.
+    """
+
+    SCHEMA_VERSION = 1
+
+    def __init__(self, cache_dir, filename="parse_cache.sqlite"):
+        self.cache_dir = cache_dir
+        self.path = os.path.join(cache_dir, filename)
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version != self.SCHEMA_VERSION:
+                conn.execute("DROP TABLE IF EXISTS entries")
+                conn.execute(f"PRAGMA user_version={self.SCHEMA_VERSION}")
+            conn.execute("""CREATE TABLE IF NOT EXISTS entries (
+                kind TEXT NOT NULL,
+                path TEXT NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                data TEXT NOT NULL,
+                PRIMARY KEY (kind, path)
+            )""")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get(self, kind, path, stat):
+        """Get the cached data for a file, or None if missing or stale"""
+        try:
+            with self._lock:
+                row = self._connect().execute(
+                    "SELECT mtime_ns, size, data FROM entries WHERE kind = ? AND path = ?",
+                    (kind, path)
+                ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Parse cache read failed: {e}")
+            return None
+        if row is None or row[0] != stat.st_mtime_ns or row[1] != stat.st_size:
+            return None
+        return json.loads(row[2])
+
+    def get_all(self, kind):
+        """Get every entry of a kind as {path: (mtime_ns, size, data)}"""
+        try:
+            with self._lock:
+                rows = self._connect().execute(
+                    "SELECT path, mtime_ns, size, data FROM entries WHERE kind = ?", (kind,)
+                ).fetchall()
+        except sqlite3.Error as e:
+            print(f"Parse cache read failed: {e}")
+            return {}
+        return {path: (mtime_ns, size, data) for path, mtime_ns, size, data in rows}
+
+    def put(self, kind, path, stat, data):
+        self.put_many(kind, [(path, stat, data)])
+
+    def put_many(self, kind, entries):
+        """Store (path, stat, data) entries in one transaction"""
+        rows = [(kind, path, stat.st_mtime_ns, stat.st_size, json.dumps(data, separators=(',', ':')))
+                for path, stat, data in entries]
+        if not rows:
+            return
+        try:
+            with self._lock:
+                conn = self._connect()
+                with conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO entries (kind, path, mtime_ns, size, data) VALUES (?, ?, ?, ?, ?)",
+                        rows
+                    )
+        except sqlite3.Error as e:
+            print(f"Parse cache write failed: {e}")
+
+    def remove_many(self, kind, paths):
+        """Drop entries for files that no longer exist"""
+        paths = list(paths)
+        if not paths:
+            return
+        try:
+            with self._lock:
+                conn = self._connect()
+                with conn:
+                    conn.executemany("DELETE FROM entries WHERE kind = ? AND path = ?",
+                                     [(kind, path) for path in paths])
+        except sqlite3.Error as e:
+            print(f"Parse cache write failed: {e}")
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,113 @@
+import numpy as np
+
+# Column layout of the geometry table
+_X0, _Y0, _X1, _Y1, _AREA, _CX, _CY, _LX, _LY = range(9)
+COLUMNS = 9
+
+
+def build_geometry_table(run_labels, rows, starts, ends):
+    """Compute per-province geometry from the horizontal runs of a raster.
+
+    Returns an (N, 9) float64 table indexed by province ID with the columns
+    x0, y0, x1, y1 (bounding box, exclusive), area (pixels), cx, cy
+    (centroid) and lx, ly (label point). Every statistic is a bincount or
+    ufunc.at reduction over the runs, so the whole table is one pass.
+    """
+    size = int(run_labels.max()) + 1 if len(run_labels) else 1
+    run_labels = run_labels.astype(np.int64)
+    lengths = (ends - starts).astype(np.float64)
+    row_centers = rows + 0.5
+
+    table = np.zeros((size, COLUMNS), dtype=np.float64)
+
+    x0 = np.full(size, np.iinfo(np.int32).max, dtype=np.int64)
+    y0 = np.full(size, np.iinfo(np.int32).max, dtype=np.int64)
+    x1 = np.full(size, -1, dtype=np.int64)
+    y1 = np.full(size, -1, dtype=np.int64)
+    np.minimum.at(x0, run_labels, starts)
+    np.minimum.at(y0, run_labels, rows)
+    np.maximum.at(x1, run_labels, ends)
+    np.maximum.at(y1, run_labels, rows + 1)
+    table[:, _X0], table[:, _Y0], table[:, _X1], table[:, _Y1] = x0, y0, x1, y1
+
+    # Sum of pixel-centre x over a run is its length times its midpoint
+    area = np.bincount(run_labels, weights=lengths, minlength=size)
+    sum_x = np.bincount(run_labels, weights=lengths * (starts + ends) / 2.0, minlength=size)
+    sum_y = np.bincount(run_labels, weights=lengths * row_centers, minlength=size)
+    present = area > 0
+    table[:, _AREA] = area
+    table[present, _CX] = sum_x[present] / area[present]
+    table[present, _CY] = sum_y[present] / area[present]
+
+    # Label point: the spot on any run closest to the centroid, traded off
+    # against how far it sits from the run's ends, so concave and ring-shaped
+    # provinces still get a point that is inside and not on a sliver
+    cx = table[run_labels, _CX]
+    cy = table[run_labels, _CY]
+    px = np.clip(cx, starts + 0.5, ends - 0.5)
+    clearance = np.minimum(px - starts, ends - px)
+    score = np.hypot(px - cx, row_centers - cy) - clearance
+
+    order = np.lexsort((score, run_labels))
+    first = order[np.r_[True, run_labels[order][1:] != run_labels[order][:-1]]]
+    table[run_labels[first], _LX] = px[first]
+    table[run_labels[first], _LY] = row_centers[first]
+
+    return table
+
+
+class ProvinceGeometry:
+    """Bounding box, area, centroid and label point for every province.
+
+    Backed by the table from build_geometry_table. Provinces that don't
+    appear on the map have zero area and an empty box (x0 > x1).
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.bboxes = table[:, _X0:_Y1 + 1].astype(np.int32)
+        self.areas = table[:, _AREA].astype(np.int64)
+
+    def __len__(self):
+        return len(self.table)
+
+    def has(self, province_id):
+        return 0 < province_id < len(self.table) and self.areas[province_id] > 0
+
+    def get(self, province_id):
+        """Get the geometry of one province as a dict, or None if it's not on the map"""
+        if not self.has(province_id):
+            return None
+        row = self.table[province_id]
+        return {
+            'bbox': [int(v) for v in row[_X0:_Y1 + 1]],
+            'area': int(row[_AREA]),
+            'centroid': [round(float(row[_CX]), 2), round(float(row[_CY]), 2)],
+            'label_point': [round(float(row[_LX]), 2), round(float(row[_LY]), 2)],
+        }
+
+    def columns(self, province_ids):
+        """Get bbox (int32, N x 4), area (uint32) and label_point (float32,
+        N x 2) arrays for many provinces, zero for ones not on the map"""
+        ids = np.asarray(province_ids, dtype=np.int64)
+        rows = np.zeros((len(ids), COLUMNS), dtype=np.float64)
+        known = (ids > 0) & (ids < len(self.table))
+        rows[known] = self.table[ids[known]]
+        rows[rows[:, _AREA] == 0] = 0
+        return {
+            'bbox': rows[:, _X0:_Y1 + 1].astype(np.int32),
+            'area': rows[:, _AREA].astype(np.uint32),
+            'label_point': rows[:, _LX:_LY + 1].astype(np.float32)
+        }
+
+    def to_dict(self, province_ids=None):
+        """Get the geometry of many provinces, keyed by province ID"""
+        if province_ids is None:
+            province_ids = np.nonzero(self.areas)[0].tolist()
+        result = {}
+        for province_id in province_ids:
+            geometry = self.get(province_id)
+            if geometry is not None:
+                result[province_id] = geometry
+        return result
+
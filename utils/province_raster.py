@@ -0,0 +1,260 @@
+import os
+import json
+import numpy as np
+from PIL import Image, ImageDraw
+from utils.border_engine import pack_rgb
+from utils.province_adjacency import ProvinceAdjacency, build_adjacency_edges
+from utils.province_geometry import ProvinceGeometry, build_geometry_table
+
+
+class ProvinceRaster:
+    """Province ID raster for provinces.bmp, cached on disk as a .npy file.
+
+    Every pixel holds the ID of the province it belongs to (0 for colours
+    that aren't in definition.csv). The cache is keyed on the mtime and size
+    of provinces.bmp and definition.csv and loaded memory-mapped, so opening
+    an unchanged map costs almost nothing and lookups are plain indexing.
+    """
+
+    CACHE_VERSION = 1
+
+    def __init__(self, provinces_bmp, definition_csv, cache_dir):
+        self.provinces_bmp = provinces_bmp
+        self.definition_csv = definition_csv
+        self.cache_dir = cache_dir
+
+        self.labels = None
+        self.key = None
+        self.geometry = None
+        self.adjacency = None
+
+    @property
+    def width(self):
+        return self.labels.shape[1] if self.labels is not None else 0
+
+    @property
+    def height(self):
+        return self.labels.shape[0] if self.labels is not None else 0
+
+    def source_key(self):
+        """Cache key derived from the source files' mtime and size"""
+        bmp_stat = os.stat(self.provinces_bmp)
+        csv_stat = os.stat(self.definition_csv)
+        return (f"v{self.CACHE_VERSION}-{bmp_stat.st_mtime_ns}-{bmp_stat.st_size}"
+                f"-{csv_stat.st_mtime_ns}-{csv_stat.st_size}")
+
+    def is_current(self):
+        """Check whether the loaded raster still matches the source files"""
+        try:
+            return self.labels is not None and self.key == self.source_key()
+        except OSError:
+            return False
+
+    def cache_file(self):
+        """Path of the cached raster file, if it exists on disk"""
+        if self.key is None:
+            return None
+        path = self._cache_path(self.key)
+        return path if os.path.exists(path) else None
+
+    def _cache_path(self, key, name="province_labels"):
+        return os.path.join(self.cache_dir, f"{name}-{key}.npy")
+
+    def load(self, provinces):
+        """Load the raster from cache, or build it from provinces.bmp"""
+        if self.is_current():
+            return True, "Province raster already loaded"
+
+        try:
+            key = self.source_key()
+        except OSError as e:
+            return False, f"Error reading map files: {str(e)}"
+
+        self.geometry = None
+        self.adjacency = None
+        cache_path = self._cache_path(key)
+        if os.path.exists(cache_path):
+            try:
+                self.labels = np.load(cache_path, mmap_mode='r')
+                self.key = key
+                return True, "Loaded province raster from cache"
+            except (OSError, ValueError):
+                pass
+
+        try:
+            labels = self.build_labels(provinces)
+        except Exception as e:
+            return False, f"Error building province raster: {str(e)}"
+
+        self.labels = labels
+        self.key = key
+        self._write_cache(key, labels)
+        return True, "Built province raster"
+
+    def build_labels(self, provinces):
+        """Decode provinces.bmp into a province ID array"""
+        with Image.open(self.provinces_bmp) as img:
+            rgb = np.asarray(img.convert('RGB'))
+
+        max_id = max(provinces.keys(), default=0)
+        dtype = np.uint16 if max_id < 65536 else np.uint32
+
+        # Packed 24-bit colour -> province ID lookup table
+        color_lookup = np.zeros(1 << 24, dtype=dtype)
+        for prov_id, data in provinces.items():
+            color_lookup[(data['r'] << 16) | (data['g'] << 8) | data['b']] = prov_id
+
+        return color_lookup[pack_rgb(rgb)]
+
+    def _write_cache(self, key, labels):
+        """Save the raster next to the other cache files, dropping stale ones"""
+        try:
+            self._save_array(self._cache_path(key), labels)
+
+            with open(os.path.join(self.cache_dir, 'province_labels.json'), 'w') as f:
+                json.dump({'key': key, 'width': labels.shape[1], 'height': labels.shape[0],
+                           'dtype': str(labels.dtype)}, f)
+
+            for filename in os.listdir(self.cache_dir):
+                if (filename.startswith('province_') and key not in filename
+                        and filename != 'province_labels.json'):
+                    try:
+                        os.remove(os.path.join(self.cache_dir, filename))
+                    except OSError:
+                        # Still mapped by someone else (Windows) - try next time
+                        pass
+        except OSError as e:
+            print(f"Could not write province raster cache: {e}")
+
+    def _save_array(self, path, array):
+        """Atomically write a .npy file into the cache directory"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp_path, path)
+
+    def _load_derived(self, name, build):
+        """Load a per-raster derived array from cache, building it if needed"""
+        path = self._cache_path(self.key, name)
+        if os.path.exists(path):
+            try:
+                return np.load(path)
+            except (OSError, ValueError):
+                pass
+        array = build()
+        try:
+            self._save_array(path, array)
+        except OSError as e:
+            print(f"Could not write {name} cache: {e}")
+        return array
+
+    def get_geometry(self):
+        """Get the per-province geometry table, cached with the raster"""
+        if self.geometry is None and self.labels is not None:
+            table = self._load_derived('province_geometry', lambda: build_geometry_table(*row_runs(self.labels)))
+            self.geometry = ProvinceGeometry(table)
+        return self.geometry
+
+    def get_bounding_boxes(self):
+        """Get an (N, 4) array of [x0, y0, x1, y1) boxes indexed by province ID.
+
+        Provinces that don't appear on the map get an empty box (x0 > x1).
+        """
+        geometry = self.get_geometry()
+        return geometry.bboxes if geometry is not None else None
+
+    def get_adjacency(self):
+        """Get the province adjacency graph, cached with the raster"""
+        if self.adjacency is None and self.labels is not None:
+            edges = self._load_derived('province_adjacency', lambda: build_adjacency_edges(self.labels))
+            self.adjacency = ProvinceAdjacency(edges)
+        return self.adjacency
+
+    def get_region(self, province_ids, margin=0):
+        """Union bounding box [x0, y0, x1, y1) of some provinces, or None"""
+        bboxes = self.get_bounding_boxes()
+        if bboxes is None:
+            return None
+        ids = np.asarray([p for p in province_ids if 0 < p < len(bboxes)], dtype=np.int64)
+        if len(ids) == 0:
+            return None
+        boxes = bboxes[ids]
+        boxes = boxes[boxes[:, 0] < boxes[:, 2]]
+        if len(boxes) == 0:
+            return None
+        return [max(0, int(boxes[:, 0].min()) - margin),
+                max(0, int(boxes[:, 1].min()) - margin),
+                min(self.width, int(boxes[:, 2].max()) + margin),
+                min(self.height, int(boxes[:, 3].max()) + margin)]
+
+    def _present_ids(self, labels):
+        # Scatter into one flag per province ID (the geometry table has a row
+        # for each): linear in the pixel count, where np.unique would sort
+        present = np.zeros(len(self.get_geometry()), dtype=bool)
+        present[labels.ravel()] = True
+        present[0] = False
+        return np.flatnonzero(present).tolist()
+
+    def provinces_in_rect(self, x0, y0, x1, y1):
+        """Get the sorted IDs of provinces with a pixel in [x0, x1) x [y0, y1)"""
+        if self.labels is None:
+            return []
+        x0, x1 = sorted((max(0, int(x0)), min(self.width, int(x1))))
+        y0, y1 = sorted((max(0, int(y0)), min(self.height, int(y1))))
+        return self._present_ids(self.labels[y0:y1, x0:x1])
+
+    def provinces_in_polygon(self, points):
+        """Get the sorted IDs of provinces with a pixel inside a polygon.
+
+        `points` are [x, y] map coordinates. The polygon is rasterized with
+        PIL over its bounding box only (even-odd fill), so the cost depends
+        on the lasso's size rather than the map's.
+        """
+        if self.labels is None or len(points) < 3:
+            return []
+        xs = [float(x) for x, _ in points]
+        ys = [float(y) for _, y in points]
+        x0, y0 = max(0, int(min(xs))), max(0, int(min(ys)))
+        x1, y1 = min(self.width, int(max(xs)) + 1), min(self.height, int(max(ys)) + 1)
+        if x0 >= x1 or y0 >= y1:
+            return []
+
+        mask = Image.new('1', (x1 - x0, y1 - y0), 0)
+        ImageDraw.Draw(mask).polygon([(x - x0, y - y0) for x, y in zip(xs, ys)], fill=1)
+        return self._present_ids(self.labels[y0:y1, x0:x1][np.asarray(mask, dtype=bool)])
+
+    def province_at(self, x, y):
+        """Get the province ID at a pixel, or None outside the map"""
+        if self.labels is None:
+            return None
+        if x is None or y is None:
+            return None
+        x, y = int(x), int(y)
+        if x < 0 or y < 0 or x >= self.width or y >= self.height:
+            return None
+        prov_id = int(self.labels[y, x])
+        return prov_id or None
+
+
+def row_runs(labels):
+    """Split a label raster into horizontal runs of equal labels.
+
+    Returns (labels, rows, starts, ends) arrays with one entry per run, ends
+    exclusive. Most per-province statistics can be computed on the runs,
+    which are far fewer than the pixels.
+    """
+    height, width = labels.shape
+    starts_mask = np.ones((height, width), dtype=bool)
+    np.not_equal(labels[:, 1:], labels[:, :-1], out=starts_mask[:, 1:])
+
+    rows, starts = np.nonzero(starts_mask)
+    run_labels = np.asarray(labels[rows, starts])
+
+    ends = np.empty_like(starts)
+    ends[:-1] = starts[1:]
+    ends[-1] = width
+    # The last run of every row ends at the right edge
+    ends[:-1][rows[:-1] != rows[1:]] = width
+
+    return run_labels, rows, starts, ends
@@ -0,0 +1,126 @@
+import re
+
+_ESCAPE_RE = re.compile(r'\\(["\\])')
+
+
+def escape_string(value):
+    """Backslash-escape quotes and backslashes for a quoted script string"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def unescape_string(text):
+    """Undo escape_string() on the text between a string's quotes"""
+    return _ESCAPE_RE.sub(r'\1', text)
+
+
+def format_value(value, quoted=False):
+    """Format a Python value as a script scalar"""
+    if quoted:
+        return '"' + escape_string(value) + '"'
+    if isinstance(value, bool):
+        return 'yes' if value else 'no'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def same_value(old, new):
+    """Compare a parsed scalar with a new value, numerically where possible"""
+    try:
+        return float(old) == float(new)
+    except (TypeError, ValueError):
+        return str(old) == str(new)
+
+
+class ScriptPatcher:
+    """Splice edits into the source text of a parsed script.
+
+    Edits are collected against the original text using the spans of
+    ScriptNode objects and applied in one pass by apply(); everything
+    outside the edited spans (comments, formatting, blocks nobody touched)
+    is copied through unchanged.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.edits = []
+
+    def replace(self, start, end, new_text):
+        self.edits.append((start, end, new_text))
+
+    def insert(self, position, new_text):
+        self.edits.append((position, position, new_text))
+
+    def set_value(self, node, value, quoted=None):
+        """Replace a scalar node's value, if it actually changes the text"""
+        new_text = format_value(value, node.quoted if quoted is None else quoted)
+        if self.text[node.value_start:node.value_end] != new_text:
+            self.replace(node.value_start, node.value_end, new_text)
+
+    def remove(self, node):
+        """Remove a statement, with its whole line if nothing else is on it"""
+        text = self.text
+        line_start = text.rfind('\n', 0, node.start) + 1
+        line_end = text.find('\n', node.end)
+        if line_end == -1:
+            line_end = len(text)
+        after = text[node.end:line_end].strip()
+        if not text[line_start:node.start].strip() and (not after or after.startswith('#')):
+            # Keep a trailing comment, drop the line otherwise
+            if after:
+                self.replace(node.start, node.end, '')
+            else:
+                self.replace(line_start, min(line_end + 1, len(text)), '')
+            return
+
+        end = node.end
+        while end < len(text) and text[end] in ' \t':
+            end += 1
+        self.replace(node.start, end, '')
+
+    def line_indent(self, position):
+        """Leading whitespace of the line containing a position"""
+        line_start = self.text.rfind('\n', 0, position) + 1
+        indent_end = line_start
+        while indent_end < len(self.text) and self.text[indent_end] in ' \t':
+            indent_end += 1
+        return self.text[line_start:indent_end]
+
+    def child_indent(self, block):
+        """Indentation used for statements inside a block"""
+        for child in block:
+            return self.line_indent(child.start)
+        return self.line_indent(block.start) + '\t'
+
+    def append_to_block(self, block, lines):
+        """Add statements at the end of a block, before its closing brace.
+
+        `lines` may carry their own leading tabs for nested content; the
+        block's child indentation is prepended to each.
+        """
+        indent = self.child_indent(block)
+        close = block.value_end - 1
+        line_start = self.text.rfind('\n', 0, close) + 1
+        if self.text[close] == '}' and not self.text[line_start:close].strip():
+            self.insert(line_start, ''.join(indent + line + '\n' for line in lines))
+        else:
+            self.insert(close, ' ' + ' '.join(line.strip() for line in lines) + ' ')
+
+    def insert_after(self, node, lines):
+        """Add statements on new lines right after a statement"""
+        indent = self.line_indent(node.start)
+        self.insert(node.end, ''.join('\n' + indent + line for line in lines))
+
+    def apply(self):
+        """Build the patched text"""
+        edits = sorted(enumerate(self.edits), key=lambda e: (e[1][0], e[1][1], e[0]))
+        pieces = []
+        position = 0
+        for _, (start, end, new_text) in edits:
+            if start < position:
+                raise ValueError(f"Overlapping script edits at offset {start}")
+            pieces.append(self.text[position:start])
+            pieces.append(new_text)
+            position = end
+        pieces.append(self.text[position:])
+        return ''.join(pieces)
@@ -0,0 +1,395 @@
+import os
+import re
+import csv
+import sqlite3
+import threading
+import time
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from utils.file_parser import parse_script
+
+# Folders indexed below the project root, plus the province table
+INDEXED_FOLDERS = ('common', 'history', 'events', 'localisation')
+INDEXED_FILES = ('map/definition.csv',)
+
+EVENT_TYPES = ('country_event', 'news_event', 'state_event', 'unit_leader_event', 'operative_leader_event')
+# Keys whose scalar value refers to a symbol of the given kind
+REFERENCE_KEYS = {
+    'country': ('owner', 'controller', 'add_core_of', 'remove_core_of', 'add_claim_by', 'remove_claim_by',
+                'tag', 'original_tag', 'is_owned_by', 'is_controlled_by', 'country_exists', 'has_war_with',
+                'is_in_faction_with', 'puppet', 'release', 'release_puppet', 'give_guarantee', 'target'),
+    'state': ('capital', 'owns_state', 'controls_state', 'transfer_state', 'add_state_core',
+              'remove_state_core', 'add_state_claim', 'remove_state_claim', 'state'),
+    'province': ('province',),
+    'focus': ('focus', 'has_completed_focus', 'complete_national_focus', 'unlock_national_focus'),
+    'ideology': ('ideology', 'has_government', 'ruling_party'),
+    'loc': ('name', 'title', 'desc', 'text', 'tooltip', 'custom_effect_tooltip', 'custom_trigger_tooltip',
+            'localization_key'),
+}
+_REFERENCE_KIND = {key: kind for kind, keys in REFERENCE_KEYS.items() for key in keys}
+
+_TAG_RE = re.compile(r'^[A-Z][A-Z0-9]{2}$')
+_NOT_TAGS = {'AND', 'NOT', 'ALL', 'ANY', 'NOR'}
+_NUMBER_RE = re.compile(r'^\d+$')
+_LOC_KEY_RE = re.compile(r'^[ \t]*([\w.\-]+):\d*[ \t]*"', re.MULTILINE)
+_IDENTIFIER_RE = re.compile(r'^[\w.\-]+$')
+
+
+def _line_starts(text):
+    return [0] + [m.end() for m in re.finditer('\n', text)]
+
+
+def _extract_script(text, relpath):
+    """Definitions and references in one script file as (kind, name, role, line)"""
+    lines = _line_starts(text)
+    rows = []
+    parts = relpath.split('/')
+    folder = '/'.join(parts[:2])
+    in_states = folder == 'history/states'
+
+    def add(kind, name, role, node):
+        rows.append((kind, str(name), role, bisect_right(lines, node.start)))
+
+    def walk(nodes, depth):
+        for node in nodes:
+            key = node.key
+            if key is None:
+                if node.is_block:
+                    walk(node, depth + 1)
+                continue
+
+            if node.is_block:
+                if depth == 0 and folder in ('common/scripted_effects', 'common/scripted_triggers'):
+                    add('scripted', key, 'def', node)
+                elif depth == 0 and folder == 'common/country_tags' and _TAG_RE.match(key):
+                    add('country', key, 'def', node)
+                elif key in EVENT_TYPES and node.get('id'):
+                    add('event', node.get('id'), 'def' if depth == 0 else 'ref', node)
+                elif key in ('focus', 'shared_focus') and node.get('id'):
+                    add('focus', node.get('id'), 'def', node)
+                elif key == 'state' and in_states and node.get('id'):
+                    add('state', node.get('id'), 'def', node)
+                elif key == 'provinces':
+                    for child in node:
+                        if child.key is None and _NUMBER_RE.match(str(child.value)):
+                            add('province', child.value, 'ref', child)
+                elif key == 'victory_points':
+                    values = node.values()
+                    if values and _NUMBER_RE.match(values[0]):
+                        add('province', values[0], 'ref', node)
+                elif _NUMBER_RE.match(key):
+                    # Numeric scopes: provinces in state buildings, states elsewhere
+                    add('province' if in_states else 'state', key, 'ref', node)
+                elif _TAG_RE.match(key) and key not in _NOT_TAGS:
+                    add('country', key, 'ref', node)
+
+                if key == 'ideologies' and depth == 0 and folder == 'common/ideologies':
+                    # ideologies = { name = { types = { sub_ideology = { } } } }
+                    for ideology in node:
+                        if ideology.key and ideology.is_block:
+                            add('ideology', ideology.key, 'def', ideology)
+                            for sub_ideology in ideology.find('types') or ():
+                                if sub_ideology.key:
+                                    add('ideology', sub_ideology.key, 'def', sub_ideology)
+                walk(node, depth + 1)
+                continue
+
+            value = node.value
+            if depth == 0 and folder == 'common/country_tags' and _TAG_RE.match(key):
+                add('country', key, 'def', node)
+                continue
+            if key in EVENT_TYPES:
+                add('event', value, 'ref', node)
+                continue
+
+            kind = _REFERENCE_KIND.get(key)
+            if kind == 'country':
+                if _TAG_RE.match(value) and value not in _NOT_TAGS:
+                    add(kind, value, 'ref', node)
+            elif kind in ('state', 'province'):
+                if _NUMBER_RE.match(value):
+                    add(kind, value, 'ref', node)
+            elif kind == 'loc':
+                if _IDENTIFIER_RE.match(value):
+                    add(kind, value, 'ref', node)
+            elif kind:
+                add(kind, value, 'ref', node)
+            elif value == 'yes' and key.islower():
+                # Could be a scripted effect or trigger call; builtins are
+                # indexed too but only matter if somebody looks them up
+                add('scripted', key, 'ref', node)
+
+    walk(parse_script(text), 0)
+    return rows
+
+
+def _extract_localisation(text):
+    lines = _line_starts(text)
+    return [('loc', m.group(1), 'def', bisect_right(lines, m.start(1)))
+            for m in _LOC_KEY_RE.finditer(text) if not m.group(1).startswith('l_')]
+
+
+def _extract_definition_csv(text):
+    rows = []
+    for line_number, row in enumerate(csv.reader(text.splitlines(), delimiter=';'), 1):
+        if row and _NUMBER_RE.match(row[0].strip()) and row[0].strip() != '0':
+            rows.append(('province', row[0].strip(), 'def', line_number))
+    return rows
+
+
+def extract_symbols(root, relpath):
+    """Read one project file and return its (kind, name, role, line) rows"""
+    try:
+        with open(os.path.join(root, *relpath.split('/')), 'r', encoding='utf-8-sig', errors='ignore') as f:
+            text = f.read()
+        if relpath.endswith('.yml'):
+            return _extract_localisation(text)
+        if relpath.endswith('.csv'):
+            return _extract_definition_csv(text)
+        return _extract_script(text, relpath)
+    except Exception as e:
+        print(f"Failed to index {relpath}: {e}")
+        return []
+
+
+class SymbolIndex:
+    """Project-wide index of symbol definitions and references.
+
+    Covers country tags, state and province IDs, focuses, ideologies,
+    events, scripted effects/triggers ("scripted") and localisation keys
+    ("loc"). Rows live in SQLite next to the parse cache; each indexed
+    file remembers its mtime and size, so refresh() only re-reads files
+    that changed. Definition names are also in an FTS5 table for prefix
+    search when the SQLite build has it.
+    """
+
+    SCHEMA_VERSION = 1
+    PARALLEL_MIN_FILES = 64
+
+    def __init__(self, project_root, cache_dir, filename="symbol_index.sqlite"):
+        self.project_root = os.path.abspath(project_root)
+        self.cache_dir = cache_dir
+        self.path = os.path.join(cache_dir, filename)
+        self.has_fts = False
+        self.building = False
+        self.last_report = None
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version != self.SCHEMA_VERSION:
+                conn.executescript("""
+                    DROP TABLE IF EXISTS symbols_fts;
+                    DROP TABLE IF EXISTS symbols;
+                    DROP TABLE IF EXISTS files;
+                """)
+                conn.execute(f"PRAGMA user_version={self.SCHEMA_VERSION}")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    mtime_ns INTEGER NOT NULL,
+                    size INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS symbols (
+                    id INTEGER PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    role TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    line INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS symbols_name ON symbols (name, role, kind);
+                CREATE INDEX IF NOT EXISTS symbols_path ON symbols (path);
+            """)
+            try:
+                conn.executescript("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS symbols_fts USING fts5(
+                        name, kind UNINDEXED, content='symbols', content_rowid='id',
+                        tokenize="unicode61 tokenchars '_.-'"
+                    );
+                    CREATE TRIGGER IF NOT EXISTS symbols_fts_insert AFTER INSERT ON symbols
+                    WHEN new.role = 'def' BEGIN
+                        INSERT INTO symbols_fts (rowid, name, kind) VALUES (new.id, new.name, new.kind);
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS symbols_fts_delete AFTER DELETE ON symbols
+                    WHEN old.role = 'def' BEGIN
+                        INSERT INTO symbols_fts (symbols_fts, rowid, name, kind)
+                        VALUES ('delete', old.id, old.name, old.kind);
+                    END;
+                """)
+                self.has_fts = True
+            except sqlite3.OperationalError as e:
+                print(f"SQLite has no FTS5, symbol search falls back to LIKE: {e}")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _accept(self, relpath):
+        if relpath in INDEXED_FILES:
+            return True
+        parts = relpath.split('/')
+        if parts[0] not in INDEXED_FOLDERS or any(part.startswith('.') for part in parts):
+            return False
+        return relpath.endswith('.yml' if parts[0] == 'localisation' else '.txt')
+
+    def scan(self):
+        """Stat every indexable file: {relative path: (mtime_ns, size)}"""
+        files = {}
+        stack = [os.path.join(self.project_root, folder) for folder in INDEXED_FOLDERS]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if not entry.name.startswith('.'):
+                                stack.append(entry.path)
+                            continue
+                        relpath = os.path.relpath(entry.path, self.project_root).replace(os.sep, '/')
+                        if self._accept(relpath):
+                            stat = entry.stat()
+                            files[relpath] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                continue
+        for relpath in INDEXED_FILES:
+            try:
+                stat = os.stat(os.path.join(self.project_root, *relpath.split('/')))
+                files[relpath] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                pass
+        return files
+
+    def refresh(self, workers=None):
+        """Re-index changed files and drop removed ones, returning a report"""
+        start = time.perf_counter()
+        self.building = True
+        try:
+            files = self.scan()
+            with self._lock:
+                known = {path: (mtime_ns, size) for path, mtime_ns, size in
+                         self._connect().execute("SELECT path, mtime_ns, size FROM files")}
+            stale = sorted(path for path, stat in files.items() if known.get(path) != stat)
+            removed = sorted(set(known) - set(files))
+
+            workers = workers or os.cpu_count() or 1
+            if len(stale) < self.PARALLEL_MIN_FILES:
+                workers = 1
+            results = self._extract(stale, workers)
+            self._store([(path, files[path], rows) for path, rows in zip(stale, results)], removed)
+
+            self.last_report = {'indexed': len(stale), 'removed': len(removed),
+                                'unchanged': len(files) - len(stale),
+                                'elapsed': round(time.perf_counter() - start, 3)}
+            return self.last_report
+        finally:
+            self.building = False
+
+    def update_paths(self, relpaths):
+        """Re-index specific files, e.g. ones reported by the file watcher"""
+        updates, removed = [], []
+        for relpath in relpaths:
+            if not self._accept(relpath):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.project_root, *relpath.split('/')))
+            except OSError:
+                removed.append(relpath)
+                continue
+            updates.append((relpath, (stat.st_mtime_ns, stat.st_size),
+                            extract_symbols(self.project_root, relpath)))
+        self._store(updates, removed)
+        return len(updates) + len(removed)
+
+    def _extract(self, relpaths, workers):
+        if workers > 1:
+            try:
+                chunksize = max(1, len(relpaths) // (workers * 8))
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    return list(pool.map(extract_symbols, [self.project_root] * len(relpaths), relpaths,
+                                         chunksize=chunksize))
+            except (OSError, BrokenProcessPool) as e:
+                print(f"Parallel indexing failed, indexing serially: {e}")
+        return [extract_symbols(self.project_root, relpath) for relpath in relpaths]
+
+    def _store(self, updates, removed):
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                for relpath in removed:
+                    conn.execute("DELETE FROM symbols WHERE path = ?", (relpath,))
+                    conn.execute("DELETE FROM files WHERE path = ?", (relpath,))
+                for relpath, (mtime_ns, size), rows in updates:
+                    conn.execute("DELETE FROM symbols WHERE path = ?", (relpath,))
+                    conn.executemany(
+                        "INSERT INTO symbols (kind, name, role, path, line) VALUES (?, ?, ?, ?, ?)",
+                        [(kind, name, role, relpath, line) for kind, name, role, line in rows]
+                    )
+                    conn.execute("INSERT OR REPLACE INTO files (path, mtime_ns, size) VALUES (?, ?, ?)",
+                                 (relpath, mtime_ns, size))
+
+    def _lookup(self, name, role, kind=None, limit=1000):
+        query = "SELECT kind, name, path, line FROM symbols WHERE name = ? AND role = ?"
+        params = [str(name), role]
+        if kind:
+            query += " AND kind = ?"
+            params.append(kind)
+        query += " ORDER BY path, line LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._connect().execute(query, params).fetchall()
+        return [{'kind': k, 'name': n, 'path': p, 'line': line} for k, n, p, line in rows]
+
+    def definitions(self, name, kind=None):
+        """Where a symbol is defined"""
+        return self._lookup(name, 'def', kind)
+
+    def references(self, name, kind=None, limit=1000):
+        """Where a symbol is used"""
+        return self._lookup(name, 'ref', kind, limit)
+
+    def search(self, text, kind=None, limit=50):
+        """Definitions whose name starts with (or, without FTS5, contains) the text"""
+        text = str(text).strip()
+        if not text:
+            return []
+        with self._lock:
+            conn = self._connect()
+            if self.has_fts:
+                query = ("SELECT s.kind, s.name, s.path, s.line FROM symbols_fts "
+                         "JOIN symbols s ON s.id = symbols_fts.rowid WHERE symbols_fts MATCH ?")
+                params = ['"' + text.replace('"', '""') + '"*']
+            else:
+                query = "SELECT kind, name, path, line FROM symbols s WHERE role = 'def' AND name LIKE ?"
+                params = ['%' + text.replace('%', '') + '%']
+            if kind:
+                query += " AND s.kind = ?"
+                params.append(kind)
+            query += " ORDER BY length(s.name), s.name LIMIT ?"
+            params.append(limit)
+            rows = conn.execute(query, params).fetchall()
+        return [{'kind': k, 'name': n, 'path': p, 'line': line} for k, n, p, line in rows]
+
+    def stats(self):
+        """Number of definitions and references per kind"""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT kind, role, COUNT(*) FROM symbols GROUP BY kind, role"
+            ).fetchall()
+            files = self._connect().execute("SELECT COUNT(*) FROM files").fetchone()[0]
+        counts = {}
+        for kind, role, count in rows:
+            counts.setdefault(kind, {'def': 0, 'ref': 0})[role] = count
+        return {'files': files, 'kinds': counts}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,269 @@
+import os
+import re
+import uuid
+import atexit
+import threading
+import multiprocessing
+from fnmatch import fnmatch
+from itertools import chain
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+# Files worth searching; images and other binaries are skipped
+TEXT_EXTENSIONS = ('.txt', '.yml', '.yaml', '.gui', '.gfx', '.csv', '.lua', '.asset', '.mod', '.md')
+SKIPPED_FOLDERS = ('.hpa_cache', '.git', '__pycache__')
+
+MAX_MATCHES_PER_FILE = 1000
+MAX_LINE_LENGTH = 300
+
+# Worker pool shared by all searches, started on first use
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def compile_pattern(query, regex=False, case_sensitive=False):
+    """Compile a search query; raises re.error for an invalid regex"""
+    flags = re.MULTILINE | (0 if case_sensitive else re.IGNORECASE)
+    return re.compile(query if regex else re.escape(query), flags)
+
+
+def search_file(path, pattern, literal=None):
+    """Find matches in one file as (line, column, line text) tuples.
+
+    `literal` is the lower-cased (or exact, for case-sensitive searches)
+    query of a plain-text search; files that don't contain it are skipped
+    before any per-line work.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8-sig', errors='ignore') as f:
+            text = f.read()
+    except OSError:
+        return []
+
+    if literal is not None:
+        haystack = text.lower() if pattern.flags & re.IGNORECASE else text
+        if literal not in haystack:
+            return []
+
+    matches = []
+    line_number, line_start = 1, 0
+    for match in pattern.finditer(text):
+        start = match.start()
+        line_number += text.count('\n', line_start, start)
+        line_start = text.rfind('\n', 0, start) + 1
+        line_end = text.find('\n', start)
+        line = text[line_start:line_end if line_end != -1 else len(text)].rstrip('\r')
+        matches.append((line_number, start - line_start + 1, line[:MAX_LINE_LENGTH]))
+        if len(matches) >= MAX_MATCHES_PER_FILE:
+            break
+    return matches
+
+
+def search_files(root, relpaths, query, regex, case_sensitive):
+    """Search a batch of files, returning [(relpath, matches)] for files that matched"""
+    pattern = compile_pattern(query, regex, case_sensitive)
+    literal = None if regex else (query if case_sensitive else query.lower())
+    results = []
+    for relpath in relpaths:
+        matches = search_file(os.path.join(root, *relpath.split('/')), pattern, literal)
+        if matches:
+            results.append((relpath, matches))
+    return results
+
+
+def _get_pool(workers):
+    """The shared search pool, with `workers` processes"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            # Workers are started by a fork server where there is one,
+            # never forked from the threaded web server itself
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else None)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            _pool_workers = workers
+        return _pool
+
+
+def _discard_pool(pool):
+    """Drop a broken pool so the next search starts a new one"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+@atexit.register
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+class TextSearch:
+    """One full-text search over a project, consumed as a stream of results.
+
+    Files are enumerated lazily with os.scandir and filtered by include and
+    exclude globs (matched against the forward-slash relative path). With
+    more than one worker, batches are searched on a process pool shared by
+    all searches and results are yielded as each batch completes. The
+    first, small batch is searched right here while the pool gets going, so
+    matches show up right away. cancel() stops the search from any thread.
+    """
+
+    FIRST_BATCH_SIZE = 8
+    BATCH_SIZE = 128
+
+    def __init__(self, root, query, regex=False, case_sensitive=False, include=None, exclude=None,
+                 workers=None, max_results=10000):
+        self.id = uuid.uuid4().hex
+        self.root = os.path.abspath(root)
+        self.query = query
+        self.regex = regex
+        self.case_sensitive = case_sensitive
+        self.include = [glob for glob in (include or []) if glob]
+        self.exclude = [glob for glob in (exclude or []) if glob]
+        self.workers = workers or os.cpu_count() or 1
+        self.max_results = max_results
+
+        # Fails early on a bad regex, before anything is streamed
+        compile_pattern(query, regex, case_sensitive)
+
+        self.files_searched = 0
+        self.match_count = 0
+        self.cancelled = False
+        self.truncated = False
+        self._stop = threading.Event()
+
+    def cancel(self):
+        self.cancelled = True
+        self._stop.set()
+
+    def _accept(self, relpath):
+        if not relpath.endswith(TEXT_EXTENSIONS):
+            return False
+        if self.include and not any(fnmatch(relpath, glob) for glob in self.include):
+            return False
+        return not any(fnmatch(relpath, glob) for glob in self.exclude)
+
+    def iter_files(self):
+        """Relative paths of the files to search, as they are found"""
+        stack = [self.root]
+        while stack and not self._stop.is_set():
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    subdirectories = []
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in SKIPPED_FOLDERS:
+                                subdirectories.append(entry.path)
+                            continue
+                        relpath = os.path.relpath(entry.path, self.root).replace(os.sep, '/')
+                        if self._accept(relpath):
+                            yield relpath
+                    stack.extend(reversed(sorted(subdirectories)))
+            except OSError:
+                continue
+
+    def _batches(self):
+        batch, size = [], self.FIRST_BATCH_SIZE
+        for relpath in self.iter_files():
+            batch.append(relpath)
+            if len(batch) >= size:
+                yield batch
+                batch, size = [], self.BATCH_SIZE
+        if batch:
+            yield batch
+
+    def run(self):
+        """Yield (relpath, matches) for each matching file until done or cancelled"""
+        batches = self._batches()
+        unsearched = []
+        if self.workers > 1:
+            pool = None
+            try:
+                pool = _get_pool(self.workers)
+                yield from self._run_parallel(pool, batches, unsearched)
+                return
+            except (OSError, RuntimeError, BrokenProcessPool) as e:
+                if pool is not None:
+                    _discard_pool(pool)
+                print(f"Parallel search failed, searching serially: {e}")
+
+        for batch in chain(unsearched, batches):
+            if self._stop.is_set():
+                return
+            yield from self._search_here(batch)
+
+    def _search_here(self, batch):
+        results = search_files(self.root, batch, self.query, self.regex, self.case_sensitive)
+        self.files_searched += len(batch)
+        for result in results:
+            if self._stop.is_set() or not self._count(result):
+                return
+            yield result
+
+    def _run_parallel(self, pool, batches, unsearched):
+        """Search on the pool; batches it didn't finish are left in `unsearched` if it fails"""
+        pending = {}
+        try:
+            # The first, small batch doesn't wait for the pool
+            first = next(batches, None)
+            if first is not None:
+                yield from self._search_here(first)
+
+            while True:
+                # Keep every worker busy with a couple of batches queued
+                while len(pending) < self.workers * 2 and not self._stop.is_set():
+                    batch = next(batches, None)
+                    if batch is None:
+                        break
+                    try:
+                        future = pool.submit(search_files, self.root, batch, self.query,
+                                             self.regex, self.case_sensitive)
+                    except Exception:
+                        unsearched.append(batch)
+                        raise
+                    pending[future] = batch
+                if not pending or self._stop.is_set():
+                    return
+
+                done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results = future.result()
+                    self.files_searched += len(pending.pop(future))
+                    for result in results:
+                        if self._stop.is_set() or not self._count(result):
+                            return
+                        yield result
+        except Exception:
+            unsearched.extend(pending.values())
+            raise
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _count(self, result):
+        """Count a file's matches; False once the result limit is reached"""
+        if self.match_count >= self.max_results:
+            self.truncated = True
+            self._stop.set()
+            return False
+        self.match_count += len(result[1])
+        return True
+
+    def summary(self):
+        return {
+            'search_id': self.id,
+            'files_searched': self.files_searched,
+            'matches': self.match_count,
+            'cancelled': self.cancelled,
+            'truncated': self.truncated
+        }
@@ -0,0 +1,365 @@
+import os
+import math
+import shutil
+import hashlib
+import threading
+from io import BytesIO
+from collections import OrderedDict
+import numpy as np
+from PIL import Image
+from utils.border_engine import (
+    edge_mask, render_overlay, THIN_PROVINCE_BORDER_COLOR, STATE_BORDER_COLOR
+)
+
+TILE_SIZE = 256
+
+# Layers that only depend on provinces.bmp / definition.csv. Their tiles are
+# pre-generated and kept on disk until the province raster changes.
+STATIC_LAYERS = ('provinces', 'province_borders')
+
+# Layers that also depend on state assignments and owners. They are cheap to
+# render from the raster, so they live in an in-memory LRU cache and are
+# invalidated region by region when provinces change hands.
+DYNAMIC_LAYERS = ('political', 'state_borders')
+
+# Colours for the political layer (same scheme the editor used client-side)
+UNASSIGNED_COLOR = (200, 200, 200)
+SEA_COLOR = (30, 50, 80)
+LAKE_COLOR = (50, 70, 100)
+UNKNOWN_COLOR = (20, 20, 20)
+HIGHLIGHT_COLOR = (0, 0, 0, 60)
+
+
+class TileServer:
+    """Serves map layers as PNG tiles cut from a zoom pyramid of the province raster.
+
+    Zoom level `max_zoom` is the full-resolution raster; every level below it
+    halves the resolution. Tiles are rendered straight from the (downsampled)
+    label raster through small per-province lookup tables, so no full-size
+    bitmap is ever encoded or sent to the browser.
+    """
+
+    def __init__(self, state_editor, memory_tiles=2048):
+        self.editor = state_editor
+        self.tiles_dir = os.path.join(state_editor.cache_dir, "tiles")
+
+        self._lock = threading.RLock()
+        self._levels = {}
+        self._levels_key = None
+        self._luts = {}
+        self._versions = {}
+        self._memory_cache = OrderedDict()
+        self._memory_tiles = memory_tiles
+
+        # Bumped on every invalidation so clients can cache-bust dirty tiles
+        self.revision = 0
+
+        self.country_colors = {}
+
+    def _labels(self):
+        return self.editor.get_province_labels()
+
+    @property
+    def max_zoom(self):
+        labels = self._labels()
+        if labels is None:
+            return 0
+        longest = max(labels.shape)
+        return max(0, math.ceil(math.log2(longest / TILE_SIZE)))
+
+    def _level(self, z):
+        """Get the label raster for zoom level z (nearest-neighbour downsample)"""
+        labels = self._labels()
+        with self._lock:
+            if self._levels_key != self.editor.raster.key:
+                self._levels = {}
+                self._levels_key = self.editor.raster.key
+                self._luts = {}
+                self._versions = {}
+
+            if z not in self._levels:
+                step = 2 ** (self.max_zoom - z)
+                if step == 1:
+                    self._levels[z] = labels
+                else:
+                    self._levels[z] = np.ascontiguousarray(labels[::step, ::step])
+            return self._levels[z]
+
+    def get_metadata(self):
+        """Describe the pyramid so the client can request tiles"""
+        labels = self._labels()
+        if labels is None:
+            return None
+        return {
+            'width': int(labels.shape[1]),
+            'height': int(labels.shape[0]),
+            'tile_size': TILE_SIZE,
+            'max_zoom': self.max_zoom,
+            'layers': list(STATIC_LAYERS + DYNAMIC_LAYERS),
+            'versions': {layer: self.layer_version(layer) for layer in STATIC_LAYERS + DYNAMIC_LAYERS}
+        }
+
+    def tile_range(self, z):
+        """Number of tile columns and rows at zoom level z"""
+        level = self._level(z)
+        return (math.ceil(level.shape[1] / TILE_SIZE), math.ceil(level.shape[0] / TILE_SIZE))
+
+    def set_country_colors(self, colors):
+        """Set the tag -> [r, g, b] colours used by the political layer"""
+        with self._lock:
+            if colors != self.country_colors:
+                self.country_colors = dict(colors)
+                self.invalidate()
+
+    def invalidate(self):
+        """Drop every state-dependent tile after arbitrary state changes"""
+        with self._lock:
+            for layer in DYNAMIC_LAYERS:
+                self._luts.pop(layer, None)
+                self._versions.pop(layer, None)
+            for cache_key in [k for k in self._memory_cache if k[0] in DYNAMIC_LAYERS]:
+                del self._memory_cache[cache_key]
+            self.revision += 1
+            return {'revision': self.revision, 'full': True}
+
+    def update_provinces(self, province_ids):
+        """Re-render only the tiles around provinces whose state or owner changed.
+
+        The dirty region is the union of the provinces' bounding boxes grown
+        by one pixel, which covers the border pixels on the neighbouring
+        provinces. Returns a patch listing the dirty tiles per zoom level so
+        the client can refetch just those.
+        """
+        province_ids = [p for p in province_ids if p in self.editor.provinces]
+        region = self.editor.get_provinces_region(province_ids, margin=1)
+
+        with self._lock:
+            self.revision += 1
+            for layer in DYNAMIC_LAYERS:
+                self._versions.pop(layer, None)
+                if layer in self._luts:
+                    self._patch_lut(layer, province_ids)
+
+            tiles = {}
+            if region:
+                for z in range(self.max_zoom + 1):
+                    tiles[z] = self._tiles_in_region(region, z)
+                    for x, y in tiles[z]:
+                        for layer in DYNAMIC_LAYERS:
+                            self._memory_cache.pop((layer, z, x, y), None)
+
+            return {'revision': self.revision, 'full': False, 'region': region, 'tiles': tiles}
+
+    def _tiles_in_region(self, region, z):
+        """List the [x, y] tiles at zoom z that touch a world-pixel region"""
+        step = 2 ** (self.max_zoom - z)
+        cols, rows = self.tile_range(z)
+        # One extra level pixel on each side: borders compare sampled neighbours
+        lx0, ly0 = region[0] // step - 1, region[1] // step - 1
+        lx1, ly1 = -(-region[2] // step) + 1, -(-region[3] // step) + 1
+        tx0, ty0 = max(0, lx0 // TILE_SIZE), max(0, ly0 // TILE_SIZE)
+        tx1, ty1 = min(cols - 1, (lx1 - 1) // TILE_SIZE), min(rows - 1, (ly1 - 1) // TILE_SIZE)
+        return [[x, y] for y in range(ty0, ty1 + 1) for x in range(tx0, tx1 + 1)]
+
+    def _lut_size(self):
+        return max(self.editor.provinces.keys(), default=0) + 1
+
+    def _lut(self, layer):
+        with self._lock:
+            if layer not in self._luts:
+                self._luts[layer] = self._build_lut(layer)
+            return self._luts[layer]
+
+    def _build_lut(self, layer):
+        size = self._lut_size()
+        provinces = self.editor.provinces
+
+        if layer == 'provinces':
+            lut = np.zeros((size, 3), dtype=np.uint8)
+            for prov_id, data in provinces.items():
+                lut[prov_id] = (data['r'], data['g'], data['b'])
+            return lut
+
+        if layer == 'political':
+            lut = np.empty((size, 3), dtype=np.uint8)
+            lut[:] = UNKNOWN_COLOR
+            for prov_id in provinces:
+                lut[prov_id] = self._political_color(prov_id)
+            return lut
+
+        if layer == 'state_borders':
+            return self.editor.get_state_lookup()
+
+        return None
+
+    def _patch_lut(self, layer, province_ids):
+        """Update the lookup table entries of a few provinces in place"""
+        lut = self._luts[layer]
+        for prov_id in province_ids:
+            if prov_id >= len(lut):
+                # Unknown to the table - rebuild it from scratch
+                self._luts.pop(layer, None)
+                return
+            if layer == 'political':
+                lut[prov_id] = self._political_color(prov_id)
+            elif layer == 'state_borders':
+                lut[prov_id] = self.editor.province_to_state.get(prov_id) or 0
+
+    def _political_color(self, prov_id):
+        """Map colour of a province: sea/lake colours or its owner's colour"""
+        prov_type = self.editor.provinces[prov_id].get('type')
+        if prov_type == 'sea':
+            return SEA_COLOR
+        if prov_type == 'lake':
+            return LAKE_COLOR
+
+        state_id = self.editor.province_to_state.get(prov_id)
+        owner = self.editor.states.get(state_id, {}).get('owner') if state_id else None
+        if owner and owner in self.country_colors:
+            r, g, b = self.country_colors[owner]
+            return (min(255, r + 40), min(255, g + 40), min(255, b + 40))
+        return UNASSIGNED_COLOR
+
+    def layer_version(self, layer):
+        """Short token identifying the current content of a layer"""
+        with self._lock:
+            if layer in self._versions:
+                return self._versions[layer]
+
+            key = self.editor.raster.key or ''
+            if layer in STATIC_LAYERS:
+                version = hashlib.sha1(key.encode()).hexdigest()[:12]
+            else:
+                lut = self._lut(layer)
+                digest = hashlib.sha1(key.encode())
+                digest.update(lut.tobytes())
+                version = digest.hexdigest()[:12]
+            self._versions[layer] = version
+            return version
+
+    def _window(self, z, x, y, halo=0):
+        """Cut the label window for tile (x, y) at zoom z, padded with a halo"""
+        level = self._level(z)
+        height, width = level.shape
+        x0, y0 = x * TILE_SIZE, y * TILE_SIZE
+        x1, y1 = min(x0 + TILE_SIZE, width), min(y0 + TILE_SIZE, height)
+
+        wx0, wy0 = max(0, x0 - halo), max(0, y0 - halo)
+        wx1, wy1 = min(width, x1 + halo), min(height, y1 + halo)
+        window = np.asarray(level[wy0:wy1, wx0:wx1])
+
+        # Pad at the map edge so the halo is always there
+        pad = ((wy0 - (y0 - halo), (y1 + halo) - wy1),
+               (wx0 - (x0 - halo), (x1 + halo) - wx1))
+        if any(p for pair in pad for p in pair):
+            window = np.pad(window, pad, mode='edge')
+        return window
+
+    def render_tile(self, layer, z, x, y, state_id=None):
+        """Render one tile as a PIL image, or None if it is out of range"""
+        if z < 0 or z > self.max_zoom:
+            return None
+        cols, rows = self.tile_range(z)
+        if x < 0 or y < 0 or x >= cols or y >= rows:
+            return None
+
+        if layer in ('provinces', 'political'):
+            window = self._window(z, x, y)
+            return Image.fromarray(self._lut(layer)[window], 'RGB')
+
+        if layer == 'province_borders':
+            window = self._window(z, x, y, halo=1)
+            mask = edge_mask(window, thin=True)[1:-1, 1:-1]
+            return render_overlay(mask, THIN_PROVINCE_BORDER_COLOR)
+
+        if layer == 'state_borders':
+            window = self._window(z, x, y, halo=1)
+            states = self._lut(layer)[window]
+            mask = edge_mask(states, valid=window != 0)[1:-1, 1:-1]
+            return render_overlay(mask, STATE_BORDER_COLOR)
+
+        if layer == 'highlight' and state_id is not None:
+            window = self._window(z, x, y)
+            state_lookup = self.editor.get_state_lookup()
+            return render_overlay(state_lookup[window] == state_id, HIGHLIGHT_COLOR)
+
+        return None
+
+    def get_tile(self, layer, z, x, y, state_id=None):
+        """Get a tile as PNG bytes, using the disk or memory cache"""
+        if layer in STATIC_LAYERS:
+            path = self._tile_path(layer, z, x, y)
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    return f.read()
+            png = self._encode(self.render_tile(layer, z, x, y))
+            if png is not None:
+                self._write_tile(path, png)
+            return png
+
+        if layer in DYNAMIC_LAYERS:
+            cache_key = (layer, z, x, y)
+            with self._lock:
+                png = self._memory_cache.get(cache_key)
+                if png is not None:
+                    self._memory_cache.move_to_end(cache_key)
+                    return png
+            png = self._encode(self.render_tile(layer, z, x, y))
+            if png is not None:
+                with self._lock:
+                    self._memory_cache[cache_key] = png
+                    while len(self._memory_cache) > self._memory_tiles:
+                        self._memory_cache.popitem(last=False)
+            return png
+
+        # Per-request overlays (selection highlight) are not cached
+        return self._encode(self.render_tile(layer, z, x, y, state_id=state_id))
+
+    def _encode(self, img):
+        if img is None:
+            return None
+        buffered = BytesIO()
+        img.save(buffered, format="PNG", compress_level=1)
+        return buffered.getvalue()
+
+    def _tile_path(self, layer, z, x, y):
+        return os.path.join(self.tiles_dir, self.layer_version(layer), layer, str(z), f"{x}_{y}.png")
+
+    def _write_tile(self, path, png):
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(png)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not write tile cache {path}: {e}")
+
+    def pregenerate(self, layers=STATIC_LAYERS):
+        """Render every missing tile of the given static layers to disk"""
+        if self._labels() is None:
+            return False, "Province raster not available"
+
+        self._remove_stale_tiles()
+        written = 0
+        for layer in layers:
+            if layer not in STATIC_LAYERS:
+                continue
+            for z in range(self.max_zoom + 1):
+                cols, rows = self.tile_range(z)
+                for y in range(rows):
+                    for x in range(cols):
+                        path = self._tile_path(layer, z, x, y)
+                        if not os.path.exists(path):
+                            self._write_tile(path, self._encode(self.render_tile(layer, z, x, y)))
+                            written += 1
+        return True, f"Generated {written} tiles"
+
+    def _remove_stale_tiles(self):
+        """Delete tile folders left over from an older province raster"""
+        if not os.path.isdir(self.tiles_dir):
+            return
+        current = self.layer_version(STATIC_LAYERS[0])
+        for entry in os.listdir(self.tiles_dir):
+            if entry != current:
+                shutil.rmtree(os.path.join(self.tiles_dir, entry), ignore_errors=True)
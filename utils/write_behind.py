@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import threading
+
+
+class WriteBehindJournal:
+    """Append-only journal of state file contents awaiting a flush.
+
+    Each line is a JSON record: {"op": "write", "file": ..., "content": ...}
+    or {"op": "delete", "file": ...}. Records hold whole file contents, so
+    replaying the journal in order always reproduces the latest edits even
+    if the process died halfway through a flush.
+    """
+
+    def __init__(self, path, fsync=False):
+        self.path = path
+        self.fsync = fsync
+        self._file = None
+        self._lock = threading.Lock()
+
+    def _append(self, record):
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(json.dumps(record, separators=(',', ':')) + '\n')
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def record_write(self, filename, content):
+        self._append({'op': 'write', 'file': filename, 'content': content})
+
+    def record_delete(self, filename):
+        self._append({'op': 'delete', 'file': filename})
+
+    def read(self):
+        """Get the latest pending operation per file, in journal order.
+
+        A torn last line (the process died mid-append) is ignored.
+        """
+        latest = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    latest.pop(record['file'], None)
+                    latest[record['file']] = record
+        except FileNotFoundError:
+            pass
+        return list(latest.values())
+
+    def clear(self):
+        """Drop the journal once its contents are safely on disk"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class WriteBehindFlusher:
+    """Background thread that flushes a StateEditor's dirty states.
+
+    Edits only mark states dirty and append to the journal; the thread
+    waits until no edit has arrived for `interval` seconds (or `max_delay`
+    has passed since the first unflushed edit) and then does one flush for
+    the whole burst.
+    """
+
+    def __init__(self, editor, interval=2.0, max_delay=10.0):
+        self.editor = editor
+        self.interval = interval
+        self.max_delay = max_delay
+
+        self.last_report = None
+        self._first_edit = None
+        self._last_edit = None
+        self._wake = threading.Condition()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='state-write-behind', daemon=True)
+        self._thread.start()
+
+    def schedule(self):
+        """Note an edit; the flush happens once edits pause"""
+        with self._wake:
+            now = time.monotonic()
+            if self._first_edit is None:
+                self._first_edit = now
+            self._last_edit = now
+            self._wake.notify()
+
+    def flush_now(self):
+        """Flush immediately on the calling thread and return the report"""
+        with self._wake:
+            self._first_edit = self._last_edit = None
+        return self._flush()
+
+    def stop(self, flush=True):
+        """Stop the thread, flushing outstanding edits first by default"""
+        with self._wake:
+            self._stopping = True
+            self._wake.notify()
+        self._thread.join()
+        if flush:
+            return self._flush()
+        return None
+
+    def _flush(self):
+        report = self.editor.flush()
+        self.last_report = report
+        return report
+
+    def _run(self):
+        while True:
+            with self._wake:
+                while not self._stopping and self._last_edit is None:
+                    self._wake.wait()
+                if self._stopping:
+                    return
+
+                # Debounce: wait for a quiet period, bounded by max_delay
+                now = time.monotonic()
+                due = min(self._last_edit + self.interval, self._first_edit + self.max_delay)
+                if now < due:
+                    self._wake.wait(due - now)
+                    continue
+                self._first_edit = self._last_edit = None
+
+            try:
+                self._flush()
+            except Exception as e:
+                print(f"Write-behind flush failed: {e}")